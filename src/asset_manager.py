@@ -1,49 +1,97 @@
-import requests
+import os
+import asyncio
+import hashlib
 from .config import Config
+from .cache import FileCache
+from .http_client import HttpClient, shared_client
+from .image_providers import HedgedImageFetcher, PexelsPhotoProvider, PlaceholderProvider, PollinationsProvider
+from .image_normalizer import orientation_size
+from .stock_video import pick_rendition
+from .utils import ensure_dir_exists
 
 class AssetManager:
-    def __init__(self):
+    def __init__(self, http=None, image_http=None):
         if not Config.PEXELS_API_KEY:
             raise ValueError("PEXELS_API_KEY not found")
         self.headers = {"Authorization": Config.PEXELS_API_KEY}
+        self.image_cache = FileCache(Config.IMAGE_CACHE_DIR, Config.IMAGE_CACHE_MAX_MB * 1024 * 1024)
+        self.stock_cache = FileCache(Config.STOCK_CACHE_DIR, Config.STOCK_CACHE_MAX_MB * 1024 * 1024)
+        # Pooled, retrying session shared by every download in the process
+        self.http = http or shared_client()
+        # Image providers get no HTTP retries: a failed or slow provider hands over to the next one
+        self.image_http = image_http or HttpClient(retries=0)
+        self.image_fetcher = HedgedImageFetcher(self._build_providers())
     
-    def search_video(self, query, orientation="portrait"):
-        """Searches Pexels for a video URL."""
-        url = f"https://api.pexels.com/videos/search?query={query}&per_page=1&orientation={orientation}"
+    def search_video(self, query, orientation="portrait", target_size=None):
+        """
+        Searches Pexels for a video URL: the smallest rendition that still covers target_size
+        (the render size for the orientation by default), so nothing larger is downloaded.
+        """
+        url = "https://api.pexels.com/videos/search"
         try:
-            response = requests.get(url, headers=self.headers)
-            data = response.json()
+            data = self.http.get_json(
+                url, headers=self.headers, params={'query': query, 'per_page': 1, 'orientation': orientation}
+            )
             if data['videos']:
-                # Get the best quality video file link
-                video_files = data['videos'][0]['video_files']
-                #Sort by quality (width)
-                best_video = sorted(video_files, key=lambda x: x['width'], reverse=True)[0]
-                return best_video['link']
+                rendition = pick_rendition(data['videos'][0]['video_files'], target_size or orientation_size(orientation))
+                if rendition:
+                    return rendition['link']
         except Exception as e:
             print(f"Error searching video for {query}: {e}")
         return None
 
-    def download_file(self, url, output_path):
-        """Downloads a file from a URL."""
-        if not url: return False
-        try:
-            response = requests.get(url, stream=True)
-            with open(output_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=1024):
-                    if chunk:
-                        f.write(chunk)
+    def fetch_stock_video(self, query, output_path, orientation="portrait"):
+        """Downloads a stock clip for query to output_path; each rendition is only downloaded once."""
+        link = self.search_video(query, orientation)
+        if not link:
+            return False
+        cache_key = FileCache.make_key("pexels_video", link)
+        if self.stock_cache.get(cache_key, output_path):
+            print(f"Stock video cache hit for: {query[:60]}")
             return True
-        except Exception as e:
-            print(f"Error downloading {url}: {e}")
+        if not self.download_file(link, output_path):
             return False
+        self.stock_cache.put(cache_key, output_path, meta={'query': query})
+        return True
 
-    def generate_image(self, prompt, output_path, orientation="portrait"):
-        """Generates an image using Pollinations.ai (Free) with enhanced styling."""
-        import urllib.parse
-        
+    def download_file(self, url, output_path):
+        """Downloads a file from a URL (atomically: output_path is complete or untouched)."""
+        if not url: return False
+        return self.http.download(url, output_path)
+
+    STOCK_PROVIDERS = {PexelsPhotoProvider.name}
+
+    def _build_providers(self):
+        providers = {
+            'pollinations': lambda: PollinationsProvider(self.image_http),
+            'pexels': lambda: PexelsPhotoProvider(self.image_http, self.headers),
+        }
+        chain = []
+        for name in Config.IMAGE_PROVIDERS:
+            if name in providers:
+                chain.append(providers[name]())
+            else:
+                print(f"Unknown image provider '{name}', skipping")
+        if Config.IMAGE_PLACEHOLDER_FALLBACK:
+            chain.append(PlaceholderProvider())
+        return chain
+
+    def generate_image(self, prompt, output_path, orientation="portrait", use_cache=True, style="noir",
+                       generated_only=False):
+        """Blocking wrapper around generate_image_async for callers outside an event loop."""
+        return asyncio.run(self.generate_image_async(prompt, output_path, orientation, use_cache, style=style,
+                                                     generated_only=generated_only))
+
+    async def generate_image_async(self, prompt, output_path, orientation="portrait", use_cache=True, refresh=False,
+                                   style="noir", generated_only=False):
+        """
+        Generates an image with the first provider that delivers (Pollinations first, hedged).
+        refresh drops any cached image for the request first (e.g. one that failed to decode).
+        Stickman images must be the generated white-background drawings, so no stock photo hedge.
+        generated_only leaves out both stock photos and the placeholder: no image rather than a stand-in.
+        """
         # Add flavor tags to the prompt to ensure rich, purely animated visuals
         enhanced_prompt = f"{prompt}, centered composition, detailed textures, volumetric lighting, high dynamic range, digital art style, no people, no real humans, no text, no qr code, no watermark"
-        encoded_prompt = urllib.parse.quote(enhanced_prompt)
         
         # Dimensions for Pollinations
         if orientation == "portrait":
@@ -52,15 +100,42 @@ class AssetManager:
             width, height = 1920, 1080
         else: # Thumbnail
             width, height = 1280, 720
-            
-        import random
-        seed = random.randint(1, 1000000)
-        
-        url = f"https://image.pollinations.ai/prompt/{encoded_prompt}?width={width}&height={height}&nologo=true&enhance=true&seed={seed}"
+
+        # Identical request -> identical cache entry, regardless of which scene index asked for it
+        seed_policy = Config.IMAGE_SEED_POLICY
+        cache_key = FileCache.make_key("pollinations", enhanced_prompt, width, height, seed_policy)
+        meta = self.image_cache.get_meta(cache_key)
+        if refresh or (meta and meta.get('provider') in self.STOCK_PROVIDERS):
+            # Older runs cached stock hedge winners under this generated-image key
+            self.image_cache.discard(cache_key)
+        elif use_cache and self.image_cache.get(cache_key, output_path):
+            print(f"Image cache hit for: {prompt[:60]}")
+            return True
+
+        seed = self._pick_seed(enhanced_prompt, width, height, seed_policy)
         
-        return self.download_file(url, output_path)
+        ensure_dir_exists(os.path.dirname(output_path) or ".")
+        provider = await self.image_fetcher.fetch(enhanced_prompt, output_path, width, height, seed,
+                                                  allow_stock=style != "stickman" and not generated_only,
+                                                  allow_placeholder=not generated_only)
+        if provider is None:
+            print(f"No image provider delivered for: {prompt[:60]}")
+            return False
+        # The key describes a generated image: a stock photo or placeholder stands in for this run only
+        if use_cache and not provider.stock and provider.hedgeable:
+            self.image_cache.put(cache_key, output_path, meta={'seed': seed, 'provider': provider.name})
+        return True
+
+    def _pick_seed(self, enhanced_prompt, width, height, seed_policy):
+        """'deterministic' derives the seed from the request so re-renders reproduce the same image."""
+        if seed_policy == "deterministic":
+            digest = hashlib.sha256(f"{enhanced_prompt}|{width}x{height}".encode('utf-8')).hexdigest()
+            return int(digest[:8], 16) % 1000000 + 1
+        import random
+        return random.randint(1, 1000000)
 
     def generate_thumbnail(self, title, output_path):
         """Generates a high-clickability thumbnail image."""
         prompt = f"Highly evocative, mysterious psychology thumbnail for '{title}', surrealist ink wash, dark moody atmosphere, psychological noir, minimalist, no text, 8k, cinematic"
-        return self.generate_image(prompt, output_path, orientation="thumbnail")
+        # A stock photo or gradient makes a worse thumbnail than YouTube's own frame grab
+        return self.generate_image(prompt, output_path, orientation="thumbnail", generated_only=True)
@@ -0,0 +1,176 @@
+import os
+import wave
+import subprocess
+import numpy as np
+
+# edge-tts delivers 24kHz mono MP3, so decoding at the native rate avoids resampling
+SAMPLE_RATE = 24000
+
+def _ffmpeg_exe():
+    from imageio_ffmpeg import get_ffmpeg_exe
+    return get_ffmpeg_exe()
+
+def decode_audio(source, sample_rate=SAMPLE_RATE):
+    """
+    Decodes an audio file path or in-memory bytes to mono int16 PCM.
+    The decoder writes raw samples to a pipe, so nothing touches the disk.
+    """
+    from_bytes = isinstance(source, (bytes, bytearray))
+    command = [
+        _ffmpeg_exe(), "-v", "error",
+        "-i", "pipe:0" if from_bytes else source,
+        "-f", "s16le", "-ac", "1", "-ar", str(sample_rate), "pipe:1"
+    ]
+    result = subprocess.run(
+        command, input=bytes(source) if from_bytes else None,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True
+    )
+    return np.frombuffer(result.stdout, dtype=np.int16)
+
+def find_silences(samples, sample_rate=SAMPLE_RATE, threshold_db=-45, min_duration=0.3, window=0.02):
+    """
+    Returns (start, end) sample ranges of silence lasting at least min_duration.
+    Mirrors ffmpeg's silenceremove RMS detection: 20ms windows compared against threshold_db (dBFS).
+    """
+    if len(samples) == 0:
+        return []
+    win = max(1, int(round(sample_rate * window)))
+    n_win = -(-len(samples) // win)
+
+    # Pad the tail window with zeros so every window has the same length
+    padded = np.zeros(n_win * win, dtype=np.float32)
+    padded[:len(samples)] = samples
+    frames = padded.reshape(n_win, win) / 32768.0
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    silent = rms < 10 ** (threshold_db / 20.0)
+
+    # Run-length encode the silent windows
+    edges = np.diff(np.concatenate(([0], silent.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    long_enough = (ends - starts) * win >= min_duration * sample_rate
+
+    return [
+        (int(s * win), int(min(e * win, len(samples))))
+        for s, e in zip(starts[long_enough], ends[long_enough])
+    ]
+
+def trim_silence(samples, sample_rate=SAMPLE_RATE, threshold_db=-45, min_duration=0.3):
+    """
+    Shortens every silence longer than min_duration down to min_duration, like ffmpeg's
+    silenceremove with stop_periods=-1 (a natural pause is kept, dead air is cut).
+    Returns (trimmed_samples, removed) where removed lists (start, end) in seconds of the original audio.
+    """
+    silences = find_silences(samples, sample_rate, threshold_db, min_duration)
+    keep_len = int(round(min_duration * sample_rate))
+    cuts = [(start + keep_len, end) for start, end in silences if end - start > keep_len]
+    if not cuts:
+        return samples, []
+
+    # Mark removed ranges with +1/-1 and integrate, instead of looping over samples
+    marks = np.zeros(len(samples) + 1, dtype=np.int32)
+    for start, end in cuts:
+        marks[start] += 1
+        marks[end] -= 1
+    keep = np.cumsum(marks[:-1]) == 0
+
+    removed = [(start / sample_rate, end / sample_rate) for start, end in cuts]
+    return samples[keep], removed
+
+def remap_time(t, removed):
+    """Maps a timestamp of the original audio onto the trimmed audio."""
+    shift = 0.0
+    for start, end in removed:
+        if t <= start:
+            break
+        shift += min(t, end) - start
+    return t - shift
+
+def write_wav(path, samples, sample_rate=SAMPLE_RATE):
+    """Writes mono int16 PCM as WAV (lossless, no encoder process)."""
+    tmp_path = path + ".tmp"
+    with wave.open(tmp_path, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(np.ascontiguousarray(samples, dtype=np.int16).tobytes())
+    os.replace(tmp_path, path)
+
+def encode_audio(path, samples, sample_rate=SAMPLE_RATE):
+    """Single lossy encode of PCM to whatever format the path extension asks for."""
+    ext = os.path.splitext(path)[1]
+    tmp_path = path + ".tmp" + ext
+    command = [
+        _ffmpeg_exe(), "-y", "-v", "error",
+        "-f", "s16le", "-ac", "1", "-ar", str(sample_rate), "-i", "pipe:0",
+        tmp_path
+    ]
+    subprocess.run(
+        command, input=np.ascontiguousarray(samples, dtype=np.int16).tobytes(),
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True
+    )
+    os.replace(tmp_path, path)
+
+def save_audio(path, samples, sample_rate=SAMPLE_RATE):
+    if path.lower().endswith(".wav"):
+        write_wav(path, samples, sample_rate)
+    else:
+        encode_audio(path, samples, sample_rate)
+    return len(samples) / sample_rate
+
+def audio_duration(path):
+    """Duration in seconds; WAV headers are read directly, anything else is decoded."""
+    if path.lower().endswith(".wav"):
+        with wave.open(path, 'rb') as wf:
+            return wf.getnframes() / wf.getframerate()
+    return len(decode_audio(path)) / SAMPLE_RATE
+
+class StreamingDecoder:
+    """
+    Decodes a compressed audio stream while it is still arriving.
+    Chunks are piped into a single ffmpeg decoder as they come in and PCM is collected in memory.
+    """
+    def __init__(self, sample_rate=SAMPLE_RATE, input_format="mp3"):
+        self.sample_rate = sample_rate
+        self.input_format = input_format
+        self._proc = None
+        self._reader = None
+        self._pcm = bytearray()
+
+    async def start(self):
+        import asyncio
+        self._proc = await asyncio.create_subprocess_exec(
+            _ffmpeg_exe(), "-v", "error", "-f", self.input_format, "-i", "pipe:0",
+            "-f", "s16le", "-ac", "1", "-ar", str(self.sample_rate), "pipe:1",
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+        )
+        self._reader = asyncio.create_task(self._read_pcm())
+        return self
+
+    async def _read_pcm(self):
+        while True:
+            block = await self._proc.stdout.read(65536)
+            if not block:
+                break
+            self._pcm.extend(block)
+
+    async def feed(self, chunk):
+        self._proc.stdin.write(chunk)
+        await self._proc.stdin.drain()
+
+    async def finish(self):
+        """Closes the input and returns the decoded samples."""
+        self._proc.stdin.close()
+        await self._reader
+        returncode = await self._proc.wait()
+        if returncode != 0:
+            raise RuntimeError(f"ffmpeg decoder exited with code {returncode}")
+        usable = len(self._pcm) - len(self._pcm) % 2
+        return np.frombuffer(bytes(self._pcm[:usable]), dtype=np.int16)
+
+    async def abort(self):
+        if self._proc and self._proc.returncode is None:
+            self._proc.kill()
+            await self._proc.wait()
+        if self._reader:
+            self._reader.cancel()
@@ -0,0 +1,65 @@
+import argparse
+import asyncio
+import sys
+from src.utils import setup_logging, ensure_dir_exists
+from src.run_manifest import RunManifest
+from src.jobs import SharedServices, run_jobs
+
+logger = setup_logging()
+
+def parse_job(spec):
+    """'long:stickman' -> {'type': 'long', 'style': 'stickman'}"""
+    video_type, _, style = spec.partition(":")
+    if video_type not in ("long", "short") or style not in ("noir", "stickman"):
+        raise argparse.ArgumentTypeError(f"invalid job '{spec}', expected <long|short>:<noir|stickman>")
+    return {'type': video_type, 'style': style}
+
+async def main():
+    parser = argparse.ArgumentParser(description="Media Generation Engine - several videos in one process")
+    parser.add_argument("--jobs", type=parse_job, nargs="+", required=True, metavar="TYPE:STYLE", help="Videos to produce, e.g. long:stickman short:stickman")
+    parser.add_argument("--topics", type=str, nargs="+", default=[], help="Topics for the jobs, in order; jobs without one get a discovered topic")
+    parser.add_argument("--dry-run", action="store_true", help="Generate videos but do not upload")
+    parser.add_argument("--tts-concurrency", type=int, default=None, help="Max in-flight TTS requests across all jobs (default: Config.TTS_CONCURRENCY)")
+    parser.add_argument("--image-concurrency", type=int, default=None, help="Max in-flight image requests across all jobs (default: Config.IMAGE_CONCURRENCY)")
+    parser.add_argument("--render-concurrency", type=int, default=None, help="Max videos rendering at once (default: Config.RENDER_CONCURRENCY)")
+    parser.add_argument("--render-mode", type=str, choices=["single", "segmented"], default=None, help="Render as one graph or as parallel per-scene segments (default: Config.RENDER_MODE)")
+    parser.add_argument("--backend", type=str, choices=["moviepy", "ffmpeg"], default=None, help="Render backend (default: Config.RENDER_BACKEND)")
+    args = parser.parse_args()
+
+    ensure_dir_exists("temp")
+    ensure_dir_exists("output")
+
+    shared = SharedServices(
+        tts_concurrency=args.tts_concurrency,
+        image_concurrency=args.image_concurrency,
+        render_concurrency=args.render_concurrency
+    )
+
+    try:
+        # One discovery call covers every job that needs a topic, and they never get the same one
+        jobs = args.jobs
+        topics = list(args.topics[:len(jobs)])
+        missing = len(jobs) - len(topics)
+        if missing:
+            discovered = shared.trend_engine.get_viral_topics(shared.llm, missing)
+            if len(discovered) < missing:
+                logger.error(f"Discovered {len(discovered)} of {missing} topics needed")
+                sys.exit(1)
+            topics += discovered
+
+        manifests = [RunManifest.create(dict(job, topic=topic)) for job, topic in zip(jobs, topics)]
+        logger.info(f"Starting batch of {len(manifests)} jobs: " + ", ".join(f"{m.params['type']}/{m.params['style']}" for m in manifests))
+
+        results = await run_jobs(shared, manifests, dry_run=args.dry_run, render_mode=args.render_mode, backend=args.backend)
+        logger.info(f"Batch finished: {sum(results)}/{len(results)} jobs succeeded")
+        if not all(results):
+            sys.exit(1)
+    finally:
+        shared.close()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except Exception as e:
+        print(f"FATAL ERROR: {e}")
+        sys.exit(1)
@@ -0,0 +1,392 @@
+"""
+Micro-benchmarks for the media pipeline hot paths.
+
+Usage:
+    python -m src.benchmarks silence [--file speech.mp3] [--runs 5]
+    python -m src.benchmarks caption [--runs 20]
+    python -m src.benchmarks kenburns [--frames 48]
+    python -m src.benchmarks stickman [--frames 48]
+    python -m src.benchmarks render [--scenes 25] [--seconds 3] [--type long] [--style noir]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+import numpy as np
+
+def _time_runs(fn, runs):
+    timings = []
+    result = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return result, timings
+
+def _report(label, timings, extra=""):
+    mean_ms = statistics.mean(timings) * 1000
+    best_ms = min(timings) * 1000
+    print(f"{label:<28} mean {mean_ms:8.1f} ms   best {best_ms:8.1f} ms   {extra}")
+
+# --- Silence trimming -------------------------------------------------------
+
+def _legacy_remove_silence(file_path):
+    """The original per-file ffmpeg silenceremove pass (decode, filter, re-encode, replace)."""
+    from imageio_ffmpeg import get_ffmpeg_exe
+    temp_path = file_path.replace(".mp3", "_temp.mp3")
+    command = [
+        get_ffmpeg_exe(), "-y", "-i", file_path,
+        "-af", "silenceremove=stop_periods=-1:stop_duration=0.3:stop_threshold=-45dB",
+        temp_path
+    ]
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.replace(temp_path, file_path)
+
+def _make_test_speech(path, seconds=15):
+    """Speech-like test signal: 0.8s voiced bursts separated by 0.5s pauses."""
+    from .audio_processing import SAMPLE_RATE, encode_audio
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    voiced = (t % 1.3) < 0.8
+    signal = 0.3 * np.sin(2 * np.pi * 180 * t) * (1 + 0.5 * np.sin(2 * np.pi * 3 * t))
+    encode_audio(path, (signal * voiced * 32767).astype(np.int16))
+
+def bench_silence(args):
+    from . import audio_processing
+
+    work_dir = tempfile.mkdtemp(prefix="bench_silence_")
+    try:
+        source = args.file or os.path.join(work_dir, "source.mp3")
+        if not args.file:
+            _make_test_speech(source)
+
+        legacy_path = os.path.join(work_dir, "legacy.mp3")
+        def run_legacy():
+            shutil.copyfile(source, legacy_path)
+            _legacy_remove_silence(legacy_path)
+            return len(audio_processing.decode_audio(legacy_path)) / audio_processing.SAMPLE_RATE
+
+        inproc_path = os.path.join(work_dir, "inproc.wav")
+        def run_inprocess():
+            samples = audio_processing.decode_audio(source)
+            trimmed, _ = audio_processing.trim_silence(samples)
+            return audio_processing.save_audio(inproc_path, trimmed)
+
+        samples = audio_processing.decode_audio(source)
+        detect_result, detect_timings = _time_runs(lambda: audio_processing.find_silences(samples), args.runs)
+        legacy_duration, legacy_timings = _time_runs(run_legacy, args.runs)
+        inproc_duration, inproc_timings = _time_runs(run_inprocess, args.runs)
+
+        print(f"Source: {source} ({len(samples) / audio_processing.SAMPLE_RATE:.2f}s)")
+        _report("ffmpeg subprocess", legacy_timings, f"-> {legacy_duration:.2f}s")
+        _report("in-process (decode+trim)", inproc_timings, f"-> {inproc_duration:.2f}s")
+        _report("  numpy detection only", detect_timings, f"{len(detect_result)} silences")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+# --- Caption rasterization -------------------------------------------------
+
+def _first_available_font():
+    from PIL import ImageFont
+    from .captions import FONT_CANDIDATES
+    for candidate in FONT_CANDIDATES:
+        try:
+            ImageFont.truetype(candidate, 10)
+            return candidate
+        except Exception:
+            continue
+    return None
+
+def _legacy_caption(text, size, fontsize, color, stroke_color, stroke_width, font_path):
+    """The original _create_text_clip raster: font reload, (2w+1)^2 stroke passes, luminance mask."""
+    import textwrap
+    from PIL import Image, ImageDraw, ImageFont
+    # Same face as the new rasterizer so only the technique differs
+    font = ImageFont.truetype(font_path, fontsize) if font_path else ImageFont.load_default()
+    img = Image.new('RGBA', size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    current_h = 10
+    for line in textwrap.wrap(text, width=30):
+        bbox = draw.textbbox((0, 0), line, font=font)
+        w, h = bbox[2] - bbox[0], bbox[3] - bbox[1]
+        for offset_x in range(-stroke_width, stroke_width + 1):
+            for offset_y in range(-stroke_width, stroke_width + 1):
+                draw.text(((size[0]-w)/2 + offset_x, current_h + offset_y), line, font=font, fill=stroke_color)
+        draw.text(((size[0]-w)/2, current_h), line, font=font, fill=color)
+        current_h += h + 15
+    return np.array(img.convert('RGB')), np.array(img.convert('L'))
+
+def bench_caption(args):
+    from .captions import rasterize_caption
+
+    font_path = _first_available_font()
+    print(f"Font: {font_path or 'PIL default'}")
+    text = "The hidden reason you overthink everything is not what you were told, and it starts in childhood"
+    cases = [
+        ("short (1080w, 50px, stroke 2)", (972, 400), 50, 2),
+        ("long (1920w, 40px, stroke 1)", (1536, 400), 40, 1),
+    ]
+    for label, size, fontsize, stroke in cases:
+        for color, stroke_color in (('white', 'black'), ('black', 'white')):
+            style = f"{label} {color}"
+            legacy, legacy_timings = _time_runs(
+                lambda: _legacy_caption(text, size, fontsize, color, stroke_color, stroke, font_path), args.runs)
+
+            def fresh():
+                rasterize_caption.cache_clear()
+                return rasterize_caption(text, size, fontsize, color, stroke_color, stroke)
+            fresh_result, fresh_timings = _time_runs(fresh, args.runs)
+            _, cached_timings = _time_runs(
+                lambda: rasterize_caption(text, size, fontsize, color, stroke_color, stroke), args.runs)
+
+            # Fraction of text pixels the mask leaves visible (luminance masks drop dark text)
+            legacy_text = (np.asarray(legacy[0]).max(axis=2) < 128) if color == 'black' else (np.asarray(legacy[0]).min(axis=2) > 128)
+            opaque_legacy = (legacy[1][legacy_text] > 127).mean() if legacy_text.any() else 0.0
+            new_rgb, new_alpha = fresh_result
+            new_text = (new_rgb.max(axis=2) < 128) if color == 'black' else (new_rgb.min(axis=2) > 128)
+            new_text &= new_alpha > 0
+            opaque_new = (new_alpha[new_text] > 0.5).mean() if new_text.any() else 0.0
+
+            print(style)
+            _report("  legacy", legacy_timings, f"text opaque {opaque_legacy:.0%}")
+            _report("  single-pass stroke", fresh_timings, f"text opaque {opaque_new:.0%}")
+            _report("  memoized hit", cached_timings)
+
+# --- Ken Burns ---------------------------------------------------------------
+
+def _legacy_ken_burns(image_path, target_w, target_h, anim_type, duration, is_short):
+    """The original noir MoviePy chain: 1.3x resize, crop, per-frame lambda resize/position, crop."""
+    from moviepy.editor import ImageClip
+    img_clip = ImageClip(image_path).set_duration(duration)
+    if is_short:
+        img_clip = img_clip.resize(height=int(target_h * 1.3))
+    else:
+        img_clip = img_clip.resize(width=int(target_w * 1.3))
+    img_clip = img_clip.crop(x_center=img_clip.w/2, y_center=img_clip.h/2, width=int(target_w * 1.1), height=int(target_h * 1.1))
+    if anim_type == 'zoom_in':
+        video_clip = img_clip.resize(lambda t: 1.0 + 0.15 * (t/duration)).set_position('center')
+    elif anim_type == 'zoom_out':
+        video_clip = img_clip.resize(lambda t: 1.15 - 0.15 * (t/duration)).set_position('center')
+    else:
+        video_clip = img_clip.set_position(lambda t: (int(-0.1 * target_w * (t/duration)), 'center'))
+    return video_clip.crop(x_center=video_clip.w/2, y_center=video_clip.h/2, width=target_w, height=target_h)
+
+def _make_test_image(path, size):
+    from PIL import Image
+    rng = np.random.RandomState(0)
+    small = (rng.rand(size[1] // 16, size[0] // 16, 3) * 255).astype(np.uint8)
+    Image.fromarray(small).resize(size, Image.BICUBIC).save(path, quality=92)
+
+def bench_ken_burns(args):
+    from .ken_burns import KenBurns
+
+    work_dir = tempfile.mkdtemp(prefix="bench_kb_")
+    try:
+        for label, (tw, th), is_short in (("1080x1920", (1080, 1920), True), ("1920x1080", (1920, 1080), False)):
+            # Pollinations returns images at the target resolution
+            image_path = os.path.join(work_dir, f"source_{label}.jpg")
+            _make_test_image(image_path, (tw, th))
+            duration = args.frames / 24.0
+            times = [n / 24.0 for n in range(args.frames)]
+            print(label)
+            for anim_type in KenBurns.ANIMATIONS:
+                legacy = _legacy_ken_burns(image_path, tw, th, anim_type, duration, is_short)
+                _, legacy_timings = _time_runs(lambda: [legacy.get_frame(t) for t in times], 1)
+
+                started = time.perf_counter()
+                engine = KenBurns(image_path, (tw, th), anim_type, duration)
+                setup = time.perf_counter() - started
+                _, new_timings = _time_runs(lambda: [engine.get_frame(t) for t in times], 1)
+
+                legacy_fps = args.frames / legacy_timings[0]
+                new_fps = args.frames / new_timings[0]
+                print(f"  {anim_type:<10} legacy {legacy_fps:7.1f} fps   engine {new_fps:8.1f} fps "
+                      f"(setup {setup * 1000:.0f} ms)   {new_fps / legacy_fps:5.1f}x")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+# --- Stickman animation ------------------------------------------------------
+
+def _legacy_stickman(image_path, target_w, target_h, v_action, duration):
+    """The original stickman chain: lambda position/rotate/resize, fades, full-frame white composite."""
+    import math
+    import random
+    from moviepy.editor import ImageClip, ColorClip, CompositeVideoClip
+    bg_clip = ColorClip(size=(target_w, target_h), color=(255, 255, 255)).set_duration(duration)
+    img_clip = ImageClip(image_path).set_duration(duration).resize(width=int(target_w * 0.7))
+    base_pos = lambda t: ('center', (target_h/2 - img_clip.h/2) + 15 * math.sin(2 * math.pi * 0.33 * t))
+    if v_action == 'jumping':
+        video_clip = img_clip.set_position(lambda t: ('center', (target_h/2 - img_clip.h/2) - abs(100 * math.sin(2 * math.pi * 0.8 * t))))
+    elif v_action == 'waving':
+        video_clip = img_clip.rotate(lambda t: 5 * math.sin(2 * math.pi * 0.5 * t)).set_position(base_pos)
+    elif v_action == 'shaking':
+        video_clip = img_clip.set_position(lambda t: ('center', (target_h/2 - img_clip.h/2) + random.uniform(-10, 10)))
+    elif v_action == 'bouncing':
+        video_clip = img_clip.resize(lambda t: 1.0 + 0.1 * abs(math.sin(2 * math.pi * 0.7 * t))).set_position(base_pos)
+    else:
+        video_clip = img_clip.set_position(base_pos)
+    if v_action != 'bouncing':
+        video_clip = video_clip.resize(lambda t: 1.0 + 0.015 * math.sin(2 * math.pi * 0.25 * t))
+    video_clip = video_clip.fadein(0.5).fadeout(0.5)
+    return CompositeVideoClip([bg_clip, video_clip.set_start(0)])
+
+def bench_stickman(args):
+    from .stickman import StickmanAnimator
+
+    work_dir = tempfile.mkdtemp(prefix="bench_stickman_")
+    try:
+        for label, (tw, th) in (("1080x1920", (1080, 1920)), ("1920x1080", (1920, 1080))):
+            image_path = os.path.join(work_dir, f"source_{label}.jpg")
+            _make_test_image(image_path, (tw, th))
+            duration = args.frames / 24.0
+            times = [n / 24.0 for n in range(args.frames)]
+            print(label)
+            for action in ('talking', 'jumping', 'waving', 'shaking', 'bouncing'):
+                legacy = _legacy_stickman(image_path, tw, th, action, duration)
+                _, legacy_timings = _time_runs(lambda: [legacy.get_frame(t) for t in times], 1)
+
+                engine = StickmanAnimator(image_path, (tw, th), action, duration, seed=1)
+                frames, new_timings = _time_runs(lambda: [engine.get_frame(t) for t in times], 1)
+                replay = StickmanAnimator(image_path, (tw, th), action, duration, seed=1)
+                deterministic = all(np.array_equal(f, replay.get_frame(t)) for f, t in zip(frames, times))
+
+                legacy_fps = args.frames / legacy_timings[0]
+                new_fps = args.frames / new_timings[0]
+                print(f"  {action:<9} legacy {legacy_fps:6.1f} fps   engine {new_fps:6.1f} fps   "
+                      f"{new_fps / legacy_fps:5.1f}x   deterministic={deterministic}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+# --- Render backends ---------------------------------------------------------
+
+def _render_with_backend(job):
+    """Runs in a fresh process so wall time and peak RSS belong to this backend alone."""
+    import resource
+    from .video_editor import VideoEditor
+    backend, scenes, output_path, is_short, style = job
+    started = time.perf_counter()
+    ok = VideoEditor().create_video(scenes, output_path, is_short=is_short, style=style, backend=backend)
+    wall = time.perf_counter() - started
+    # ru_maxrss is in KiB on Linux; children = the largest ffmpeg process we waited for
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return ok, wall, own, children
+
+def _probe_video(path):
+    """(duration, width, height) parsed from ffmpeg's stream summary."""
+    import re
+    from imageio_ffmpeg import get_ffmpeg_exe
+    info = subprocess.run([get_ffmpeg_exe(), "-hide_banner", "-i", path], stderr=subprocess.PIPE).stderr.decode(errors="replace")
+    h, m, sec = re.search(r"Duration: (\d+):(\d+):([\d.]+)", info).groups()
+    w, ht = re.search(r"Video: .*?, (\d{2,5})x(\d{2,5})", info).groups()
+    return int(h) * 3600 + int(m) * 60 + float(sec), int(w), int(ht)
+
+def _grab_frame(path, t, size):
+    from imageio_ffmpeg import get_ffmpeg_exe
+    raw = subprocess.run(
+        [get_ffmpeg_exe(), "-v", "error", "-ss", f"{t:.3f}", "-i", path, "-frames:v", "1",
+         "-f", "rawvideo", "-pix_fmt", "rgb24", "pipe:1"],
+        stdout=subprocess.PIPE, check=True
+    ).stdout
+    return np.frombuffer(raw, dtype=np.uint8).reshape(size[1], size[0], 3)
+
+def _psnr(a, b):
+    mse = np.mean((a.astype(np.float32) - b.astype(np.float32)) ** 2)
+    return float("inf") if mse == 0 else 10 * np.log10(255.0 ** 2 / mse)
+
+def bench_render(args):
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+    from .audio_processing import SAMPLE_RATE, write_wav
+    from .ken_burns import KenBurns
+
+    is_short = args.type == "short"
+    size = (1080, 1920) if is_short else (1920, 1080)
+    work_dir = tempfile.mkdtemp(prefix="bench_render_")
+    try:
+        scenes = []
+        actions = ('talking', 'jumping', 'waving', 'shaking', 'bouncing')
+        t = np.arange(int(args.seconds * SAMPLE_RATE)) / SAMPLE_RATE
+        for i in range(args.scenes):
+            image_path = os.path.join(work_dir, f"visual_{i}.jpg")
+            _make_test_image(image_path, size)
+            audio_path = os.path.join(work_dir, f"audio_{i}.wav")
+            write_wav(audio_path, (0.2 * np.sin(2 * np.pi * (180 + 10 * i) * t) * 32767).astype(np.int16))
+            text = f"Scene {i + 1}: the same caption text goes through both backends"
+            scenes.append({
+                'audio_path': audio_path, 'video_path': image_path, 'text': text,
+                'vocal_action': actions[i % len(actions)], 'duration': args.seconds,
+                # Pin the animation so both backends draw the same motion
+                'animation': KenBurns.ANIMATIONS[i % len(KenBurns.ANIMATIONS)],
+                'words': [{'text': w, 'start': k * 0.3, 'end': k * 0.3 + 0.25} for k, w in enumerate(text.split())],
+            })
+
+        print(f"{args.scenes} scenes x {args.seconds:.1f}s, {size[0]}x{size[1]}, style={args.style}")
+        outputs = {}
+        ctx = multiprocessing.get_context("spawn")
+        for backend in ("moviepy", "ffmpeg"):
+            outputs[backend] = os.path.join(work_dir, f"out_{backend}.mp4")
+            job = (backend, scenes, outputs[backend], is_short, args.style)
+            with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                ok, wall, own, children = pool.submit(_render_with_backend, job).result()
+            print(f"  {backend:<8} ok={ok}   wall {wall:7.1f} s   peak RSS python {own:6.0f} MB, "
+                  f"largest child {children:6.0f} MB")
+            if not ok:
+                return
+
+        # Parity: container duration and size, then PSNR at every scene midpoint
+        probes = {b: _probe_video(p) for b, p in outputs.items()}
+        for backend, (duration, w, h) in probes.items():
+            print(f"  {backend:<8} {w}x{h}, {duration:.2f}s (expected {args.scenes * args.seconds:.2f}s)")
+        scores = []
+        for i in range(args.scenes):
+            mid = (i + 0.5) * args.seconds
+            a = _grab_frame(outputs["moviepy"], mid, size)
+            b = _grab_frame(outputs["ffmpeg"], mid, size)
+            scores.append(_psnr(a, b))
+        print(f"  midpoint PSNR: mean {statistics.mean(scores):.1f} dB, worst {min(scores):.1f} dB "
+              f"(scene {int(np.argmin(scores)) + 1})")
+        if args.style == "stickman":
+            # Each action is its own motion expression, so a mean over all scenes can hide one that drifts
+            for action in actions:
+                per_action = [score for scene, score in zip(scenes, scores) if scene['vocal_action'] == action]
+                if per_action:
+                    print(f"    {action:<9} mean {statistics.mean(per_action):.1f} dB, worst {min(per_action):.1f} dB")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Media pipeline benchmarks")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    silence = sub.add_parser("silence", help="In-process silence trimming vs the ffmpeg subprocess pass")
+    silence.add_argument("--file", type=str, help="MP3 to trim (default: synthetic speech-like signal)")
+    silence.add_argument("--runs", type=int, default=5)
+    silence.set_defaults(func=bench_silence)
+
+    caption = sub.add_parser("caption", help="Caption rasterizer vs the original per-call PIL implementation")
+    caption.add_argument("--runs", type=int, default=20)
+    caption.set_defaults(func=bench_caption)
+
+    kenburns = sub.add_parser("kenburns", help="Ken Burns frame throughput vs the MoviePy lambda chain")
+    kenburns.add_argument("--frames", type=int, default=48)
+    kenburns.set_defaults(func=bench_ken_burns)
+
+    stickman = sub.add_parser("stickman", help="Stickman animation throughput vs the MoviePy lambda chain")
+    stickman.add_argument("--frames", type=int, default=48)
+    stickman.set_defaults(func=bench_stickman)
+
+    render = sub.add_parser("render", help="MoviePy vs ffmpeg filter_complex backend: wall time, peak RSS, output parity")
+    render.add_argument("--scenes", type=int, default=25)
+    render.add_argument("--seconds", type=float, default=3.0)
+    render.add_argument("--type", type=str, choices=["long", "short"], default="long")
+    render.add_argument("--style", type=str, choices=["noir", "stickman"], default="noir")
+    render.set_defaults(func=bench_render)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+import os
+import json
+import time
+import atexit
+import shutil
+import hashlib
+import threading
+import logging
+from contextlib import contextmanager
+from .utils import ensure_dir_exists
+
+try:
+    import fcntl
+except ImportError: # Windows: no cross-process lock, in-process lock only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+class FileCache:
+    """
+    On-disk cache of generated files addressed by the hash of the request that produced them.
+    A JSON index tracks size and last access time so the cache can be trimmed LRU-first.
+    Hits only touch the in-memory index; the touches are written with the next put/discard (or
+    at exit). Every write merges into the index on disk under a file lock, so several processes
+    sharing the cache keep each other's entries.
+    """
+    def __init__(self, cache_dir, max_bytes, index_name="index.json"):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(cache_dir, index_name)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Changes not yet written: key -> last access time, and keys whose entry is gone
+        self._touched = {}
+        self._dropped = set()
+        ensure_dir_exists(cache_dir)
+        self.index = self._load_index()
+        atexit.register(self.flush)
+
+    @staticmethod
+    def make_key(*parts):
+        """Stable key for any JSON-serialisable request description."""
+        raw = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _load_index(self):
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except Exception as e:
+                logger.warning(f"Cache index {self.index_path} unreadable, starting empty: {e}")
+        return {}
+
+    @contextmanager
+    def _index_locked(self):
+        """Exclusive flock on a side file; the index itself is replaced atomically, so it can't carry the lock."""
+        with open(self.index_path + ".lock", 'a+b') as f:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _save_index(self, update=None):
+        """
+        Re-reads the index on disk, applies this process's pending touches and drops plus update
+        (a function editing the merged index, e.g. a new entry and eviction) and writes it back.
+        Call with self._lock held.
+        """
+        with self._index_locked():
+            index = self._load_index()
+            for key in self._dropped:
+                index.pop(key, None)
+            for key, last_access in self._touched.items():
+                if key in index:
+                    index[key]['last_access'] = max(index[key].get('last_access', 0), last_access)
+            if update:
+                update(index)
+            tmp_path = f"{self.index_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(index, f, indent=1)
+            os.replace(tmp_path, self.index_path)
+        self.index = index
+        self._touched.clear()
+        self._dropped.clear()
+
+    def flush(self):
+        """Writes pending LRU touches (hits don't write the index themselves)."""
+        with self._lock:
+            if self._touched or self._dropped:
+                try:
+                    self._save_index()
+                except OSError as e:
+                    logger.warning(f"Could not write cache index {self.index_path}: {e}")
+
+    def _entry_path(self, entry):
+        return os.path.join(self.cache_dir, entry['file'])
+
+    def get(self, key, dest_path=None):
+        """
+        Returns the cached file path (copying it to dest_path if given), or None on a miss.
+        """
+        with self._lock:
+            entry = self.index.get(key)
+            if entry and os.path.exists(self._entry_path(entry)):
+                entry['last_access'] = self._touched[key] = time.time()
+                self.hits += 1
+                cached_path = self._entry_path(entry)
+            else:
+                if entry:
+                    # File vanished underneath us (evicted by another process), drop the stale entry
+                    del self.index[key]
+                    self._touched.pop(key, None)
+                    self._dropped.add(key)
+                self.misses += 1
+                return None
+
+        if dest_path:
+            ensure_dir_exists(os.path.dirname(dest_path) or ".")
+            try:
+                shutil.copyfile(cached_path, dest_path)
+            except OSError:
+                # Evicted by another writer between lookup and copy
+                return None
+            return dest_path
+        return cached_path
+
+    def get_meta(self, key):
+        with self._lock:
+            entry = self.index.get(key)
+            return dict(entry.get('meta', {})) if entry else None
+
+    def put(self, key, src_path, meta=None):
+        """Copies src_path into the cache under key and evicts old entries if over budget."""
+        if not os.path.exists(src_path):
+            return None
+        ext = os.path.splitext(src_path)[1]
+        return self._store(key, ext, meta, lambda tmp_path: shutil.copyfile(src_path, tmp_path))
+
+    def put_data(self, key, data, ext="", meta=None):
+        """Stores in-memory bytes under key (same eviction rules as put)."""
+        def write(tmp_path):
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+        return self._store(key, ext, meta, write)
+
+    def read_data(self, key):
+        """Returns the cached bytes for key, or None on a miss."""
+        cached_path = self.get(key)
+        if not cached_path:
+            return None
+        try:
+            with open(cached_path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def discard(self, key):
+        with self._lock:
+            entry = self.index.pop(key, None)
+            if entry is None:
+                return
+            try:
+                os.remove(self._entry_path(entry))
+            except OSError:
+                pass
+            self._touched.pop(key, None)
+            self._dropped.add(key)
+            self._save_index()
+
+    def _store(self, key, ext, meta, write):
+        file_name = f"{key}{ext}"
+        cached_path = os.path.join(self.cache_dir, file_name)
+        tmp_path = f"{cached_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        write(tmp_path)
+        os.replace(tmp_path, cached_path)
+
+        entry = {
+            'file': file_name,
+            'size': os.path.getsize(cached_path),
+            'last_access': time.time(),
+            'meta': meta or {}
+        }
+
+        def add(index):
+            index[key] = entry
+            self._evict(index, keep=key)
+
+        with self._lock:
+            self._dropped.discard(key)
+            self._save_index(add)
+        return cached_path
+
+    def _evict(self, index, keep=None):
+        """Trims the merged index LRU-first, so every process's entries count against the budget."""
+        total = sum(e['size'] for e in index.values())
+        if total <= self.max_bytes:
+            return
+        for key, entry in sorted(index.items(), key=lambda kv: kv[1]['last_access']):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            try:
+                os.remove(self._entry_path(entry))
+            except OSError:
+                pass
+            total -= entry['size']
+            del index[key]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        hit_rate = (self.hits / lookups) if lookups else 0.0
+        return f"{self.hits} hits / {self.misses} misses ({hit_rate:.0%} hit rate)"
@@ -0,0 +1,209 @@
+import bisect
+import textwrap
+from functools import lru_cache
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from .config import Config
+
+# Tried in order: Windows names first (local dev), then the Linux fonts installed in CI
+FONT_CANDIDATES = [
+    "arialbd.ttf",
+    "arial.ttf",
+    "LiberationSans-Bold.ttf",
+    "/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf",
+    "DejaVuSans-Bold.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+]
+
+@lru_cache(maxsize=None)
+def load_font(fontsize):
+    """Process-wide font cache: each size is loaded from disk once."""
+    for candidate in FONT_CANDIDATES:
+        try:
+            return ImageFont.truetype(candidate, fontsize)
+        except Exception:
+            continue
+    return ImageFont.load_default()
+
+
+def use_karaoke(scene, is_short):
+    """Word-timed captions are used for shorts whenever the TTS gave us word timings."""
+    return bool(is_short and scene.get('words') and Config.CAPTION_STYLE == "karaoke")
+
+def caption_layout(target_size, is_short, style, karaoke=False):
+    """Caption box, font and placement shared by every render backend."""
+    target_w, target_h = target_size
+    layout = {
+        'color': 'black' if style == "stickman" else 'white',
+        'stroke_color': 'white' if style == "stickman" else 'black',
+        'highlight_color': '#E63946' if style == "stickman" else '#FFD400',
+    }
+    txt_h = 400
+    if karaoke:
+        layout.update(size=(int(target_w * 0.9), txt_h), fontsize=70, stroke_width=4, y=target_h * 0.75)
+    elif is_short:
+        layout.update(size=(int(target_w * 0.9), txt_h), fontsize=50, stroke_width=2, y=target_h * 0.8)
+    else:
+        layout.update(size=(int(target_w * 0.8), txt_h), fontsize=40, stroke_width=1, y=target_h * 0.85)
+    return layout
+
+
+@lru_cache(maxsize=256)
+def rasterize_caption(text, size, fontsize, color, stroke_color, stroke_width, wrap_width=30):
+    """
+    Renders a centred, word-wrapped caption once and memoizes it.
+    Returns (rgb, alpha) uint8/float32 arrays; the alpha comes from the RGBA image itself,
+    so dark text on a light stroke stays opaque.
+    """
+    font = load_font(fontsize)
+    img = Image.new('RGBA', size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+
+    current_h = 10 # Some top padding
+    for line in textwrap.wrap(text, width=wrap_width):
+        bbox = draw.textbbox((0, 0), line, font=font)
+        w, h = bbox[2] - bbox[0], bbox[3] - bbox[1]
+        # PIL strokes the glyph outline in the same pass as the fill
+        draw.text(((size[0] - w) / 2, current_h), line, font=font, fill=color,
+                  stroke_width=stroke_width, stroke_fill=stroke_color)
+        current_h += h + 15
+
+    rgba = np.array(img)
+    rgb = np.ascontiguousarray(rgba[:, :, :3])
+    alpha = rgba[:, :, 3].astype(np.float32) / 255.0
+    # Shared between callers through the cache, so make accidental in-place edits fail loudly
+    rgb.flags.writeable = False
+    alpha.flags.writeable = False
+    return rgb, alpha
+
+
+class CaptionEngine:
+    """
+    Karaoke-style captions driven by TTS word timings.
+    Words are grouped into short phrases; the word being spoken is highlighted.
+    Every distinct (phrase, highlighted word) bitmap is rasterized once and reused for all its frames.
+    """
+    def __init__(self, size, fontsize, color, stroke_color, stroke_width,
+                 highlight_color="#FFD400", max_words=3, max_chars=18, max_gap=0.35):
+        self.size = size
+        self.fontsize = fontsize
+        self.color = color
+        self.stroke_color = stroke_color
+        self.stroke_width = stroke_width
+        self.highlight_color = highlight_color
+        self.max_words = max_words
+        self.max_chars = max_chars
+        self.max_gap = max_gap
+        self.font = load_font(fontsize)
+        self._bitmaps = {}
+
+        w, h = size
+        self._blank_rgb = np.zeros((h, w, 3), dtype=np.uint8)
+        self._blank_mask = np.zeros((h, w), dtype=np.float32)
+
+    def group_words(self, words, duration):
+        """Splits word timings into caption groups of at most max_words / max_chars."""
+        groups = []
+        current = []
+        for word in words:
+            if word['start'] >= duration:
+                break
+            if current:
+                chars = sum(len(w['text']) + 1 for w in current) + len(word['text'])
+                gap = word['start'] - current[-1]['end']
+                ends_phrase = current[-1]['text'][-1:] in ".,!?;:"
+                if len(current) >= self.max_words or chars > self.max_chars or gap > self.max_gap or ends_phrase:
+                    groups.append(current)
+                    current = []
+            current.append(word)
+        if current:
+            groups.append(current)
+        return groups
+
+    def build_timeline(self, words, duration):
+        """
+        Returns a sorted list of (start, end, tokens, active_index) entries.
+        A group stays on screen until the next one starts, so captions don't flicker between words.
+        """
+        groups = self.group_words(words, duration)
+        timeline = []
+        for g, group in enumerate(groups):
+            group_end = groups[g + 1][0]['start'] if g + 1 < len(groups) else duration
+            tokens = tuple(w['text'] for w in group)
+            for k, word in enumerate(group):
+                start = word['start']
+                end = group[k + 1]['start'] if k + 1 < len(group) else group_end
+                if end > start:
+                    timeline.append((start, min(end, duration), tokens, k))
+        return timeline
+
+    def _layout(self, draw, tokens):
+        """Greedy word wrap; returns lines of (token_index, text, width) plus the line height."""
+        space = draw.textlength(" ", font=self.font)
+        max_w = self.size[0] - 2 * self.stroke_width
+        lines = [[]]
+        line_w = 0
+        for k, token in enumerate(tokens):
+            token_w = draw.textlength(token, font=self.font)
+            if lines[-1] and line_w + space + token_w > max_w:
+                lines.append([])
+                line_w = 0
+            line_w += (space if lines[-1] else 0) + token_w
+            lines[-1].append((k, token, token_w))
+        bbox = draw.textbbox((0, 0), "Ag", font=self.font, stroke_width=self.stroke_width)
+        return lines, space, bbox[3] - bbox[1]
+
+    def render(self, tokens, active):
+        """Returns (rgb, mask) for a caption phrase, rendering it only on first use."""
+        key = (tokens, active)
+        cached = self._bitmaps.get(key)
+        if cached is not None:
+            return cached
+
+        img = Image.new('RGBA', self.size, (0, 0, 0, 0))
+        draw = ImageDraw.Draw(img)
+        lines, space, line_h = self._layout(draw, tokens)
+
+        y = 10
+        for line in lines:
+            line_w = sum(w for _, _, w in line) + space * (len(line) - 1)
+            x = (self.size[0] - line_w) / 2
+            for k, token, token_w in line:
+                fill = self.highlight_color if k == active else self.color
+                draw.text((x, y), token, font=self.font, fill=fill,
+                          stroke_width=self.stroke_width, stroke_fill=self.stroke_color)
+                x += token_w + space
+            y += line_h + 15
+
+        rgba = np.array(img)
+        cached = (np.ascontiguousarray(rgba[:, :, :3]), rgba[:, :, 3].astype(np.float32) / 255.0)
+        self._bitmaps[key] = cached
+        return cached
+
+    def make_clip(self, words, duration):
+        """Builds a masked MoviePy clip that swaps precomputed caption bitmaps by time."""
+        from moviepy.editor import VideoClip
+
+        timeline = self.build_timeline(words, duration)
+        # Rasterize everything up front so frame generation is a lookup
+        for _, _, tokens, active in timeline:
+            self.render(tokens, active)
+        starts = [entry[0] for entry in timeline]
+
+        def lookup(t):
+            idx = bisect.bisect_right(starts, t) - 1
+            if idx >= 0 and t < timeline[idx][1]:
+                return self._bitmaps[(timeline[idx][2], timeline[idx][3])]
+            return None
+
+        def make_frame(t):
+            bitmap = lookup(t)
+            return bitmap[0] if bitmap else self._blank_rgb
+
+        def make_mask(t):
+            bitmap = lookup(t)
+            return bitmap[1] if bitmap else self._blank_mask
+
+        clip = VideoClip(make_frame, duration=duration)
+        mask = VideoClip(make_mask, ismask=True, duration=duration)
+        return clip.set_mask(mask)
@@ -16,8 +16,87 @@ class Config:
     YOUTUBE_API_SERVICE_NAME = "youtube"
     YOUTUBE_API_VERSION = "v3"
     YOUTUBE_SCOPES = ["https://www.googleapis.com/auth/youtube.upload"]
+    UPLOAD_CHUNK_MB = float(os.getenv("UPLOAD_CHUNK_MB", "8")) # rounded down to a multiple of 256 KiB
+    UPLOAD_MAX_RETRIES = int(os.getenv("UPLOAD_MAX_RETRIES", "8")) # per chunk, for 5xx and connection errors
+    YOUTUBE_WORKERS = int(os.getenv("YOUTUBE_WORKERS", "4")) # parallel API calls after an upload
+    YOUTUBE_HTTP_TIMEOUT = 120
+
+    # Gemini model routing
+    MODEL_CACHE_PATH = "assets/cache/models.json"
+    MODEL_LIST_TTL_HOURS = float(os.getenv("MODEL_LIST_TTL_HOURS", "24"))
+
+    # Gemini response cache: TTL in hours per call type, 0 opts that type out
+    LLM_CACHE_ENABLED = os.getenv("LLM_CACHE", "1") != "0"
+    LLM_CACHE_DIR = "assets/cache/llm"
+    LLM_CACHE_MAX_MB = int(os.getenv("LLM_CACHE_MAX_MB", "64"))
+    LLM_CACHE_TTL_HOURS = {
+        'script': float(os.getenv("LLM_CACHE_SCRIPT_TTL_HOURS", "168")),
+        'titles': float(os.getenv("LLM_CACHE_TITLES_TTL_HOURS", "24")),
+        'topics': float(os.getenv("LLM_CACHE_TOPICS_TTL_HOURS", "0")), # trends have to be fresh
+        'default': 0,
+    }
 
     # Content Settings
     NICHE = "Future Tech and Artificial Intelligence"
     VIDEO_LANGUAGE = "en-US"
     VOICE_NAME = "en-US-ChristopherNeural" # Deep, professional male voice
+    STICKMAN_VOICE_NAME = "en-GB-RyanNeural" # Harry-like deep voice for the stickman style
+
+    # Scene Pipeline: max in-flight requests per stage
+    TTS_CONCURRENCY = int(os.getenv("TTS_CONCURRENCY", "4"))
+    IMAGE_CONCURRENCY = int(os.getenv("IMAGE_CONCURRENCY", "4"))
+    LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "2"))
+    SCRIPT_STREAMING = os.getenv("SCRIPT_STREAMING", "1") == "1" # start scene assets while the script streams in
+
+    # Rendering
+    RENDER_MODE = os.getenv("RENDER_MODE", "single") # "single" or "segmented"
+    RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "0")) # 0 = one worker per CPU core
+    RENDER_CONCURRENCY = int(os.getenv("RENDER_CONCURRENCY", "1")) # videos rendered at once in batch mode
+    TRANSCODE_CONCURRENCY = int(os.getenv("TRANSCODE_CONCURRENCY", "1")) # stock clip encodes at once, across all jobs
+    SEGMENT_DIR = "temp/segments"
+    RENDER_BACKEND = os.getenv("RENDER_BACKEND", "moviepy") # "moviepy" or "ffmpeg" (single filter_complex)
+    FFMPEG_DIR = "temp/ffmpeg"
+    CAPTION_STYLE = os.getenv("CAPTION_STYLE", "karaoke") # "karaoke" (word-timed, shorts) or "static"
+
+    # Topic history (append-only, shared by parallel runs); the JSON list is migrated on first use
+    TOPICS_PATH = "output/used_topics.jsonl"
+    LEGACY_TOPICS_PATH = "output/used_topics.json"
+    TOPIC_SIMILARITY_THRESHOLD = float(os.getenv("TOPIC_SIMILARITY_THRESHOLD", "0.6"))
+    TOPIC_SEMANTIC_THRESHOLD = float(os.getenv("TOPIC_SEMANTIC_THRESHOLD", "0.5")) # TF-IDF cosine
+
+    # Run manifests and per-run assets (see --resume)
+    RUNS_DIR = "output/runs"
+
+    # Asset downloads (one pooled session per process)
+    HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+    HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "3")) # for 429/5xx and broken streams
+    HTTP_CONNECT_TIMEOUT = 10
+    HTTP_READ_TIMEOUT = int(os.getenv("HTTP_READ_TIMEOUT", "120")) # Pollinations renders before it answers
+    HTTP_CHUNK_KB = 1024
+
+    # Image Providers (in order of preference; later ones are hedges/fallbacks)
+    IMAGE_PROVIDERS = [p.strip() for p in os.getenv("IMAGE_PROVIDERS", "pollinations,pexels").split(",") if p.strip()]
+    IMAGE_HEDGE_DEFAULT_S = float(os.getenv("IMAGE_HEDGE_DEFAULT_S", "20")) # until a provider has latency history
+    IMAGE_HEDGE_MIN_S = float(os.getenv("IMAGE_HEDGE_MIN_S", "5"))
+    IMAGE_PLACEHOLDER_FALLBACK = os.getenv("IMAGE_PLACEHOLDER_FALLBACK", "1") == "1"
+    # Provider calls get their own threads and no HTTP retries: the next provider is the retry, and a
+    # cancelled loser holds its thread for one read timeout at most. A provider with this many calls
+    # still in flight (stalled losers included) is skipped rather than queued behind them.
+    IMAGE_PROVIDER_THREADS = int(os.getenv("IMAGE_PROVIDER_THREADS", "8"))
+    IMAGE_PRIMARY_READ_TIMEOUT = int(os.getenv("IMAGE_PRIMARY_READ_TIMEOUT", "75")) # Pollinations' slowest renders take ~60s
+    IMAGE_HEDGE_READ_TIMEOUT = int(os.getenv("IMAGE_HEDGE_READ_TIMEOUT", "15"))
+    IMAGE_ATTEMPTS = 3 # downloads that don't decode are fetched again, skipping the cache
+
+    # Image Cache
+    IMAGE_CACHE_DIR = "assets/cache/images"
+    IMAGE_CACHE_MAX_MB = int(os.getenv("IMAGE_CACHE_MAX_MB", "1024"))
+    IMAGE_SEED_POLICY = os.getenv("IMAGE_SEED_POLICY", "random") # "random" or "deterministic"
+
+    # Scene Visuals
+    VISUAL_SOURCE = os.getenv("VISUAL_SOURCE", "images") # "images" or "stock" (Pexels footage, noir only)
+    STOCK_CACHE_DIR = "assets/cache/stock"
+    STOCK_CACHE_MAX_MB = int(os.getenv("STOCK_CACHE_MAX_MB", "2048"))
+
+    # Audio (TTS) Cache
+    AUDIO_CACHE_DIR = "assets/cache/audio"
+    AUDIO_CACHE_MAX_MB = int(os.getenv("AUDIO_CACHE_MAX_MB", "256"))
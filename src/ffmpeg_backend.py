@@ -0,0 +1,305 @@
+import math
+import os
+import subprocess
+import numpy as np
+from PIL import Image
+from .config import Config
+from .audio_processing import audio_duration
+from .captions import CaptionEngine, rasterize_caption, caption_layout, use_karaoke
+from .ken_burns import KenBurns
+from .stock_video import is_prepared
+from .utils import ensure_dir_exists, scratch_name
+
+FPS = 24
+CROSSFADE = 0.6
+
+def _ffmpeg_exe():
+    from imageio_ffmpeg import get_ffmpeg_exe
+    return get_ffmpeg_exe()
+
+def _escape_path(path):
+    return os.path.abspath(path).replace("'", "'\\''")
+
+
+class FFmpegRenderer:
+    """
+    Renders a whole scene list with one ffmpeg filter_complex, so no frame ever passes through Python.
+    Mirrors the MoviePy backend: the same Ken Burns and stickman motion (as filter expressions),
+    the same caption bitmaps (written once as PNGs), a fade in from black on every scene after
+    the first, and scenes joined end to end with the concat filter.
+    """
+    def __init__(self, target_size, is_short=True, style="noir", work_dir=None):
+        self.target_w, self.target_h = target_size
+        self.is_short = is_short
+        self.style = style
+        self.work_dir = work_dir or Config.FFMPEG_DIR
+        self.inputs = []
+        self.filters = []
+
+    def _add_input(self, *args):
+        self.inputs.append(list(args))
+        return len(self.inputs) - 1
+
+    # --- Visuals -------------------------------------------------------------
+
+    def _ken_burns(self, i, path, anim_type, duration):
+        """Cover-scale onto the margin canvas once, then zoompan (zooms) or a moving crop (pans)."""
+        tw, th = self.target_w, self.target_h
+        cw, ch = int(tw * 1.1), int(th * 1.1)
+        n_frames = max(1, int(math.ceil(duration * FPS)))
+        last = max(n_frames - 1, 1)
+
+        with Image.open(path) as img:
+            iw, ih = img.size
+        idx = self._add_input("-i", path)
+
+        if (iw, ih) == (cw, ch):
+            canvas = f"[{idx}:v]format=rgb24"
+        else:
+            scale = max(tw * 1.3 / iw, th * 1.3 / ih)
+            sw, sh = max(cw, round(iw * scale)), max(ch, round(ih * scale))
+            canvas = f"[{idx}:v]scale={sw}:{sh}:flags=lanczos,crop={cw}:{ch},format=rgb24"
+
+        if anim_type in ('zoom_in', 'zoom_out'):
+            # zoompan magnifies relative to its input, so fold the canvas margin into the zoom
+            progress = f"on/{last}"
+            scale = f"(1+0.15*{progress})" if anim_type == 'zoom_in' else f"(1.15-0.15*{progress})"
+            z = f"{cw / tw:.6f}*{scale}"
+            motion = (f"zoompan=z='{z}':x='(iw-iw/zoom)/2':y='(ih-ih/zoom)/2'"
+                      f":d={n_frames}:s={tw}x{th}:fps={FPS}")
+        else:
+            travel = min(0.1 * tw, cw - tw)
+            if anim_type == 'pan_left':
+                x = f"round({travel:.3f}*n/{last})"
+            elif anim_type == 'pan_right':
+                x = f"round({travel:.3f}*(1-n/{last}))"
+            else:
+                x = str((cw - tw) // 2)
+            motion = (f"loop=loop={n_frames - 1}:size=1:start=0,setpts=N/{FPS}/TB,"
+                      f"crop={tw}:{th}:x='{x}':y={(ch - th) // 2}")
+        self.filters.append(f"{canvas},{motion},setsar=1[vis{i}]")
+
+    def _stickman(self, i, path, action, duration):
+        """
+        White background plus the sprite, overlaid per frame.
+        Scaling runs through zoompan on a white-padded box (zoom stays >= 1), waving adds a rotate,
+        and the vertical motion is an overlay expression (a seeded lookup for shaking).
+        """
+        tw, th = self.target_w, self.target_h
+        n_frames = max(1, int(math.ceil(duration * FPS)))
+
+        with Image.open(path) as img:
+            iw, ih = img.size
+        sprite_w = int(tw * 0.7)
+        sprite_h = max(1, round(ih * sprite_w / iw))
+
+        if action == 'bouncing':
+            scale = f"(1+0.1*abs(sin(2*PI*0.7*on/{FPS})))"
+            s_min, s_max = 1.0, 1.1
+        else:
+            scale = f"(1+0.015*sin(2*PI*0.25*on/{FPS}))"
+            s_min, s_max = 0.985, 1.015
+        # Displayed size = box zoom * (out box / in box); with out/in = s_min the zoom is s / s_min >= 1
+        box_w = int(math.ceil(sprite_w * s_max / s_min)) // 2 * 2 + 2
+        box_h = int(math.ceil(sprite_h * s_max / s_min)) // 2 * 2 + 2
+        out_w, out_h = int(round(box_w * s_min)), int(round(box_h * s_min))
+
+        idx = self._add_input("-i", path)
+        chain = (f"[{idx}:v]format=rgb24,scale={sprite_w}:{sprite_h}:flags=lanczos,"
+                 f"pad={box_w}:{box_h}:(ow-iw)/2:(oh-ih)/2:color=white,"
+                 f"zoompan=z='{scale}/{s_min}':x='(iw-iw/zoom)/2':y='(ih-ih/zoom)/2'"
+                 f":d={n_frames}:s={out_w}x{out_h}:fps={FPS}")
+        if action == 'waving':
+            angle = "5*PI/180"
+            # rotate turns clockwise for positive angles, PIL's Image.rotate counter-clockwise
+            chain += f",rotate=a='-{angle}*sin(2*PI*0.5*t)':ow=rotw({angle}):oh=roth({angle}):c=white"
+        self.filters.append(f"{chain}[sprite{i}]")
+
+        if action == 'jumping':
+            dy = "-abs(100*sin(2*PI*0.8*t))"
+        elif action == 'shaking':
+            # Same seeded one-second loop as StickmanAnimator, unrolled into a lookup on the frame number
+            jitter = np.round(np.random.RandomState(i).uniform(-10, 10, FPS)).astype(int)
+            dy = "0"
+            for k in reversed(range(FPS)):
+                dy = f"if(eq(mod(n,{FPS}),{k}),{jitter[k]},{dy})"
+        else:
+            dy = "15*sin(2*PI*0.33*t)"
+
+        fade_out = max(duration - 0.5, 0)
+        self.filters.append(
+            f"color=c=white:s={tw}x{th}:r={FPS}:d={duration:.6f}[bg{i}];"
+            f"[bg{i}][sprite{i}]overlay=x='(W-w)/2':y='(H-h)/2+({dy})':eval=frame:shortest=1,"
+            f"fade=t=in:st=0:d=0.5:color=white,fade=t=out:st={fade_out:.6f}:d=0.5:color=white,"
+            f"setsar=1[vis{i}]"
+        )
+
+    def _video(self, i, path, duration):
+        """Stock footage: loop, cover-scale, centre crop and cut to the narration."""
+        tw, th = self.target_w, self.target_h
+        if is_prepared(path, (tw, th), duration, FPS):
+            # Pre-transcoded by the scene pipeline: only the cut is left
+            idx = self._add_input("-i", path)
+            self.filters.append(f"[{idx}:v]trim=duration={duration:.6f},setpts=PTS-STARTPTS,setsar=1[vis{i}]")
+            return
+        idx = self._add_input("-stream_loop", "-1", "-i", path)
+        self.filters.append(
+            f"[{idx}:v]scale=w='if(gt(a,{tw}/{th}),-2,{tw})':h='if(gt(a,{tw}/{th}),{th},-2)',"
+            f"crop={tw}:{th},fps={FPS},trim=duration={duration:.6f},setpts=PTS-STARTPTS,setsar=1[vis{i}]"
+        )
+
+    # --- Captions ------------------------------------------------------------
+
+    def _write_png(self, path, rgb, alpha):
+        rgba = np.dstack([rgb, np.round(alpha * 255).astype(np.uint8)])
+        Image.fromarray(rgba, 'RGBA').save(path, compress_level=1)
+
+    def _caption(self, i, scene, duration, scene_dir):
+        """Adds the caption input: one PNG, or a timed PNG sequence for karaoke. Returns (input, y)."""
+        karaoke = use_karaoke(scene, self.is_short)
+        layout = caption_layout((self.target_w, self.target_h), self.is_short, self.style, karaoke)
+        size = tuple(layout['size'])
+
+        if not karaoke:
+            rgb, alpha = rasterize_caption(scene['text'], size, layout['fontsize'], layout['color'],
+                                           layout['stroke_color'], layout['stroke_width'])
+            png = os.path.join(scene_dir, "caption.png")
+            self._write_png(png, rgb, alpha)
+            return self._add_input("-i", png), int(layout['y'])
+
+        engine = CaptionEngine(size, fontsize=layout['fontsize'], color=layout['color'],
+                               stroke_color=layout['stroke_color'], stroke_width=layout['stroke_width'],
+                               highlight_color=layout['highlight_color'])
+        blank = os.path.join(scene_dir, "blank.png")
+        self._write_png(blank, engine._blank_rgb, engine._blank_mask)
+
+        # The concat demuxer shows each bitmap for its duration; gaps between phrases get the blank one
+        files = {}
+        entries = []
+        cursor = 0.0
+        for start, end, tokens, active in engine.build_timeline(scene['words'], duration):
+            if start > cursor:
+                entries.append((blank, start - cursor))
+            key = (tokens, active)
+            if key not in files:
+                files[key] = os.path.join(scene_dir, f"caption_{len(files):03d}.png")
+                self._write_png(files[key], *engine.render(tokens, active))
+            entries.append((files[key], end - start))
+            cursor = end
+        entries.append((blank, max(duration - cursor, 1.0 / FPS)))
+
+        list_path = os.path.join(scene_dir, "captions.txt")
+        with open(list_path, 'w', encoding='utf-8') as f:
+            f.write("ffconcat version 1.0\n")
+            for png, length in entries:
+                f.write(f"file '{_escape_path(png)}'\nduration {length:.6f}\n")
+            # The demuxer ignores the last entry's duration unless the file is listed again
+            f.write(f"file '{_escape_path(entries[-1][0])}'\n")
+        return self._add_input("-f", "concat", "-safe", "0", "-i", list_path), int(layout['y'])
+
+    # --- Graph ---------------------------------------------------------------
+
+    def _add_scene(self, i, scene, scene_dir):
+        duration = scene.get('duration') or audio_duration(scene['audio_path'])
+        ensure_dir_exists(scene_dir)
+
+        v_path = scene['video_path']
+        if os.path.exists(v_path):
+            if v_path.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp')):
+                if self.style == "stickman":
+                    self._stickman(i, v_path, scene.get('vocal_action', 'talking'), duration)
+                else:
+                    import random
+                    anim_type = scene.get('animation') or random.choice(KenBurns.ANIMATIONS)
+                    self._ken_burns(i, v_path, anim_type, duration)
+            else:
+                self._video(i, v_path, duration)
+        else:
+            self.filters.append(f"color=c=black:s={self.target_w}x{self.target_h}:r={FPS}:d={duration:.6f}[vis{i}]")
+
+        # Transition first, caption on top: the same order as crossfadein() then the caption composite.
+        # MoviePy applies the faded mask twice (scene composite, then the compose concat), so its
+        # ramp is quadratic; two linear fades reproduce it.
+        transition = f",fade=t=in:st=0:d={CROSSFADE},fade=t=in:st=0:d={CROSSFADE}" if i > 0 else ""
+        cap_idx, cap_y = self._caption(i, scene, duration, scene_dir)
+        self.filters.append(
+            f"[vis{i}]format=yuv420p{transition}[base{i}];"
+            f"[base{i}][{cap_idx}:v]overlay=x=(W-w)/2:y={cap_y}:eof_action=repeat,"
+            f"format=yuv420p,trim=duration={duration:.6f},setpts=PTS-STARTPTS[v{i}]"
+        )
+
+        audio_idx = self._add_input("-i", scene['audio_path'])
+        self.filters.append(
+            f"[{audio_idx}:a]aformat=sample_rates=44100:channel_layouts=stereo,"
+            f"apad=whole_dur={duration:.6f},atrim=duration={duration:.6f},asetpts=PTS-STARTPTS[a{i}]"
+        )
+
+    def build(self, scenes, work_dir, bg_music_path=None):
+        """Returns (input args, filter_complex script) for the whole video."""
+        self.inputs = []
+        self.filters = []
+
+        # Scene indices stay those of the input list (shaking seed, no fade on scene 0), like the MoviePy backend
+        used = []
+        for i, scene in enumerate(scenes):
+            if not os.path.exists(scene.get('audio_path', '')):
+                print(f"Skipping scene {i}: missing audio")
+                continue
+            self._add_scene(i, scene, os.path.join(work_dir, f"scene_{i:03d}"))
+            used.append(i)
+        if not used:
+            return None, None
+
+        count = len(used)
+        pads = "".join(f"[v{k}][a{k}]" for k in used)
+        audio_out = "[aout]"
+        if bg_music_path and os.path.exists(bg_music_path):
+            audio_out = "[acat]"
+        self.filters.append(f"{pads}concat=n={count}:v=1:a=1[vout]{audio_out}")
+
+        if audio_out == "[acat]":
+            music_idx = self._add_input("-stream_loop", "-1", "-i", bg_music_path)
+            self.filters.append(
+                f"[{music_idx}:a]aformat=sample_rates=44100:channel_layouts=stereo,volume=0.08[bg];"
+                f"[acat][bg]amix=inputs=2:duration=first:normalize=0[aout]"
+            )
+
+        args = [arg for input_args in self.inputs for arg in input_args]
+        return args, ";\n".join(self.filters)
+
+    def render(self, scenes, output_path, bg_music_path=None):
+        work_dir = os.path.join(self.work_dir, scratch_name(output_path))
+        ensure_dir_exists(work_dir)
+
+        try:
+            input_args, graph = self.build(scenes, work_dir, bg_music_path)
+        except Exception as e:
+            print(f"Error building ffmpeg graph: {e}")
+            return False
+        if graph is None:
+            return False
+
+        script_path = os.path.join(work_dir, "filter_complex.txt")
+        with open(script_path, 'w', encoding='utf-8') as f:
+            f.write(graph)
+
+        command = [
+            _ffmpeg_exe(), "-y", "-hide_banner", "-loglevel", "error",
+            *input_args,
+            "-filter_complex_script", script_path,
+            "-map", "[vout]", "-map", "[aout]",
+            "-c:v", "libx264", "-pix_fmt", "yuv420p", "-r", str(FPS),
+            "-c:a", "aac", "-ar", "44100",
+            "-movflags", "+faststart", output_path
+        ]
+        print("Rendering video with ffmpeg...")
+        try:
+            subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        except subprocess.CalledProcessError as e:
+            print(f"ffmpeg render failed: {e.stderr.decode(errors='replace')[-2000:]}")
+            return False
+        except Exception as e:
+            print(f"ffmpeg render failed: {e}")
+            return False
+        print("Video rendering complete.")
+        return True
@@ -0,0 +1,143 @@
+import os
+import time
+import random
+import hashlib
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from .config import Config
+from .utils import ensure_dir_exists
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+class DownloadError(Exception):
+    """The response started but its body was broken (cut off, empty or not the expected bytes)."""
+    pass
+
+
+class HttpClient:
+    """
+    One pooled requests.Session for every outgoing asset request: keep-alive connections are reused
+    across scenes, every call has a (connect, read) timeout, and connection errors, timeouts and
+    429/5xx answers are retried with exponential backoff (honouring Retry-After) by the adapter -
+    the only retry layer for anything that fails before the body arrives. Downloads stream in
+    large chunks to a temp file that is renamed into place only after the Content-Length (and
+    optional sha256) check passes, so a failed download never leaves a truncated file behind;
+    a body that breaks mid-stream, which the adapter can't see, is fetched again by download().
+    """
+    def __init__(self, pool_size=None, retries=None, timeout=None, chunk_size=None, backoff=0.5):
+        self.retries = retries if retries is not None else Config.HTTP_RETRIES
+        self.timeout = timeout or (Config.HTTP_CONNECT_TIMEOUT, Config.HTTP_READ_TIMEOUT)
+        self.chunk_size = chunk_size or Config.HTTP_CHUNK_KB * 1024
+        self.backoff = backoff
+        pool_size = pool_size or Config.HTTP_POOL_SIZE
+
+        retry = Retry(
+            total=self.retries, connect=self.retries, read=self.retries, status=self.retries,
+            backoff_factor=backoff, status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=frozenset(["GET", "HEAD"]), respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._lock = threading.Lock()
+        self.downloads = 0
+        self.failures = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def get(self, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.get(url, **kwargs)
+
+    def get_json(self, url, **kwargs):
+        response = self.get(url, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def download(self, url, output_path, headers=None, expected_sha256=None, timeout=None):
+        """
+        Streams url to output_path. Returns True on success; False (with nothing written at
+        output_path) once the adapter has given up on the request or a broken body has been
+        fetched again `retries` times. timeout overrides the client's (connect, read) timeout.
+        """
+        ensure_dir_exists(os.path.dirname(output_path) or ".")
+        tmp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.part"
+        for attempt in range(self.retries + 1):
+            started = time.perf_counter()
+            try:
+                size = self._fetch(url, tmp_path, headers, expected_sha256, timeout)
+                os.replace(tmp_path, output_path)
+            except (requests.RequestException, DownloadError, OSError) as e:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                # Status codes, timeouts and connection errors were already retried by the adapter
+                if attempt < self.retries and isinstance(e, DownloadError):
+                    delay = self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+                    logger.warning(f"Download of {url[:80]} failed ({e}), retrying in {delay:.1f}s")
+                    time.sleep(delay)
+                    continue
+                logger.error(f"Error downloading {url[:80]}: {e}")
+                with self._lock:
+                    self.failures += 1
+                return False
+
+            with self._lock:
+                self.downloads += 1
+                self.bytes += size
+                self.seconds += time.perf_counter() - started
+            return True
+        return False
+
+    def _fetch(self, url, tmp_path, headers, expected_sha256, timeout=None):
+        digest = hashlib.sha256()
+        size = 0
+        with self.get(url, headers=headers, stream=True, timeout=timeout or self.timeout) as response:
+            response.raise_for_status()
+            # With a Content-Encoding the header counts compressed bytes, not what iter_content yields
+            expected = None if response.headers.get('Content-Encoding') else response.headers.get('Content-Length')
+            try:
+                with open(tmp_path, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=self.chunk_size):
+                        f.write(chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+            except requests.RequestException as e:
+                raise DownloadError(f"stream broke after {size} bytes: {e}") from e
+
+        if expected is not None and size != int(expected):
+            raise DownloadError(f"incomplete body: {size} of {expected} bytes")
+        if size == 0:
+            raise DownloadError("empty body")
+        if expected_sha256 and digest.hexdigest() != expected_sha256:
+            raise DownloadError("sha256 mismatch")
+        return size
+
+    def stats(self):
+        with self._lock:
+            return {
+                'downloads': self.downloads,
+                'failures': self.failures,
+                'mb': round(self.bytes / 1e6, 2),
+                # Summed per download, so with parallel downloads this is per-connection throughput
+                'mb_per_s': round(self.bytes / 1e6 / self.seconds, 2) if self.seconds else None,
+            }
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+def shared_client():
+    """Process-wide client, so every AssetManager shares one connection pool."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = HttpClient()
+        return _shared
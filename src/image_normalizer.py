@@ -0,0 +1,53 @@
+import os
+import threading
+from PIL import Image
+from .ken_burns import cover_canvas
+
+# BMP is stored uncompressed, so the renderer loads it without another JPEG decode
+NORMALIZED_EXT = ".bmp"
+MIN_SOURCE_SIDE = 256
+
+class InvalidImageError(ValueError):
+    pass
+
+
+def orientation_size(orientation):
+    return (1080, 1920) if orientation == "portrait" else (1920, 1080)
+
+def stickman_sprite_width(target_size, width_ratio=0.7):
+    return int(target_size[0] * width_ratio)
+
+def normalize_image(src_path, output_path, target_size, style="noir"):
+    """
+    Fully decodes src_path and writes it to output_path at the exact size the renderer consumes:
+    the Ken Burns margin canvas (noir) or the stickman sprite width. Both editor backends skip
+    their own resize for images of that size. Raises InvalidImageError for anything that is not
+    a complete, reasonably sized image (HTML error pages, truncated downloads, 1px placeholders).
+    """
+    try:
+        with Image.open(src_path) as img:
+            # load() decodes every byte, so a truncated JPEG fails here rather than mid-render
+            img.load()
+            if min(img.size) < MIN_SOURCE_SIDE:
+                raise InvalidImageError(f"{src_path} is only {img.width}x{img.height}")
+            if style == "stickman":
+                img = img.convert('RGB')
+                sprite_w = stickman_sprite_width(target_size)
+                if img.width != sprite_w:
+                    sprite_h = max(1, round(img.height * sprite_w / img.width))
+                    img = img.resize((sprite_w, sprite_h), Image.LANCZOS)
+            else:
+                img = cover_canvas(img, target_size)
+    except InvalidImageError:
+        raise
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise InvalidImageError(f"{src_path} is not a readable image: {e}") from e
+
+    tmp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        img.save(tmp_path, format="BMP")
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return output_path
@@ -0,0 +1,247 @@
+import os
+import re
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+import urllib.parse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+def looks_like_image(path):
+    """Cheap magic-number check so error pages never pass as images."""
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(8)
+    except OSError:
+        return False
+    return head.startswith(b'\xff\xd8') or head.startswith(b'\x89PNG') or head[:4] == b'RIFF'
+
+STOCK_SKIP_WORDS = {"a", "an", "the", "of", "in", "on", "with", "and", "style", "surrealist", "cinematic", "8k"}
+
+def stock_query(prompt):
+    """Search terms for stock libraries: the leading content words of the prompt's first clause."""
+    words = [w for w in re.findall(r"[A-Za-z]+", prompt.split(",")[0]) if w.lower() not in STOCK_SKIP_WORDS]
+    return " ".join(words[:6])
+
+
+class ImageProvider:
+    """
+    One source of scene images. fetch() writes an image for the prompt to output_path and returns
+    True, or returns False; timeout is the (connect, read) timeout for its HTTP calls. Latencies of
+    successful fetches are kept to derive the hedge delay. Blocking work runs on self.executor
+    (HedgedImageFetcher's pool), never on the event loop's default executor, and in_flight counts
+    the calls whose thread hasn't finished yet, cancelled ones included.
+    """
+    name = "base"
+    hedgeable = True # placeholder-style providers are a last resort, never a hedge
+    stock = False # stock photos may show real people: not for stickman, never cached as generated art
+
+    def __init__(self):
+        self.latencies = deque(maxlen=50)
+        self.executor = None
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    async def fetch(self, prompt, output_path, width, height, seed, timeout=None):
+        raise NotImplementedError
+
+    def p90(self):
+        """90th percentile latency in seconds, or None until there are a few samples."""
+        if len(self.latencies) < 5:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))]
+
+    async def _in_thread(self, fn, *args, cleanup_path=None, **kwargs):
+        """
+        Runs blocking work in a thread. If the caller is cancelled (another provider won), the
+        thread can't be stopped, so whatever it writes to cleanup_path is removed once it finishes.
+        """
+        with self._lock:
+            self.in_flight += 1
+        # The counter is released from the worker thread, so it stays right even if the loop is gone
+        submitted = self.executor.submit(fn, *args, **kwargs)
+        submitted.add_done_callback(lambda _: self._release())
+        future = asyncio.wrap_future(submitted)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if cleanup_path:
+                future.add_done_callback(lambda _: os.path.exists(cleanup_path) and os.remove(cleanup_path))
+            raise
+
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+
+class PollinationsProvider(ImageProvider):
+    name = "pollinations"
+
+    def __init__(self, http):
+        super().__init__()
+        self.http = http
+
+    async def fetch(self, prompt, output_path, width, height, seed, timeout=None):
+        encoded_prompt = urllib.parse.quote(prompt)
+        url = f"https://image.pollinations.ai/prompt/{encoded_prompt}?width={width}&height={height}&nologo=true&enhance=true&seed={seed}"
+        return await self._in_thread(self.http.download, url, output_path, cleanup_path=output_path, timeout=timeout)
+
+
+class PexelsPhotoProvider(ImageProvider):
+    """Stock photo search on Pexels, using the prompt's leading content words as the query."""
+    name = "pexels"
+    stock = True
+
+    def __init__(self, http, headers):
+        super().__init__()
+        self.http = http
+        self.headers = headers
+
+    def _download(self, prompt, output_path, width, height, timeout):
+        orientation = "portrait" if height > width else "landscape"
+        data = self.http.get_json(
+            "https://api.pexels.com/v1/search", headers=self.headers, timeout=timeout,
+            params={'query': stock_query(prompt), 'per_page': 1, 'orientation': orientation}
+        )
+        if not data.get('photos'):
+            return False
+        # large2x is ~1880px on the long side: enough for 1080p without fetching the original
+        src = data['photos'][0]['src']
+        return self.http.download(src.get('large2x') or src['original'], output_path, timeout=timeout)
+
+    async def fetch(self, prompt, output_path, width, height, seed, timeout=None):
+        return await self._in_thread(self._download, prompt, output_path, width, height, timeout,
+                                     cleanup_path=output_path)
+
+
+class PlaceholderProvider(ImageProvider):
+    """Local, instant fallback: a moody gradient whose colours are derived from the prompt."""
+    name = "placeholder"
+    hedgeable = False
+
+    @staticmethod
+    def _render(prompt, output_path, width, height):
+        import numpy as np
+        from PIL import Image
+
+        digest = hashlib.sha256(prompt.encode('utf-8')).digest()
+        top = np.array(list(digest[:3]), dtype=np.float32) * 0.35
+        bottom = np.array(list(digest[3:6]), dtype=np.float32) * 0.12
+        ramp = np.linspace(0.0, 1.0, height, dtype=np.float32)[:, None, None]
+        rows = top * (1 - ramp) + bottom * ramp
+        # Vignette keeps it from looking like a flat test card
+        ys, xs = np.ogrid[-1:1:height * 1j, -1:1:width * 1j]
+        vignette = np.clip(1.2 - 0.6 * (xs ** 2 + ys ** 2), 0.3, 1.0)[:, :, None].astype(np.float32)
+        # Explicit format: the hedging temp path has no image extension
+        Image.fromarray((rows * vignette).astype(np.uint8)).save(output_path, format="JPEG", quality=90)
+        return True
+
+    async def fetch(self, prompt, output_path, width, height, seed, timeout=None):
+        return await self._in_thread(self._render, prompt, output_path, width, height, cleanup_path=output_path)
+
+
+class HedgedImageFetcher:
+    """
+    Asks providers for an image, bounding the tail latency per scene.
+    The first provider starts right away; if it hasn't delivered within its p90 latency (or a
+    default until it has history), the next one is fired in parallel, and so on. A provider that
+    fails hands over immediately. The first valid image wins and the other attempts are cancelled.
+    Non-hedgeable providers (the placeholder) only run once every other provider has failed.
+    With allow_stock=False, stock photo providers are left out of the chain entirely, and with
+    allow_placeholder=False so is the placeholder.
+
+    A cancelled loser's thread can't be interrupted, so providers run on a pool of their own
+    (other to_thread work never waits behind them) with up to threads_per_provider calls each.
+    A provider that already has that many in flight - i.e. it is stalling - is skipped for the
+    scene instead of queueing behind its own losers. Hedges use a short read timeout, so a lost
+    hedge gives its thread back quickly.
+    """
+    def __init__(self, providers, default_hedge=None, min_hedge=None, threads_per_provider=None):
+        self.providers = list(providers)
+        self.default_hedge = default_hedge if default_hedge is not None else Config.IMAGE_HEDGE_DEFAULT_S
+        self.min_hedge = min_hedge if min_hedge is not None else Config.IMAGE_HEDGE_MIN_S
+        self.threads_per_provider = threads_per_provider or Config.IMAGE_PROVIDER_THREADS
+        self.executor = ThreadPoolExecutor(max_workers=self.threads_per_provider * max(1, len(self.providers)),
+                                           thread_name_prefix="image-provider")
+        for provider in self.providers:
+            provider.executor = self.executor
+        self.primary_timeout = (Config.HTTP_CONNECT_TIMEOUT, Config.IMAGE_PRIMARY_READ_TIMEOUT)
+        self.hedge_timeout = (Config.HTTP_CONNECT_TIMEOUT, Config.IMAGE_HEDGE_READ_TIMEOUT)
+        self.wins = {}
+
+    def hedge_delay(self, provider):
+        p90 = provider.p90()
+        return self.default_hedge if p90 is None else max(self.min_hedge, p90)
+
+    async def _attempt(self, provider, prompt, path, width, height, seed, timeout):
+        started = time.perf_counter()
+        try:
+            ok = await provider.fetch(prompt, path, width, height, seed, timeout=timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"{provider.name} failed: {e}")
+            ok = False
+        ok = bool(ok) and looks_like_image(path)
+        if ok:
+            provider.latencies.append(time.perf_counter() - started)
+        return ok
+
+    async def fetch(self, prompt, output_path, width, height, seed, allow_stock=True, allow_placeholder=True):
+        """Returns the winning provider (image at output_path), or None if all failed."""
+        providers = [p for p in self.providers
+                     if (allow_stock or not p.stock) and (allow_placeholder or p.hedgeable)]
+        queue = [p for p in providers if p.hedgeable]
+        last_resort = [p for p in providers if not p.hedgeable]
+        busy = [p for p in queue if p.in_flight >= self.threads_per_provider]
+        if busy and len(busy) < len(queue):
+            logger.info(f"{', '.join(p.name for p in busy)} saturated, skipping for this image")
+            queue = [p for p in queue if p not in busy]
+        running = {}
+
+        def launch(provider, hedge=False):
+            path = f"{output_path}.{provider.name}.tmp"
+            timeout = self.hedge_timeout if hedge else self.primary_timeout
+            task = asyncio.ensure_future(self._attempt(provider, prompt, path, width, height, seed, timeout))
+            running[task] = (provider, path)
+            return provider
+
+        current = launch(queue.pop(0)) if queue else None
+        try:
+            while running or queue or last_resort:
+                if not running:
+                    # Everything so far failed: next real provider, then the placeholder
+                    current = launch(queue.pop(0) if queue else last_resort.pop(0))
+                timeout = self.hedge_delay(current) if queue else None
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logger.info(f"{current.name} slower than {timeout:.0f}s, hedging with {queue[0].name}")
+                    current = launch(queue.pop(0), hedge=True)
+                    continue
+                for task in done:
+                    provider, path = running.pop(task)
+                    if task.result():
+                        os.replace(path, output_path)
+                        self.wins[provider.name] = self.wins.get(provider.name, 0) + 1
+                        return provider
+                    if os.path.exists(path):
+                        os.remove(path)
+            return None
+        finally:
+            for task, (_, path) in running.items():
+                task.cancel()
+
+    def stats(self):
+        return {
+            provider.name: {
+                'wins': self.wins.get(provider.name, 0),
+                'p90': round(provider.p90(), 1) if provider.p90() is not None else None,
+            }
+            for provider in self.providers
+        }
@@ -0,0 +1,278 @@
+import asyncio
+import functools
+import logging
+import os
+from datetime import datetime, timedelta
+from .config import Config
+from .llm_wrapper import LLMWrapper
+from .voice_engine import VoiceEngine
+from .asset_manager import AssetManager
+from .video_editor import VideoEditor
+from .scene_pipeline import ScenePipeline
+from .run_manifest import RunManifest
+
+logger = logging.getLogger(__name__)
+
+class _JobLog(logging.LoggerAdapter):
+    """Prefixes every line with the job, so interleaved batch logs stay readable."""
+    def process(self, msg, kwargs):
+        return f"[{self.extra['job']}] {msg}", kwargs
+
+
+class SharedServices:
+    """
+    Clients, caches and budgets shared by every job in one process.
+    The LLM model list, the trend engine's topic history and the audio/image caches are loaded once;
+    the semaphores cap network (LLM, TTS, image) and CPU (render) work across all jobs together.
+    """
+    def __init__(self, tts_concurrency=None, image_concurrency=None, render_concurrency=None,
+                 llm_concurrency=None):
+        self.llm = LLMWrapper()
+        self.voice = VoiceEngine()
+        self.asset_mgr = AssetManager()
+        self._trend_engine = None
+        self._uploader = None
+
+        self.tts_concurrency = tts_concurrency or Config.TTS_CONCURRENCY
+        self.image_concurrency = image_concurrency or Config.IMAGE_CONCURRENCY
+        self.tts_limit = asyncio.Semaphore(self.tts_concurrency)
+        self.image_limit = asyncio.Semaphore(self.image_concurrency)
+        self.llm_limit = asyncio.Semaphore(llm_concurrency or Config.LLM_CONCURRENCY)
+        self.render_limit = asyncio.Semaphore(render_concurrency or Config.RENDER_CONCURRENCY)
+        # Stock clip pre-transcodes are full 1080p encodes; they queue here instead of swamping renders
+        self.transcode_limit = asyncio.Semaphore(Config.TRANSCODE_CONCURRENCY)
+        # Video uploads go one at a time; the smaller API calls around them run in parallel
+        self.upload_lock = asyncio.Lock()
+
+    @property
+    def trend_engine(self):
+        if self._trend_engine is None:
+            from .trends import TrendEngine
+            self._trend_engine = TrendEngine()
+        return self._trend_engine
+
+    @property
+    def uploader(self):
+        if self._uploader is None:
+            from .youtube_uploader import AsyncYouTubeUploader, YouTubeUploader
+            self._uploader = AsyncYouTubeUploader(YouTubeUploader())
+        return self._uploader
+
+    def close(self):
+        """Releases the uploader's worker threads; call once every job has finished."""
+        if self._uploader is not None:
+            self._uploader.close()
+
+    async def call_llm(self, fn, *args, **kwargs):
+        """Runs a blocking LLM call off the event loop, within the shared LLM budget."""
+        async with self.llm_limit:
+            return await asyncio.to_thread(fn, *args, **kwargs)
+
+
+def voice_for_style(style):
+    # Stickman videos use a deeper voice (Harry-like)
+    return Config.STICKMAN_VOICE_NAME if style == "stickman" else Config.VOICE_NAME
+
+
+async def run_job(shared, manifest, dry_run=False, render_mode=None, backend=None):
+    """
+    Produces (and unless dry_run, uploads) one video, checkpointing each stage in the manifest.
+    The job's type, style and topic come from manifest.params. Returns True on success.
+    """
+    params = manifest.params
+    video_type, style = params['type'], params['style']
+    log = _JobLog(logger, {'job': f"{video_type}/{style} {manifest.run_id}"})
+    llm = shared.llm
+
+    # Select Topic
+    title = (manifest.get('topic') or {}).get('title') or params.get('topic')
+    if not title:
+        title = await shared.call_llm(shared.trend_engine.get_viral_topic, llm)
+        if not title:
+            log.error("Failed to discover a viral topic")
+            return False
+        log.info(f"Viral Topic Selected: {title}")
+    manifest.complete('topic', {'title': title})
+
+    voice_name = voice_for_style(style)
+    if style == "stickman":
+        log.info(f"Using deep voice: {voice_name}")
+
+    # Use landscape for long-form, portrait for shorts
+    orientation = "landscape" if video_type == "long" else "portrait"
+    # Assets live in the run directory, so clearing temp/ between runs doesn't lose them
+    pipeline = ScenePipeline(
+        shared.voice, shared.asset_mgr,
+        audio_dir=manifest.artifact_dir("audio"),
+        visual_dir=manifest.artifact_dir("visuals"),
+        voice_name=voice_name,
+        tts_concurrency=shared.tts_concurrency,
+        image_concurrency=shared.image_concurrency,
+        tts_limit=shared.tts_limit,
+        image_limit=shared.image_limit,
+        transcode_limit=shared.transcode_limit,
+        style=style
+    )
+
+    processed_scenes = None
+    script_data = manifest.get('script')
+    if script_data:
+        log.info("Reusing script from the run manifest")
+    else:
+        log.info(f"Generating {video_type} script for Title: {title}")
+
+        if style == "stickman":
+            generate = functools.partial(llm.generate_conversational_script, title, type=video_type)
+        elif video_type == "long":
+            generate = functools.partial(llm.generate_psychology_script, title)
+        else:
+            generate = functools.partial(llm.generate_psychology_short_script, title)
+
+        if Config.SCRIPT_STREAMING:
+            # Scene assets are produced while the rest of the script is still streaming in
+            async def produce(on_scene):
+                return await shared.call_llm(generate, on_scene=on_scene)
+            script_data, processed_scenes = await pipeline.process_streamed(produce, orientation=orientation)
+        else:
+            script_data = await shared.call_llm(generate)
+
+        if not script_data:
+            log.error(f"Failed to generate {video_type} script")
+            return False
+        manifest.complete('script', script_data)
+        log.info(f"Gemini response cache: {llm.response_cache.stats()}")
+        log.info(f"Gemini models: {llm.router.summary()}")
+
+    log.info(f"Title: {script_data.get('title')}")
+    if script_data.get('deduced_angle'):
+        log.info(f"Deduced Angle: {script_data.get('deduced_angle')}")
+
+    # 2. Process Scenes
+    if processed_scenes is None:
+        log.info(f"Processing {len(script_data['scenes'])} scenes...")
+        previous = manifest.valid_scenes(script_data['scenes'])
+        processed_scenes = await pipeline.process(script_data['scenes'], orientation=orientation, previous=previous)
+    manifest.record_scenes(processed_scenes)
+
+    # 3. Create Video
+    output_file = os.path.join(manifest.run_dir, f"final_{video_type}.mp4")
+    is_short = (video_type == "short")
+
+    # The thumbnail only needs the title, so it's generated while the video renders
+    video_title = script_data.get('title', title)
+    thumbnail_path = os.path.join(manifest.run_dir, f"thumb_{video_type}.jpg")
+    thumbnail_task = None
+    if not dry_run and not os.path.exists(thumbnail_path):
+        log.info(f"Generating Thumbnail for {video_title}...")
+        thumbnail_task = asyncio.create_task(
+            asyncio.to_thread(shared.asset_mgr.generate_thumbnail, video_title, thumbnail_path)
+        )
+
+    if manifest.render_valid():
+        output_file = manifest.get('render')['output']['path']
+        log.info(f"Reusing rendered video: {output_file}")
+    else:
+        async with shared.render_limit:
+            log.info("Rendering video...")
+            # Rendering is CPU-bound and blocking; other jobs keep fetching assets meanwhile
+            success = await asyncio.to_thread(
+                VideoEditor().create_video, processed_scenes, output_file,
+                is_short=is_short, style=style, render_mode=render_mode, backend=backend
+            )
+        if not success:
+            log.error("Video generation failed")
+            log.error(f"Resume with: python -m src.main --resume {manifest.run_id}")
+            if thumbnail_task:
+                # Its thread can't be cancelled; let it finish so the resumed run reuses the thumbnail
+                await asyncio.gather(thumbnail_task, return_exceptions=True)
+            return False
+        manifest.complete('render', {
+            'output': RunManifest.artifact(output_file),
+            'scenes_fingerprint': RunManifest.scenes_fingerprint(manifest.get('scenes'))
+        })
+    log.info(f"Video generated successfully: {output_file}")
+
+    if dry_run:
+        return True
+
+    # Prepare SEO Metadata
+    seo_description = script_data.get('description', f"{video_title}\n\n#Psychology #Archetypes")
+    if video_type == "long" and 'chapters' in script_data:
+        seo_description += "\n\nChapters:\n" + "\n".join(script_data['chapters'])
+
+    seo_tags = script_data.get('tags', ['Psychology', 'Education'])
+
+    # Preparation for Scheduling
+    # Schedule for 12 hours from now
+    schedule_date = datetime.utcnow() + timedelta(hours=12)
+    publish_at = schedule_date.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    upload = manifest.get('upload') or {}
+    # 4. Upload to YouTube
+    log.info("Starting Upload Process...")
+    try:
+        uploader = shared.uploader
+        video_id = upload.get('video_id')
+        if video_id:
+            # Never upload the same run twice; only finish the steps that didn't complete
+            log.info(f"Video already uploaded in this run: {video_id}")
+            publish_at = upload.get('publish_at', publish_at)
+        else:
+            # One video upload at a time; they compete for the same bandwidth
+            async with shared.upload_lock:
+                video_id = await uploader.upload_video(
+                    output_file,
+                    video_title,
+                    seo_description,
+                    tags=seo_tags,
+                    publish_at=publish_at
+                )
+            if video_id:
+                manifest.update('upload', video_id=video_id, publish_at=publish_at)
+
+        if thumbnail_task:
+            await thumbnail_task
+
+        if video_id and os.path.exists(thumbnail_path):
+            async def thumbnail_step():
+                if not upload.get('thumbnail_set'):
+                    if await uploader.set_thumbnail(video_id, thumbnail_path):
+                        manifest.update('upload', thumbnail_set=True)
+
+            async def comment_step():
+                # Add and Pin Engagement Comment
+                comment_id = upload.get('comment_id')
+                if not comment_id:
+                    comment_text = "How was the video? Comment 'Ready' below if you reached the end! 👇"
+                    comment_id = await uploader.add_comment(video_id, comment_text)
+                    if comment_id:
+                        manifest.update('upload', comment_id=comment_id)
+                if comment_id and not upload.get('pinned'):
+                    if await uploader.pin_comment(comment_id):
+                        manifest.update('upload', pinned=True)
+
+            # Thumbnail and comment are independent API calls, so they run side by side
+            await asyncio.gather(thumbnail_step(), comment_step())
+            log.info(f"Successfully uploaded, scheduled for {publish_at}, and set thumbnail/comment: https://youtu.be/{video_id}")
+        elif video_id:
+            log.info(f"Successfully uploaded video: https://youtu.be/{video_id}")
+        log.info(f"YouTube API latency: {uploader.latency_summary()}")
+    except Exception as e:
+        log.error(f"Upload process failed: {e}")
+        log.error(f"Resume with: python -m src.main --resume {manifest.run_id}")
+    return True
+
+
+async def run_jobs(shared, manifests, **options):
+    """Runs several jobs concurrently; the shared budgets decide how much overlaps."""
+    for manifest in manifests:
+        logger.info(f"Run ID: {manifest.run_id} (resume with --resume {manifest.run_id})")
+    results = await asyncio.gather(
+        *(run_job(shared, manifest, **options) for manifest in manifests), return_exceptions=True
+    )
+    # One failing job must not take the others down with it
+    for manifest, result in zip(manifests, results):
+        if isinstance(result, Exception):
+            logger.error(f"Job {manifest.run_id} crashed: {result}")
+            logger.error(f"Resume with: python -m src.main --resume {manifest.run_id}")
+    return [result is True for result in results]
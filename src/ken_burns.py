@@ -0,0 +1,99 @@
+import numpy as np
+from PIL import Image
+
+def canvas_size(target_size, margin=1.1):
+    return int(target_size[0] * margin), int(target_size[1] * margin)
+
+def cover_canvas(img, target_size, base_scale=1.3, margin=1.1):
+    """
+    Scales the image to cover base_scale x target and keeps the centred margin x target region,
+    in one resample (the box argument crops and scales in the same pass).
+    """
+    target_w, target_h = target_size
+    canvas_w, canvas_h = canvas_size(target_size, margin)
+    img = img.convert('RGB')
+    if img.size == (canvas_w, canvas_h):
+        # Already normalized to the canvas
+        return img
+    scale = max(target_w * base_scale / img.width, target_h * base_scale / img.height)
+    box_w, box_h = canvas_w / scale, canvas_h / scale
+    left = (img.width - box_w) / 2
+    top = (img.height - box_h) / 2
+    return img.resize((canvas_w, canvas_h), Image.LANCZOS, box=(left, top, left + box_w, top + box_h))
+
+
+class KenBurns:
+    """
+    Pan/zoom frame generator for still images.
+    The source is decoded and scaled onto a margin canvas once; every frame is then either a
+    plain array slice (pans) or a single box-resample of the canvas (zooms), following a
+    crop-window schedule computed up front.
+    """
+    ANIMATIONS = ('zoom_in', 'zoom_out', 'pan_left', 'pan_right')
+
+    def __init__(self, image_path, target_size, anim_type, duration, fps=24,
+                 base_scale=1.3, margin=1.1, zoom=0.15, pan=0.1):
+        self.target_w, self.target_h = target_size
+        self.anim_type = anim_type
+        self.duration = duration
+        self.fps = fps
+        self.zoom = zoom
+        self.pan = pan
+
+        self.canvas = self._load_canvas(image_path, base_scale, margin)
+        self.canvas_array = np.asarray(self.canvas)
+        self.schedule = self._build_schedule()
+        self._last = (None, None)
+
+    def _load_canvas(self, image_path, base_scale, margin):
+        with Image.open(image_path) as img:
+            return cover_canvas(img, (self.target_w, self.target_h), base_scale, margin)
+
+    def _build_schedule(self):
+        """One crop window (left, top, right, bottom) on the canvas per output frame."""
+        n_frames = max(1, int(np.ceil(self.duration * self.fps)))
+        progress = np.arange(n_frames) / max(n_frames - 1, 1)
+        cw, ch = self.canvas.size
+        tw, th = self.target_w, self.target_h
+
+        if self.anim_type in ('zoom_in', 'zoom_out'):
+            if self.anim_type == 'zoom_in':
+                scale = 1.0 + self.zoom * progress
+            else:
+                scale = (1.0 + self.zoom) - self.zoom * progress
+            win_w, win_h = tw / scale, th / scale
+            left = (cw - win_w) / 2
+            top = (ch - win_h) / 2
+            return np.stack([left, top, left + win_w, top + win_h], axis=1)
+
+        travel = min(self.pan * tw, cw - tw)
+        if self.anim_type == 'pan_left':
+            left = travel * progress
+        elif self.anim_type == 'pan_right':
+            left = travel * (1 - progress)
+        else:
+            left = np.full(n_frames, (cw - tw) / 2)
+        # Pans keep the window at target size, so snap to whole pixels and slice without resampling
+        left = np.round(left)
+        top = np.full(n_frames, float((ch - th) // 2))
+        return np.stack([left, top, left + tw, top + th], axis=1)
+
+    def get_frame(self, t):
+        n = min(int(t * self.fps + 1e-6), len(self.schedule) - 1)
+        if self._last[0] == n:
+            return self._last[1]
+
+        left, top, right, bottom = self.schedule[n]
+        if right - left == self.target_w and bottom - top == self.target_h:
+            x, y = int(left), int(top)
+            frame = self.canvas_array[y:y + self.target_h, x:x + self.target_w]
+        else:
+            frame = np.asarray(self.canvas.resize(
+                (self.target_w, self.target_h), Image.BILINEAR, box=(left, top, right, bottom)
+            ))
+        self._last = (n, frame)
+        return frame
+
+    def make_clip(self):
+        from moviepy.editor import VideoClip
+        return VideoClip(self.get_frame, duration=self.duration)
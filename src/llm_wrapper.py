@@ -2,8 +2,19 @@ import time
 import json
 from google import genai
 from .config import Config
+from .model_router import ModelRouter
+from .response_cache import ResponseCache
+from .script_schema import (SceneStreamParser, parse_script, script_schema, scenes_schema,
+                            validate_scene, validate_script)
+
+def _rejects_structured_output(error):
+    """True for a 400 caused by response_mime_type/response_schema (models or API versions without JSON mode)."""
+    msg = str(error).lower().replace("_", "")
+    return "400" in msg and ("responseschema" in msg or "responsemimetype" in msg)
 
 class LLMWrapper:
+    SCRIPT_REPAIR_ROUNDS = 2
+
     def __init__(self):
         if not Config.GEMINI_API_KEY:
             raise ValueError("GEMINI_API_KEY not found in environment variables")
@@ -24,79 +35,272 @@ class LLMWrapper:
             'models/gemini-2.0-flash-lite',
             'models/gemini-pro'
         ]
-        self.available_gen_models = []
-        self._refresh_available_models()
+        # Model list comes from a disk cache (refreshed in the background), so this never blocks
+        self.router = ModelRouter(self.client, self.preferred_models)
+        self.response_cache = ResponseCache()
+        # Models that answered a response schema with a 400; they get plain prompts from then on
+        self.no_schema_models = set()
 
-    def _refresh_available_models(self):
-        """Fetches and filters models that support content generation."""
-        try:
-            print("Refreshing available generative models...")
-            models = list(self.client.models.list())
-            self.available_gen_models = [m.name for m in models if 'generateContent' in m.supported_actions]
-            print(f"DEBUG: Confirmed Generative Models: {self.available_gen_models}")
-        except Exception as e:
-            print(f"Warning: Could not list models, will use hardcoded defaults: {e}")
-            self.available_gen_models = self.preferred_models
+    @staticmethod
+    def _parse_json(text, open_char="{", close_char="}"):
+        """Strips code fences and any filler around the outermost JSON object/list."""
+        clean_text = text.replace("```json", "").replace("```", "").strip()
+        if open_char in clean_text:
+            clean_text = clean_text[clean_text.find(open_char):clean_text.rfind(close_char)+1]
+        return json.loads(clean_text)
 
-    def _call_gemini(self, prompt, max_retries=10):
-        """Ultra-robust caller that swaps models if one is rate-limited or missing."""
-        
-        # Build an ordered list of models to try for THIS call
-        candidate_models = []
-        for p in self.preferred_models:
-            if p in self.available_gen_models:
-                candidate_models.append(p)
-        
-        # Add any other available models that aren't in our preference list
-        for a in self.available_gen_models:
-            if a not in candidate_models:
-                candidate_models.append(a)
-        
-        if not candidate_models:
-            candidate_models = ['models/gemini-1.5-flash'] # Final desperation
+    @classmethod
+    def _parse_json_list(cls, text):
+        return cls._parse_json(text, "[", "]")
+
+    @staticmethod
+    def _generation_config(response_schema=None):
+        # Disable AFC to speed up and save tokens
+        config = {'automatic_function_calling': {'disable': True}}
+        if response_schema:
+            config.update(response_mime_type='application/json', response_schema=response_schema)
+        return config
+
+    def _wait_for_model(self):
+        current_model, wait_time = self.router.pick()
+        if wait_time > 0:
+            # Every model is cooling down: wait for the first one instead of hammering any of them
+            wait_time = min(wait_time, self.router.MAX_COOLDOWN)
+            print(f"All models rate limited. Waiting {wait_time:.0f}s for {current_model}...")
+            time.sleep(wait_time)
+        return current_model
+
+    def _should_retry(self, current_model, error, attempt, max_retries):
+        """Records a failed attempt with the router and decides whether another model gets a go."""
+        kind = self.router.record_failure(current_model, error)
+
+        # If 404, the model name is definitely wrong or retired; the router drops it
+        if kind == "missing":
+            print(f"Model {current_model} NOT FOUND (404). Swapping...")
+            return True
+
+        # If 429 or Quota, the router puts the model on cooldown and the next pick spreads the load
+        if kind == "rate_limited":
+            print(f"Rate Limited on {current_model}. Attempt {attempt+1}/{max_retries}. Swapping models...")
+            return True
+
+        # If it's a different error (like safety), we might need to stop
+        print(f"Gemini API Error on {current_model}: {error}")
+        return attempt < 3 # Try a few times even for unknown errors
+
+    @staticmethod
+    def _without_schema(config):
+        return {k: v for k, v in config.items() if k not in ('response_mime_type', 'response_schema')}
+
+    def _config_for(self, model, config):
+        return self._without_schema(config) if model in self.no_schema_models else config
+
+    def _schema_rejected(self, model, config, error):
+        """Remembers a model that rejects structured output; True if the call should simply be repeated."""
+        if 'response_schema' not in config or not _rejects_structured_output(error):
+            return False
+        # Not the model's fault: retry the same call as a plain prompt, the parser copes
+        print(f"{model} rejected structured output. Sending it plain prompts from now on...")
+        self.no_schema_models.add(model)
+        return True
+
+    def _call_gemini(self, prompt, max_retries=10, call_type="default", parse=None, response_schema=None,
+                     cache_if=None):
+        """
+        Routes each attempt to the fastest healthy model; rate-limited models sit out their cooldown.
+        Responses are served from / stored in the response cache according to call_type's TTL.
+        With parse, returns parse(text) instead of the text, and only responses that parse are cached
+        (a cached one that no longer parses is dropped and fetched again).
+        With cache_if, only results for which cache_if(result) is true are cached (or served from cache).
+        With response_schema, asks for structured JSON output; models that reject it are asked again
+        without, and are never sent a schema again.
+        """
+        config = self._generation_config(response_schema)
+        # Cached under what was asked for, even if a fallback without the schema answered
+        cache_config = config
+
+        cached = self.response_cache.get(call_type, self.router.candidates(), prompt, cache_config)
+        if cached:
+            model, text = cached
+            try:
+                result = parse(text) if parse else text
+                if cache_if is None or cache_if(result):
+                    return result
+            except Exception:
+                pass
+            self.response_cache.discard(model, prompt, cache_config)
 
-        model_index = 0
         for i in range(max_retries):
-            # Cycle through models if we keep hitting limits
-            current_model = candidate_models[model_index % len(candidate_models)]
-            
+            current_model = self._wait_for_model()
+
+            model_config = self._config_for(current_model, config)
+
+            started = time.perf_counter()
             try:
-                # Disable AFC to speed up and save tokens
-                config = {'automatic_function_calling': {'disable': True}}
                 response = self.client.models.generate_content(
                     model=current_model,
                     contents=prompt,
-                    config=config
+                    config=model_config
                 )
                 if not response or not response.text:
                     raise ValueError("Empty response")
-                return response.text
-                
+                self.router.record_success(current_model, time.perf_counter() - started)
             except Exception as e:
-                err_msg = str(e).lower()
-                
-                # If 404, the model name is definitely wrong or retired, move to next model immediately
-                if "404" in err_msg or "not found" in err_msg:
-                    print(f"Model {current_model} NOT FOUND (404). Swapping...")
-                    model_index += 1
+                if self._schema_rejected(current_model, model_config, e):
+                    continue
+                if self._should_retry(current_model, e, i, max_retries):
                     continue
-                
-                # If 429 or Quota, wait and then try the NEXT model to spread load
-                if "429" in err_msg or "resource_exhausted" in err_msg or "quota" in err_msg:
-                    wait_time = min(5 * (2 ** (i // 2)), 60) # 5, 5, 10, 10, 20, 20... capping at 60s
-                    print(f"Rate Limited on {current_model}. Attempt {i+1}/{max_retries}. Swapping models and waiting {wait_time}s...")
-                    model_index += 1
-                    time.sleep(wait_time)
+                return None
+
+            text = response.text
+            # A response that doesn't parse raises to the caller and never reaches the cache
+            result = parse(text) if parse else text
+            if cache_if is None or cache_if(result):
+                usage = getattr(response, 'usage_metadata', None)
+                self.response_cache.put(call_type, current_model, prompt, cache_config, text,
+                                        tokens=getattr(usage, 'total_token_count', None))
+            return result
+        return None
+
+    def _stream_script(self, prompt, fields, response_schema, on_scene, max_retries=10):
+        """
+        Streaming counterpart of _call_gemini for scripts: each valid scene is passed to on_scene
+        as soon as its object closes, while the rest is still being generated.
+        Returns (data, complete) like parse_script, data['scenes'] holding the very objects handed out.
+        """
+        config = self._generation_config(response_schema)
+        cache_config = config
+        cached = self.response_cache.get("script", self.router.candidates(), prompt, cache_config)
+        if cached:
+            # Nothing to wait for, the caller gets every scene at once
+            try:
+                return parse_script(cached[1])
+            except ValueError:
+                self.response_cache.discard(cached[0], prompt, cache_config)
+
+        for i in range(max_retries):
+            current_model = self._wait_for_model()
+            model_config = self._config_for(current_model, config)
+            parser = SceneStreamParser()
+            parts, scenes = [], []
+            started = time.perf_counter()
+            try:
+                stream = self.client.models.generate_content_stream(model=current_model, contents=prompt,
+                                                                    config=model_config)
+                for chunk in stream:
+                    parts.append(chunk.text or "")
+                    for raw in parser.feed(parts[-1]):
+                        scene = validate_scene(raw, fields)[0]
+                        scenes.append(scene)
+                        if scene is not None:
+                            if len(scenes) == 1:
+                                print(f"First scene streamed from {current_model} after {time.perf_counter() - started:.1f}s")
+                            on_scene(scene)
+                if not scenes:
+                    raise ValueError("No scenes in streamed response")
+                self.router.record_success(current_model, time.perf_counter() - started)
+            except Exception as e:
+                if scenes:
+                    # Scenes already handed out stay; the rest is repaired like a truncated response
+                    print(f"Stream from {current_model} broke after {len(scenes)} scenes: {e}")
+                    self.router.record_failure(current_model, e)
+                    return self._streamed_script("".join(parts), scenes), False
+                if self._schema_rejected(current_model, model_config, e):
                     continue
-                
-                # If it's a different error (like safety), we might need to stop
-                print(f"Gemini API Error on {current_model}: {e}")
-                if i < 3: # Try a few times even for unknown errors
-                    model_index += 1
+                if self._should_retry(current_model, e, i, max_retries):
                     continue
                 return None
+
+            text = "".join(parts)
+            print(f"Script streamed: {len(scenes)} scenes in {time.perf_counter() - started:.1f}s")
+            if parser.done:
+                self.response_cache.put("script", current_model, prompt, cache_config, text)
+            return self._streamed_script(text, scenes), parser.done
         return None
 
+    @staticmethod
+    def _streamed_script(text, scenes):
+        """Top-level fields from the streamed text, scenes exactly as they were streamed."""
+        try:
+            data, _ = parse_script(text)
+        except ValueError:
+            data = {}
+        data['scenes'] = scenes
+        return data
+
+    def _generate_script(self, prompt, title, fields, extras=(), scene_count=None, on_scene=None):
+        """
+        Requests a script as structured JSON against the scene schema and validates it.
+        Broken scenes, and scenes lost to a truncated response, are re-requested on their own
+        (up to SCRIPT_REPAIR_ROUNDS times) instead of generating the whole script again.
+        Scenes that still can't be repaired are dropped. Returns None if no scene survives.
+        With on_scene, the response is streamed and on_scene gets each valid scene as it arrives
+        (possibly from a worker thread); repaired scenes only appear in the returned script.
+        """
+        schema = script_schema(fields, extras)
+        if on_scene:
+            script = self._stream_script(prompt, fields, schema, on_scene)
+        else:
+            # Like the streamed path, a truncated script is repaired but never cached
+            script = self._call_gemini(prompt, call_type="script", parse=parse_script, response_schema=schema,
+                                       cache_if=lambda parsed: parsed[1])
+        if not script:
+            return None
+        data, complete = script
+        broken = validate_script(data, fields, title, extras)
+        missing = 0 if complete or not scene_count else max(0, scene_count - len(data['scenes']))
+
+        for _ in range(self.SCRIPT_REPAIR_ROUNDS):
+            if not broken and not missing:
+                break
+            print(f"Repairing script: {len(broken)} invalid and {missing} missing scene(s)...")
+            self._repair_scenes(prompt, data, fields, broken, missing)
+            broken = [i for i, scene in enumerate(data['scenes']) if scene is None]
+            missing = 0 if complete or not scene_count else max(0, scene_count - len(data['scenes']))
+
+        if broken:
+            print(f"Dropping {len(broken)} scene(s) that could not be repaired")
+        data['scenes'] = [scene for scene in data['scenes'] if scene is not None]
+        return data if data['scenes'] else None
+
+    def _repair_scenes(self, brief, data, fields, broken, missing):
+        """Asks for just the broken slots (and any missing tail) and fills them into data in place."""
+        outline = []
+        for i, scene in enumerate(data['scenes']):
+            outline.append(f"{i + 1}. " + (scene['text'] if scene else "MISSING - write this scene"))
+        for i in range(len(data['scenes']), len(data['scenes']) + missing):
+            outline.append(f"{i + 1}. MISSING - write this scene")
+        needed = len(broken) + missing
+
+        prompt = f"""
+        You are completing an existing video script. Follow the original brief below.
+
+        ORIGINAL BRIEF:
+        {brief}
+
+        CURRENT SCENES (narration only):
+        {chr(10).join(outline)}
+
+        Write exactly {needed} scene(s), one for each MISSING slot, in order. Each must flow from the
+        scene before it into the scene after it.
+        Return ONLY a JSON list of scene objects with the fields: {", ".join(fields)}.
+        """
+        try:
+            # Repairs are only needed when something went wrong, so they're never served from cache
+            repaired = self._call_gemini(prompt, call_type="script_repair", parse=parse_script,
+                                         response_schema=scenes_schema(fields))
+        except Exception as e:
+            print(f"Error parsing repaired scenes: {e}")
+            return
+        if not repaired:
+            return
+
+        new_scenes = [validate_scene(scene, fields)[0] for scene in repaired[0]['scenes']]
+        for i, scene in zip(broken, new_scenes):
+            data['scenes'][i] = scene
+        # Whatever is left over continues a truncated script; invalid ones become slots for the next round
+        data['scenes'].extend(new_scenes[len(broken):len(broken) + missing])
+
     def generate_psychology_titles(self):
         """Generates 20 viral psychology titles."""
         prompt = """
@@ -105,18 +309,12 @@ class LLMWrapper:
         ["Title 1", "Title 2", ...]
         """
         try:
-            text = self._call_gemini(prompt)
-            if not text: return []
-            clean_text = text.replace("```json", "").replace("```", "").strip()
-            # Basic JSON extraction if AI includes filler
-            if "[" in clean_text:
-                clean_text = clean_text[clean_text.find("["):clean_text.rfind("]")+1]
-            return json.loads(clean_text)
+            return self._call_gemini(prompt, call_type="titles", parse=self._parse_json_list) or []
         except Exception as e:
             print(f"Error parsing titles: {e}")
             return []
 
-    def generate_psychology_script(self, title):
+    def generate_psychology_script(self, title, on_scene=None):
         """Generates a long-form psychology script with 25+ animated scenes."""
         prompt = f"""
         Title: {title}
@@ -143,17 +341,12 @@ class LLMWrapper:
         }}
         """
         try:
-            text = self._call_gemini(prompt)
-            if not text: return None
-            clean_text = text.replace("```json", "").replace("```", "").strip()
-            if "{" in clean_text:
-                clean_text = clean_text[clean_text.find("{"):clean_text.rfind("}")+1]
-            return json.loads(clean_text)
+            return self._generate_script(prompt, title, ['text', 'visual_prompt'], scene_count=25, on_scene=on_scene)
         except Exception as e:
             print(f"Error parsing script: {e}")
             return None
 
-    def generate_psychology_short_script(self, title):
+    def generate_psychology_short_script(self, title, on_scene=None):
         """Generates a 60-second viral psychology short script with 12 animated scenes."""
         prompt = f"""
         Title: {title}
@@ -179,16 +372,11 @@ class LLMWrapper:
         }}
         """
         try:
-            text = self._call_gemini(prompt)
-            if not text: return None
-            clean_text = text.replace("```json", "").replace("```", "").strip()
-            if "{" in clean_text:
-                clean_text = clean_text[clean_text.find("{"):clean_text.rfind("}")+1]
-            return json.loads(clean_text)
+            return self._generate_script(prompt, title, ['text', 'visual_prompt'], scene_count=18, on_scene=on_scene)
         except Exception as e:
             print(f"Error parsing short script: {e}")
             return None
-    def generate_conversational_script(self, topic, type="short"):
+    def generate_conversational_script(self, topic, type="short", on_scene=None):
         """Generates a high-SEO, human-like script with dynamic stickman movements."""
         char_count = "7000-9000" if type == "long" else "600-800"
         scene_count = 25 if type == "long" else 12
@@ -225,12 +413,11 @@ class LLMWrapper:
         }}
         """
         try:
-            text = self._call_gemini(prompt)
-            if not text: return None
-            clean_text = text.replace("```json", "").replace("```", "").strip()
-            if "{" in clean_text:
-                clean_text = clean_text[clean_text.find("{"):clean_text.rfind("}")+1]
-            return json.loads(clean_text)
+            return self._generate_script(
+                prompt, topic, ['text', 'audio_mood', 'vocal_action', 'visual_prompt'],
+                extras=('tags', 'chapters') if type == "long" else ('tags',), scene_count=scene_count,
+                on_scene=on_scene
+            )
         except Exception as e:
             print(f"Error parsing conversational script: {e}")
             return None
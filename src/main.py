@@ -1,13 +1,9 @@
 import argparse
 import asyncio
-import os
 import sys
 from src.utils import setup_logging, ensure_dir_exists
-from src.llm_wrapper import LLMWrapper
-from src.voice_engine import VoiceEngine
-from src.asset_manager import AssetManager
-from src.video_editor import VideoEditor
-from src.youtube_uploader import YouTubeUploader
+from src.run_manifest import RunManifest
+from src.jobs import SharedServices, run_job
 
 logger = setup_logging()
 
@@ -17,143 +13,40 @@ async def main():
     parser.add_argument("--topic", type=str, help="Specific topic to generate")
     parser.add_argument("--type", type=str, choices=["long", "short"], default="long", help="Type of video to generate")
     parser.add_argument("--style", type=str, choices=["noir", "stickman"], default="noir", help="Visual style of the video")
+    parser.add_argument("--tts-concurrency", type=int, default=None, help="Max in-flight TTS requests (default: Config.TTS_CONCURRENCY)")
+    parser.add_argument("--image-concurrency", type=int, default=None, help="Max in-flight image requests (default: Config.IMAGE_CONCURRENCY)")
+    parser.add_argument("--render-mode", type=str, choices=["single", "segmented"], default=None, help="Render as one graph or as parallel per-scene segments (default: Config.RENDER_MODE)")
+    parser.add_argument("--backend", type=str, choices=["moviepy", "ffmpeg"], default=None, help="Render backend: MoviePy frames or one native ffmpeg filter graph (default: Config.RENDER_BACKEND)")
+    parser.add_argument("--resume", type=str, metavar="RUN_ID", help="Resume an earlier run, skipping every stage whose artifacts are still valid")
     args = parser.parse_args()
 
+    if args.resume:
+        manifest = RunManifest.load(args.resume)
+        if not manifest:
+            sys.exit(1)
+        # The run's own settings win over the command line, so resumed artifacts stay consistent
+        for key in ("type", "style", "topic"):
+            setattr(args, key, manifest.params.get(key, getattr(args, key)))
+        logger.info(f"Resuming run {manifest.run_id}")
+    else:
+        manifest = RunManifest.create({"type": args.type, "style": args.style, "topic": args.topic})
+        logger.info(f"Run ID: {manifest.run_id} (resume with --resume {manifest.run_id})")
+
     logger.info(f"Starting Media Automation in {args.style} style...")
     ensure_dir_exists("temp")
     ensure_dir_exists("output")
 
-    # 1. Generate Content
-    llm = LLMWrapper()
-    voice = VoiceEngine()
-    
-    from src.trends import TrendEngine
-    trend_engine = TrendEngine()
-    
-    # Select Topic
-    title = args.topic
-    if not title:
-        title = trend_engine.get_viral_topic(llm)
-        if not title:
-            logger.error("Failed to discover a viral topic")
-            sys.exit(1)
-        logger.info(f"Viral Topic Selected: {title}")
-    
-    # Override voice for stickman style if requested (Harry-like deep voice)
-    if args.style == "stickman":
-        voice.voice = "en-GB-RyanNeural" 
-        logger.info(f"Using deep voice: {voice.voice}")
-    
-    logger.info(f"Generating {args.type} script for Title: {title}")
-    
-    if args.style == "stickman":
-         script_data = llm.generate_conversational_script(title, type=args.type)
-    elif args.type == "long":
-        script_data = llm.generate_psychology_script(title)
-    else:
-        script_data = llm.generate_psychology_short_script(title)
-
-    if not script_data:
-        logger.error(f"Failed to generate {args.type} script")
+    shared = SharedServices(
+        tts_concurrency=args.tts_concurrency,
+        image_concurrency=args.image_concurrency
+    )
+    try:
+        success = await run_job(shared, manifest, dry_run=args.dry_run, render_mode=args.render_mode, backend=args.backend)
+    finally:
+        shared.close()
+    if not success:
         sys.exit(1)
 
-    logger.info(f"Title: {script_data.get('title')}")
-    if script_data.get('deduced_angle'):
-        logger.info(f"Deduced Angle: {script_data.get('deduced_angle')}")
-    
-    # 2. Process Scenes
-    asset_mgr = AssetManager()
-    processed_scenes = []
-
-    for i, scene in enumerate(script_data['scenes']):
-        logger.info(f"Processing Scene {i+1}...")
-        
-        # Audio
-        audio_path = f"temp/audio_{i}.mp3"
-        mood = scene.get('audio_mood', 'neutral')
-        await voice.generate_audio(scene['text'], audio_path, mood=mood)
-        
-        # Visuals
-        # Use landscape for long-form, portrait for shorts
-        orientation = "landscape" if args.type == "long" else "portrait"
-        
-        # Save visuals in persistent assets folder for tracking
-        ensure_dir_exists("assets/visuals")
-        video_path = f"assets/visuals/visual_{i}.jpg"
-        
-        prompt = scene.get('visual_prompt', scene.get('text'))
-        logger.info(f"Generating Image with prompt: {prompt}")
-        
-        asset_mgr.generate_image(prompt, video_path, orientation=orientation)
-        
-        processed_scenes.append({
-            'audio_path': audio_path,
-            'video_path': video_path,
-            'text': scene['text']
-        })
-
-    # 3. Create Video
-    editor = VideoEditor()
-    output_file = f"output/final_{args.type}.mp4"
-    logger.info("Rendering video...")
-    is_short = (args.type == "short")
-    
-    success = editor.create_video(processed_scenes, output_file, is_short=is_short, style=args.style)
-    
-    if success:
-        logger.info(f"Video generated successfully: {output_file}")
-
-        # Prepare SEO Metadata
-        video_title = script_data.get('title', args.topic)
-        seo_description = script_data.get('description', f"{video_title}\n\n#Psychology #Archetypes")
-        if args.type == "long" and 'chapters' in script_data:
-            seo_description += "\n\nChapters:\n" + "\n".join(script_data['chapters'])
-        
-        seo_tags = script_data.get('tags', ['Psychology', 'Education'])
-        
-        # Preparation for Scheduling
-        from datetime import datetime, timedelta
-        # Schedule for 12 hours from now
-        schedule_date = datetime.utcnow() + timedelta(hours=12)
-        publish_at = schedule_date.strftime('%Y-%m-%dT%H:%M:%SZ')
-
-        if not args.dry_run:
-            # 4. Upload to YouTube
-            logger.info("Starting Upload Process...")
-            try:
-                uploader = YouTubeUploader()
-                
-                # Generate Thumbnail
-                ensure_dir_exists("assets/thumbnails")
-                thumbnail_path = f"assets/thumbnails/thumb_{args.type}.jpg"
-                logger.info(f"Generating Thumbnail for {video_title}...")
-                asset_mgr.generate_thumbnail(video_title, thumbnail_path)
-                
-                video_id = uploader.upload_video(
-                    output_file, 
-                    video_title, 
-                    seo_description, 
-                    tags=seo_tags,
-                    publish_at=publish_at
-                )
-
-                if video_id and os.path.exists(thumbnail_path):
-                    uploader.set_thumbnail(video_id, thumbnail_path)
-                    
-                    # Add and Pin Engagement Comment
-                    comment_text = "How was the video? Comment 'Ready' below if you reached the end! 👇"
-                    comment_id = uploader.add_comment(video_id, comment_text)
-                    if comment_id:
-                        uploader.pin_comment(video_id, comment_id) # YouTube API requires video_id for pinning
-                        
-                    logger.info(f"Successfully uploaded, scheduled for {publish_at}, and set thumbnail/comment: https://youtu.be/{video_id}")
-                elif video_id:
-                    logger.info(f"Successfully uploaded video: https://youtu.be/{video_id}")
-            except Exception as e:
-                logger.error(f"Upload process failed: {e}")
-    else:
-        logger.error("Video generation failed")
-
 if __name__ == "__main__":
     try:
         asyncio.run(main())
@@ -0,0 +1,221 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+def retry_after_seconds(error):
+    """
+    Best-effort retry hint from a Gemini error, in seconds (None if there is none):
+    the Retry-After header, the RetryInfo detail, or a "retry in 12.3s" message.
+    """
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        value = headers.get('retry-after') or headers.get('Retry-After')
+        if value:
+            return float(value)
+    except (TypeError, ValueError):
+        pass
+
+    details = getattr(error, 'details', None)
+    if isinstance(details, dict):
+        for detail in (details.get('error') or {}).get('details') or []:
+            delay = detail.get('retryDelay') if isinstance(detail, dict) else None
+            if delay:
+                try:
+                    return float(str(delay).rstrip('s'))
+                except ValueError:
+                    pass
+
+    match = re.search(r"retry(?:Delay)?['\"]?\s*(?:in|:)\s*['\"]?([\d.]+)\s*s", str(error), re.IGNORECASE)
+    return float(match.group(1)) if match else None
+
+
+def classify_error(error):
+    """'missing' (404), 'rate_limited' (429/quota) or 'error' for anything else."""
+    code = getattr(error, 'code', None)
+    msg = str(error).lower()
+    if code == 404 or "404" in msg or "not found" in msg:
+        return "missing"
+    if code == 429 or "429" in msg or "resource_exhausted" in msg or "quota" in msg:
+        return "rate_limited"
+    return "error"
+
+
+class ModelRouter:
+    """
+    Chooses the Gemini model for each call.
+    The generateContent-capable model list is cached on disk with a TTL and refreshed in a
+    background thread, so construction never waits on models.list(). Per model it tracks
+    latency and success rate (EWMA) and a cooldown window after rate limits (from the server's
+    retry hint when there is one); pick() returns the fastest healthy model, and when every
+    model is cooling down, how long until the first one is usable again.
+    """
+    EWMA_ALPHA = 0.3
+    DEFAULT_COOLDOWN = 30.0
+    MAX_COOLDOWN = 600.0
+    ERROR_COOLDOWN = 5.0
+
+    def __init__(self, client, preferred_models, cache_path=None, ttl_hours=None):
+        self.client = client
+        self.preferred_models = list(preferred_models)
+        self.cache_path = cache_path or Config.MODEL_CACHE_PATH
+        self.ttl = (ttl_hours if ttl_hours is not None else Config.MODEL_LIST_TTL_HOURS) * 3600
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self.stats = {}
+
+        cached = self._load_cache()
+        self.available = cached.get('models') or list(self.preferred_models)
+        self.fetched_at = cached.get('fetched_at', 0)
+        for name, stat in (cached.get('stats') or {}).items():
+            self.stats[name] = self._new_stat(stat)
+        if time.time() - self.fetched_at > self.ttl:
+            self.refresh_async()
+
+    # --- Model list ------------------------------------------------------------
+
+    def _load_cache(self):
+        if not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable model cache {self.cache_path}: {e}")
+            return {}
+
+    def _save_cache(self):
+        with self._lock:
+            data = {
+                'fetched_at': self.fetched_at,
+                'models': self.available,
+                # Latency and cooldowns carry over, so the next run starts with what this one learned
+                'stats': {name: {k: stat[k] for k in ('latency', 'success_rate', 'successes', 'failures', 'cooldown_until')}
+                          for name, stat in self.stats.items()},
+            }
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+            tmp_path = f"{self.cache_path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, self.cache_path)
+        except Exception as e:
+            logger.warning(f"Could not write model cache: {e}")
+
+    def refresh(self):
+        """Blocking refresh of the model list (what the background thread runs)."""
+        try:
+            models = list(self.client.models.list())
+            available = [m.name for m in models if 'generateContent' in (m.supported_actions or [])]
+            if available:
+                with self._lock:
+                    self.available = available
+                    self.fetched_at = time.time()
+                logger.info(f"Model list refreshed: {len(available)} generative models")
+                self._save_cache()
+        except Exception as e:
+            logger.warning(f"Could not list models, keeping {len(self.available)} known models: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def refresh_async(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self.refresh, name="model-list-refresh", daemon=True).start()
+
+    # --- Stats -----------------------------------------------------------------
+
+    @staticmethod
+    def _new_stat(saved=None):
+        stat = {'latency': None, 'success_rate': 1.0, 'successes': 0, 'failures': 0, 'cooldown_until': 0.0, 'strikes': 0}
+        stat.update(saved or {})
+        return stat
+
+    def _stat(self, model):
+        if model not in self.stats:
+            self.stats[model] = self._new_stat()
+        return self.stats[model]
+
+    def candidates(self):
+        """Preferred models first (in preference order), then anything else the API offers."""
+        with self._lock:
+            available = list(self.available)
+        ordered = [m for m in self.preferred_models if m in available]
+        ordered += [m for m in available if m not in ordered]
+        return ordered or ['models/gemini-1.5-flash'] # Final desperation
+
+    def pick(self, exclude=()):
+        """
+        Returns (model, wait_seconds). wait_seconds is 0 unless every candidate is cooling down,
+        in which case it is the time until the soonest one may be used again.
+        """
+        now = time.time()
+        candidates = [m for m in self.candidates() if m not in exclude] or self.candidates()
+        with self._lock:
+            healthy = [m for m in candidates if self._stat(m)['cooldown_until'] <= now]
+            if not healthy:
+                model = min(candidates, key=lambda m: self._stat(m)['cooldown_until'])
+                return model, self._stat(model)['cooldown_until'] - now
+
+            def score(item):
+                rank, model = item
+                stat = self._stat(model)
+                unreliable = stat['success_rate'] < 0.5
+                # Fastest measured model first; unmeasured ones keep the preference order
+                latency = stat['latency'] if stat['latency'] is not None else float('inf')
+                return (unreliable, latency, rank)
+
+            return min(enumerate(healthy), key=score)[1], 0.0
+
+    def record_success(self, model, latency):
+        with self._lock:
+            stat = self._stat(model)
+            stat['successes'] += 1
+            stat['strikes'] = 0
+            stat['success_rate'] += self.EWMA_ALPHA * (1.0 - stat['success_rate'])
+            if stat['latency'] is None:
+                stat['latency'] = latency
+            else:
+                stat['latency'] += self.EWMA_ALPHA * (latency - stat['latency'])
+        self._save_cache()
+
+    def record_failure(self, model, error):
+        """Updates the model's health from an exception and returns the error kind."""
+        kind = classify_error(error)
+        with self._lock:
+            stat = self._stat(model)
+            stat['failures'] += 1
+            if kind == "missing":
+                # Retired or misspelled model: drop it until the next list refresh
+                if model in self.available:
+                    self.available = [m for m in self.available if m != model]
+            elif kind == "rate_limited":
+                stat['strikes'] += 1
+                hint = retry_after_seconds(error)
+                if hint is None:
+                    hint = min(self.DEFAULT_COOLDOWN * (2 ** (stat['strikes'] - 1)), self.MAX_COOLDOWN)
+                stat['cooldown_until'] = time.time() + hint
+                logger.info(f"{model} rate limited, cooling down for {hint:.0f}s")
+            else:
+                # Rate limits are handled by the cooldown; only real errors count against reliability
+                stat['success_rate'] -= self.EWMA_ALPHA * stat['success_rate']
+                stat['cooldown_until'] = time.time() + self.ERROR_COOLDOWN
+        self._save_cache()
+        return kind
+
+    def summary(self):
+        with self._lock:
+            return {
+                name: {'latency': round(stat['latency'], 2) if stat['latency'] is not None else None,
+                       'successes': stat['successes'], 'failures': stat['failures']}
+                for name, stat in self.stats.items()
+            }
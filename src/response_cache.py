@@ -0,0 +1,90 @@
+import hashlib
+import logging
+import threading
+import time
+from .cache import FileCache
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+class ResponseCache:
+    """
+    Persistent prompt -> response cache for Gemini calls.
+    Entries are keyed by model, prompt hash and generation config and expire after the TTL of
+    their call type; a TTL of 0 opts that call type out entirely. Counts hits, misses and the
+    tokens the hits would have cost.
+    """
+    def __init__(self, cache_dir=None, max_bytes=None, ttl_hours=None):
+        self.files = FileCache(
+            cache_dir or Config.LLM_CACHE_DIR,
+            max_bytes or Config.LLM_CACHE_MAX_MB * 1024 * 1024
+        )
+        self.ttl_hours = dict(Config.LLM_CACHE_TTL_HOURS if ttl_hours is None else ttl_hours)
+        self.hits = 0
+        self.misses = 0
+        self.tokens_saved = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(model, prompt, config):
+        prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        return FileCache.make_key("gemini", model, prompt_hash, config)
+
+    def enabled(self, call_type):
+        return Config.LLM_CACHE_ENABLED and self.ttl_hours.get(call_type, self.ttl_hours.get('default', 0)) > 0
+
+    def _ttl(self, call_type):
+        return self.ttl_hours.get(call_type, self.ttl_hours.get('default', 0)) * 3600
+
+    def get(self, call_type, models, prompt, config):
+        """
+        Returns (model, text) for the first model in `models` with a fresh entry, else None.
+        Looking up every candidate means a response from any model we'd accept is reused.
+        """
+        if not self.enabled(call_type):
+            return None
+        now = time.time()
+        for model in models:
+            key = self.key(model, prompt, config)
+            meta = self.files.get_meta(key)
+            if meta is None:
+                continue
+            if now - meta.get('created_at', 0) > self._ttl(call_type):
+                self.files.discard(key)
+                continue
+            data = self.files.read_data(key)
+            if data is None:
+                continue
+            with self._lock:
+                self.hits += 1
+                self.tokens_saved += meta.get('tokens', 0)
+            return model, data.decode('utf-8')
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, call_type, model, prompt, config, text, tokens=None):
+        if not self.enabled(call_type):
+            return
+        if tokens is None:
+            # No usage metadata: ~4 characters per token is close enough for a counter
+            tokens = (len(prompt) + len(text)) // 4
+        meta = {'created_at': time.time(), 'call_type': call_type, 'model': model, 'tokens': tokens}
+        try:
+            self.files.put_data(self.key(model, prompt, config), text.encode('utf-8'), ".txt", meta)
+        except OSError as e:
+            logger.warning(f"Could not cache Gemini response: {e}")
+
+    def discard(self, model, prompt, config):
+        """Drops a cached response the caller couldn't use (e.g. unparseable JSON)."""
+        self.files.discard(self.key(model, prompt, config))
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'tokens_saved': self.tokens_saved,
+            }
@@ -0,0 +1,156 @@
+import hashlib
+import json
+import logging
+import os
+import uuid
+from datetime import datetime
+from .config import Config
+from .utils import ensure_dir_exists
+
+logger = logging.getLogger(__name__)
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class RunManifest:
+    """
+    Checkpoint for one pipeline run, stored at <runs_dir>/<run_id>/manifest.json.
+    Each stage (topic, script, scenes, render, upload) is written as soon as it completes,
+    with size and sha256 of every artifact, so a failed run can be resumed and only
+    missing or modified artifacts are produced again.
+    """
+    def __init__(self, run_id, runs_dir=None, data=None):
+        self.run_id = run_id
+        self.run_dir = os.path.join(runs_dir or Config.RUNS_DIR, run_id)
+        self.path = os.path.join(self.run_dir, "manifest.json")
+        self.data = data or {'run_id': run_id, 'created_at': self._now(), 'params': {}, 'stages': {}}
+
+    @staticmethod
+    def _now():
+        return datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    @classmethod
+    def create(cls, params, runs_dir=None):
+        run_id = f"{datetime.utcnow():%Y%m%d-%H%M%S}-{params.get('type', 'run')}-{uuid.uuid4().hex[:6]}"
+        manifest = cls(run_id, runs_dir)
+        manifest.data['params'] = dict(params)
+        manifest.save()
+        return manifest
+
+    @classmethod
+    def load(cls, run_id, runs_dir=None):
+        """Returns the manifest of an earlier run, or None if it doesn't exist or can't be read."""
+        manifest = cls(run_id, runs_dir)
+        if not os.path.exists(manifest.path):
+            logger.error(f"No manifest found for run {run_id} at {manifest.path}")
+            return None
+        try:
+            with open(manifest.path, 'r', encoding='utf-8') as f:
+                manifest.data = json.load(f)
+        except Exception as e:
+            logger.error(f"Failed to read manifest {manifest.path}: {e}")
+            return None
+        return manifest
+
+    @property
+    def params(self):
+        return self.data.get('params', {})
+
+    def artifact_dir(self, name):
+        path = os.path.join(self.run_dir, name)
+        ensure_dir_exists(path)
+        return path
+
+    def save(self):
+        """Atomic write, so a crash mid-save never leaves a truncated manifest behind."""
+        ensure_dir_exists(self.run_dir)
+        self.data['updated_at'] = self._now()
+        tmp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    # --- Stages --------------------------------------------------------------
+
+    def get(self, stage):
+        return self.data['stages'].get(stage)
+
+    def complete(self, stage, value):
+        self.data['stages'][stage] = value
+        self.save()
+
+    def update(self, stage, **fields):
+        """Merges fields into a stage record (e.g. upload steps finishing one by one)."""
+        record = self.data['stages'].setdefault(stage, {})
+        record.update(fields)
+        self.save()
+
+    # --- Artifacts -----------------------------------------------------------
+
+    @staticmethod
+    def artifact(path):
+        if not path or not os.path.exists(path):
+            return None
+        return {'path': path, 'size': os.path.getsize(path), 'sha256': file_sha256(path)}
+
+    @staticmethod
+    def artifact_valid(entry):
+        """True if the recorded file is still there, unchanged."""
+        if not entry or not os.path.exists(entry['path']):
+            return False
+        if os.path.getsize(entry['path']) != entry['size']:
+            return False
+        return file_sha256(entry['path']) == entry['sha256']
+
+    def record_scenes(self, processed_scenes):
+        records = []
+        for scene in processed_scenes:
+            audio = self.artifact(scene['audio_path']) if scene.get('duration') else None
+            records.append({
+                'text': scene['text'],
+                'vocal_action': scene.get('vocal_action'),
+                'duration': scene.get('duration'),
+                'words': scene.get('words', []),
+                'audio': audio,
+                'image': self.artifact(scene['video_path']),
+            })
+        self.complete('scenes', records)
+
+    def valid_scenes(self, scenes):
+        """
+        Per input scene, the parts of the recorded result that can be reused: audio (path,
+        duration, words) and/or image (video_path). None where nothing valid was recorded or
+        the scene text changed.
+        """
+        records = self.get('scenes') or []
+        reusable = []
+        for i, scene in enumerate(scenes):
+            record = records[i] if i < len(records) else None
+            if not record or record.get('text') != scene['text']:
+                reusable.append(None)
+                continue
+            previous = {}
+            if self.artifact_valid(record.get('audio')):
+                previous.update(audio_path=record['audio']['path'], duration=record['duration'], words=record['words'])
+            if self.artifact_valid(record.get('image')):
+                previous['video_path'] = record['image']['path']
+            reusable.append(previous or None)
+        return reusable
+
+    @staticmethod
+    def scenes_fingerprint(records):
+        """Identifies the exact scene inputs a render was made from."""
+        parts = [[(r.get('audio') or {}).get('sha256'), (r.get('image') or {}).get('sha256'), r.get('text')] for r in records]
+        return hashlib.sha256(json.dumps(parts).encode('utf-8')).hexdigest()
+
+    def render_valid(self):
+        """True if the recorded render exists unchanged and was made from the current scenes."""
+        render = self.get('render')
+        if not render or not self.artifact_valid(render.get('output')):
+            return False
+        return render.get('scenes_fingerprint') == self.scenes_fingerprint(self.get('scenes') or [])
@@ -0,0 +1,279 @@
+import asyncio
+import logging
+import os
+import time
+from .config import Config
+from .audio_processing import audio_duration
+from .image_normalizer import NORMALIZED_EXT, InvalidImageError, normalize_image, orientation_size
+from .image_providers import stock_query
+from .stock_video import prepare_clip
+from .utils import ensure_dir_exists
+
+logger = logging.getLogger(__name__)
+
+class StageTimer:
+    """Tracks wall time (first start -> last finish) and summed busy time for one stage."""
+    def __init__(self, name):
+        self.name = name
+        self.first_start = None
+        self.last_end = None
+        self.busy = 0.0
+        self.count = 0
+
+    def start(self):
+        now = time.perf_counter()
+        if self.first_start is None:
+            self.first_start = now
+        return now
+
+    def stop(self, started):
+        now = time.perf_counter()
+        self.busy += now - started
+        self.count += 1
+        self.last_end = now if self.last_end is None else max(self.last_end, now)
+
+    @property
+    def wall(self):
+        if self.first_start is None or self.last_end is None:
+            return 0.0
+        return self.last_end - self.first_start
+
+    def summary(self):
+        return f"{self.name}: wall {self.wall:.1f}s, busy {self.busy:.1f}s over {self.count} scenes"
+
+
+class ScenePipeline:
+    """
+    Produces audio and visuals for every scene concurrently.
+    Each stage (TTS, image) has its own in-flight limit so we don't hammer a single service.
+    Pass tts_limit / image_limit / transcode_limit semaphores to share those limits between several pipelines.
+    """
+    def __init__(self, voice, asset_mgr, tts_concurrency=None, image_concurrency=None,
+                 audio_dir="temp", visual_dir="assets/visuals", voice_name=None,
+                 tts_limit=None, image_limit=None, style="noir", visual_source=None, transcode_limit=None):
+        self.voice = voice
+        self.asset_mgr = asset_mgr
+        self.tts_concurrency = tts_concurrency or Config.TTS_CONCURRENCY
+        self.image_concurrency = image_concurrency or Config.IMAGE_CONCURRENCY
+        self.audio_dir = audio_dir
+        self.visual_dir = visual_dir
+        self.voice_name = voice_name
+        self.tts_limit = tts_limit
+        self.image_limit = image_limit
+        self.transcode_limit = transcode_limit
+        # Images are normalized for the renderer of this style (Ken Burns canvas or stickman sprite)
+        self.style = style
+        # Stock footage replaces the generated stills in noir videos; stickman needs its white-background drawings
+        self.use_stock = (visual_source or Config.VISUAL_SOURCE) == "stock" and style != "stickman"
+        self.timers = {}
+
+    async def process(self, scenes, orientation="landscape", previous=None):
+        """
+        Returns processed scenes in the same order as the input script.
+        previous: optional per-scene results from an earlier attempt (see RunManifest.valid_scenes);
+        audio and images found there are reused instead of generated again.
+        """
+        tts_limit, image_limit = self._begin()
+        previous = previous or [None] * len(scenes)
+        started = time.perf_counter()
+        tasks = [
+            self._process_scene(i, scene, orientation, tts_limit, image_limit, previous[i] or {})
+            for i, scene in enumerate(scenes)
+        ]
+        # gather() preserves input order regardless of completion order
+        processed_scenes = await asyncio.gather(*tasks)
+        self._log_summary(started)
+        return list(processed_scenes)
+
+    async def process_streamed(self, produce, orientation="landscape"):
+        """
+        Like process(), for a script that arrives scene by scene. produce(on_scene) is awaited and
+        calls on_scene(scene) for each scene as soon as it exists (from any thread), then returns the
+        final script dict. Audio and images for a scene start the moment it arrives; scenes the
+        final script adds later (repairs) start after it returns, and scenes it dropped are cancelled.
+        Returns (script, processed_scenes) in the final script order; (None, []) if produce fails.
+        """
+        tts_limit, image_limit = self._begin()
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        tasks = {}
+
+        def start(scene):
+            if id(scene) not in tasks:
+                # Arrival order names the files; the final order may differ after repairs
+                task = asyncio.ensure_future(self._process_scene(len(tasks), scene, orientation, tts_limit, image_limit, {}))
+                tasks[id(scene)] = (scene, task)
+
+        def on_scene(scene):
+            loop.call_soon_threadsafe(start, scene)
+
+        try:
+            script = await produce(on_scene)
+        except Exception:
+            await asyncio.sleep(0)
+            for _, task in tasks.values():
+                task.cancel()
+            raise
+        # Let any on_scene calls still queued from the producer thread run first
+        await asyncio.sleep(0)
+        final = script['scenes'] if script else []
+        for scene in final:
+            start(scene)
+        kept = {id(scene) for scene in final}
+        for key, (_, task) in tasks.items():
+            if key not in kept:
+                task.cancel()
+        if not script:
+            return None, []
+
+        processed_scenes = await asyncio.gather(*(tasks[id(scene)][1] for scene in final))
+        self._log_summary(started)
+        return script, list(processed_scenes)
+
+    def _begin(self):
+        ensure_dir_exists(self.audio_dir)
+        ensure_dir_exists(self.visual_dir)
+        self.timers = {name: StageTimer(name) for name in ("tts", "image", "normalize", "stock", "transcode")}
+        tts_limit = self.tts_limit or asyncio.Semaphore(self.tts_concurrency)
+        image_limit = self.image_limit or asyncio.Semaphore(self.image_concurrency)
+        self._transcode_limit = self.transcode_limit or asyncio.Semaphore(Config.TRANSCODE_CONCURRENCY)
+        return tts_limit, image_limit
+
+    def _log_summary(self, started):
+        logger.info(f"Scene assets ready in {time.perf_counter() - started:.1f}s "
+                    f"(tts limit {self.tts_concurrency}, image limit {self.image_concurrency})")
+        for timer in self.timers.values():
+            logger.info(f"  {timer.summary()}")
+        if hasattr(self.voice, 'audio_cache'):
+            logger.info(f"  audio cache: {self.voice.audio_cache.stats()}")
+        if hasattr(self.asset_mgr, 'image_cache'):
+            logger.info(f"  image cache: {self.asset_mgr.image_cache.stats()}")
+        if hasattr(self.asset_mgr, 'http'):
+            logger.info(f"  downloads: {self.asset_mgr.http.stats()}")
+        if getattr(self.asset_mgr, 'image_http', None) not in (None, getattr(self.asset_mgr, 'http', None)):
+            logger.info(f"  image downloads: {self.asset_mgr.image_http.stats()}")
+        if hasattr(self.asset_mgr, 'image_fetcher'):
+            logger.info(f"  image providers: {self.asset_mgr.image_fetcher.stats()}")
+
+    async def _process_scene(self, i, scene, orientation, tts_limit, image_limit, previous):
+        audio_path = f"{self.audio_dir}/audio_{i}.wav"
+        video_path = previous.get('video_path') or f"{self.visual_dir}/visual_{i}{NORMALIZED_EXT}"
+        stock_path = f"{self.visual_dir}/stock_{i}.mp4"
+
+        jobs = []
+        if previous.get('audio_path'):
+            audio_path = previous['audio_path']
+            audio = {'duration': previous.get('duration'), 'words': previous.get('words', [])}
+        else:
+            jobs.append(self._generate_audio(i, scene, audio_path, tts_limit))
+        if not previous.get('video_path'):
+            if self.use_stock:
+                # The clip downloads alongside TTS; it is cut to length once the narration's duration is known
+                jobs.append(self._fetch_stock(i, scene, stock_path, orientation, image_limit))
+            else:
+                jobs.append(self._generate_image(i, scene, video_path, orientation, image_limit))
+        if not jobs:
+            logger.info(f"Scene {i+1}: reusing audio and image")
+
+        results = await asyncio.gather(*jobs)
+        if not previous.get('audio_path'):
+            audio = results[0]
+
+        if self.use_stock and not previous.get('video_path'):
+            clip_path = f"{self.visual_dir}/visual_{i}.mp4"
+            if results[-1] and audio and await self._prepare_stock(i, stock_path, clip_path, orientation, audio, audio_path):
+                video_path = clip_path
+            else:
+                logger.info(f"Scene {i+1}: no usable stock footage, generating an image instead")
+                await self._generate_image(i, scene, video_path, orientation, image_limit)
+
+        return {
+            'audio_path': audio_path,
+            'video_path': video_path,
+            'text': scene['text'],
+            'vocal_action': scene.get('vocal_action', 'talking'),
+            'duration': audio.get('duration') if audio else None,
+            'words': audio.get('words', []) if audio else []
+        }
+
+    async def _fetch_stock(self, i, scene, stock_path, orientation, limit):
+        query = stock_query(scene.get('visual_prompt', scene.get('text')))
+        async with limit:
+            logger.info(f"Scene {i+1}: searching stock footage for: {query}")
+            timer = self.timers["stock"]
+            started = timer.start()
+            try:
+                return await asyncio.to_thread(self.asset_mgr.fetch_stock_video, query, stock_path, orientation)
+            finally:
+                timer.stop(started)
+
+    async def _prepare_stock(self, i, stock_path, clip_path, orientation, audio, audio_path):
+        """Pre-transcodes the downloaded footage to the render size, fps and scene length."""
+        duration = audio.get('duration') or await asyncio.to_thread(audio_duration, audio_path)
+        try:
+            # Each transcode is a full encode: a few at a time, not one per scene at once
+            async with self._transcode_limit:
+                timer = self.timers["transcode"]
+                started = timer.start()
+                try:
+                    await asyncio.to_thread(prepare_clip, stock_path, clip_path, orientation_size(orientation), duration)
+                finally:
+                    timer.stop(started)
+            return True
+        except Exception as e:
+            logger.warning(f"Scene {i+1}: stock footage transcode failed: {e}")
+            return False
+        finally:
+            if os.path.exists(stock_path):
+                os.remove(stock_path)
+
+    async def _generate_audio(self, i, scene, audio_path, limit):
+        mood = scene.get('audio_mood', 'neutral')
+        async with limit:
+            timer = self.timers["tts"]
+            started = timer.start()
+            try:
+                result = await self.voice.synthesize(scene['text'], audio_path, mood=mood, voice=self.voice_name)
+            finally:
+                timer.stop(started)
+        if not result:
+            logger.warning(f"Scene {i+1}: audio generation failed")
+        return result
+
+    async def _generate_image(self, i, scene, video_path, orientation, limit):
+        """
+        Downloads the scene image and normalizes it into video_path. An image that doesn't decode
+        is fetched again (bypassing the cache) instead of failing later inside the renderer.
+        """
+        prompt = scene.get('visual_prompt', scene.get('text'))
+        raw_path = f"{os.path.splitext(video_path)[0]}.jpg"
+        ok = False
+        for attempt in range(Config.IMAGE_ATTEMPTS):
+            async with limit:
+                logger.info(f"Scene {i+1}: generating image with prompt: {prompt}")
+                timer = self.timers["image"]
+                started = timer.start()
+                try:
+                    # Providers run their blocking downloads in threads; hedging needs the event loop
+                    ok = await self.asset_mgr.generate_image_async(
+                        prompt, raw_path, orientation, refresh=attempt > 0, style=self.style
+                    )
+                finally:
+                    timer.stop(started)
+            if not ok:
+                break
+
+            timer = self.timers["normalize"]
+            started = timer.start()
+            try:
+                await asyncio.to_thread(normalize_image, raw_path, video_path, orientation_size(orientation), self.style)
+                break
+            except InvalidImageError as e:
+                ok = False
+                logger.warning(f"Scene {i+1}: {e} (attempt {attempt + 1}/{Config.IMAGE_ATTEMPTS})")
+            finally:
+                timer.stop(started)
+                if os.path.exists(raw_path):
+                    os.remove(raw_path)
+        if not ok:
+            logger.warning(f"Scene {i+1}: image generation failed")
@@ -0,0 +1,215 @@
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Values the rest of the pipeline understands (VoiceEngine.MOOD_PARAMS, StickmanAnimator.ACTIONS)
+AUDIO_MOODS = ["excited", "serious", "whispering", "curious", "neutral"]
+VOCAL_ACTIONS = ["jumping", "waving", "bouncing", "shaking", "talking", "thinking", "walking"]
+
+SCENE_FIELDS = {
+    'text': {"type": "STRING"},
+    'visual_prompt': {"type": "STRING"},
+    'audio_mood': {"type": "STRING", "enum": AUDIO_MOODS},
+    'vocal_action': {"type": "STRING", "enum": VOCAL_ACTIONS},
+}
+# Enum fields get a safe default instead of failing the scene
+SCENE_DEFAULTS = {'audio_mood': "neutral", 'vocal_action': "talking"}
+
+def scene_schema(fields):
+    return {
+        "type": "OBJECT",
+        "properties": {name: SCENE_FIELDS[name] for name in fields},
+        "required": list(fields),
+    }
+
+def scenes_schema(fields):
+    return {"type": "ARRAY", "items": scene_schema(fields)}
+
+def script_schema(fields, extras=()):
+    """Response schema for a whole script: title, description, optional tags/chapters, scenes."""
+    properties = {
+        "title": {"type": "STRING"},
+        "description": {"type": "STRING"},
+        "scenes": scenes_schema(fields),
+    }
+    for name in extras:
+        properties[name] = {"type": "ARRAY", "items": {"type": "STRING"}}
+    return {
+        "type": "OBJECT",
+        "properties": properties,
+        "required": ["title", "scenes", *extras],
+        "propertyOrdering": ["title", "description", *extras, "scenes"],
+    }
+
+
+def _strip_fences(text):
+    return text.replace("```json", "").replace("```", "").strip()
+
+def salvage_objects(text, start):
+    """
+    Decodes consecutive JSON objects from an array starting at index start, stopping at the
+    first one that doesn't parse (e.g. a response cut off mid-scene). Returns (objects, complete).
+    """
+    decoder = json.JSONDecoder()
+    objects = []
+    pos = start
+    while True:
+        while pos < len(text) and text[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(text):
+            return objects, False
+        if text[pos] == "]":
+            return objects, True
+        try:
+            obj, pos = decoder.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            return objects, False
+        objects.append(obj)
+
+def parse_script(text):
+    """
+    Parses a script response. Structured output is plain JSON; older fenced/filler output is
+    cleaned up first. If the document is broken, the scenes that precede the damage are kept.
+    Returns (data, complete); raises ValueError if nothing usable is found.
+    """
+    clean_text = _strip_fences(text)
+    try:
+        data = json.loads(clean_text)
+    except json.JSONDecodeError:
+        if "{" in clean_text:
+            try:
+                return json.loads(clean_text[clean_text.find("{"):clean_text.rfind("}")+1]), True
+            except json.JSONDecodeError:
+                pass
+        # Keep what came before the damage: the top-level fields and every whole scene
+        marker = clean_text.find('"scenes"')
+        bracket = clean_text.find("[", marker) if marker >= 0 else -1
+        if bracket < 0:
+            raise ValueError("Response contains no scenes")
+        scenes, _ = salvage_objects(clean_text, bracket + 1)
+        data = {'scenes': scenes}
+        head = clean_text[:marker]
+        for name in ("title", "description", "tags", "chapters"):
+            key = head.find(f'"{name}"')
+            if key >= 0:
+                try:
+                    value_start = head.index(":", key) + 1
+                    while head[value_start] in " \t\r\n":
+                        value_start += 1
+                    data[name], _ = json.JSONDecoder().raw_decode(head, value_start)
+                except (ValueError, IndexError):
+                    pass
+        return data, False
+
+    if isinstance(data, list):
+        # The model skipped the wrapper object and returned the scenes alone
+        data = {'scenes': data}
+    if not isinstance(data, dict) or not isinstance(data.get('scenes'), list):
+        raise ValueError("Response has no scenes list")
+    return data, True
+
+
+class SceneStreamParser:
+    """
+    Incremental parser for a streamed script: feed() it text chunks and it returns every scene
+    object of the "scenes" array whose closing brace has arrived (None for one that doesn't parse,
+    so scene positions stay intact). Tracks strings and escapes, so braces in narration are safe.
+    """
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.in_array = False
+        self.done = False
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.start = None
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        scenes = []
+        if not self.in_array and not self.done:
+            marker = self.buffer.find('"scenes"')
+            bracket = self.buffer.find("[", marker) if marker >= 0 else -1
+            if bracket < 0:
+                return scenes
+            self.pos = bracket + 1
+            self.in_array = True
+
+        while self.in_array and self.pos < len(self.buffer):
+            ch = self.buffer[self.pos]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch == "{":
+                if self.depth == 0:
+                    self.start = self.pos
+                self.depth += 1
+            elif ch == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    try:
+                        scenes.append(json.loads(self.buffer[self.start:self.pos + 1]))
+                    except json.JSONDecodeError:
+                        scenes.append(None)
+            elif ch == "]" and self.depth == 0:
+                self.in_array = False
+                self.done = True
+            self.pos += 1
+        return scenes
+
+
+def validate_scene(scene, fields):
+    """
+    Normalises the scene in place and returns (scene, problems). Strings are trimmed and unknown
+    enum values fall back to their default; a scene missing its narration or visual prompt comes
+    back as None. In place, so a scene already handed to the asset pipeline keeps its identity.
+    """
+    if not isinstance(scene, dict):
+        return None, ["not an object"]
+    clean = scene
+    problems = []
+    for name in fields:
+        value = scene.get(name)
+        if isinstance(value, str):
+            value = value.strip()
+        if name in SCENE_DEFAULTS:
+            if not isinstance(value, str) or value.lower() not in SCENE_FIELDS[name]['enum']:
+                value = SCENE_DEFAULTS[name]
+            clean[name] = value.lower()
+        elif not isinstance(value, str) or not value:
+            problems.append(f"missing {name}")
+        else:
+            clean[name] = value
+    return (None if problems else clean), problems
+
+def validate_script(data, fields, title, extras=()):
+    """
+    Normalises the script in place and returns the indices of scenes that need re-generating.
+    Broken scenes are left as None placeholders so the repaired ones can be put back in order.
+    """
+    if not isinstance(data.get('title'), str) or not data['title'].strip():
+        data['title'] = title
+    if not isinstance(data.get('description'), str):
+        data.pop('description', None)
+    for name in extras:
+        values = data.get(name)
+        data[name] = [str(v).strip() for v in values if str(v).strip()] if isinstance(values, list) else []
+
+    broken = []
+    scenes = []
+    for i, scene in enumerate(data.get('scenes') or []):
+        clean, problems = validate_scene(scene, fields)
+        if clean is None:
+            logger.info(f"Scene {i + 1} is invalid ({', '.join(problems)})")
+            broken.append(i)
+        scenes.append(clean)
+    data['scenes'] = scenes
+    return broken
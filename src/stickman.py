@@ -0,0 +1,141 @@
+import math
+from collections import OrderedDict
+import numpy as np
+from PIL import Image
+
+class StickmanAnimator:
+    """
+    Stickman 'liveness' animation on a white background.
+    All periodic transforms (floating, breathing, jumping, waving, bouncing, shaking) are turned
+    into a per-frame schedule up front; transformed sprites are cached by their quantized
+    (scale, angle), and each frame only repaints the sprite's bounding box on a reused white canvas.
+    Shaking uses a seeded jitter loop, so renders are deterministic.
+    """
+    ACTIONS = ('jumping', 'waving', 'shaking', 'bouncing', 'talking', 'thinking', 'walking')
+
+    # Quantization of the resampled transforms; finer steps are invisible at 24fps
+    SCALE_STEP = 0.0025
+    ANGLE_STEP = 1.0
+    MAX_SPRITES = 64 # one waving+breathing period (4s) needs ~60
+
+    def __init__(self, image_path, target_size, action, duration, fps=24, seed=0,
+                 width_ratio=0.7, fade=0.5):
+        self.target_w, self.target_h = target_size
+        self.action = action
+        self.duration = duration
+        self.fps = fps
+        self.fade = fade
+
+        with Image.open(image_path) as img:
+            img = img.convert('RGB')
+            sprite_w = int(self.target_w * width_ratio)
+            if img.width != sprite_w:
+                sprite_h = max(1, round(img.height * sprite_w / img.width))
+                img = img.resize((sprite_w, sprite_h), Image.LANCZOS)
+            self.sprite = img
+
+        self._sprites = OrderedDict()
+        self.schedule = self._build_schedule(seed)
+        self.canvas = np.full((self.target_h, self.target_w, 3), 255, dtype=np.uint8)
+        self._dirty = None
+        self._last = (None, None)
+
+    def _build_schedule(self, seed):
+        """Returns per-frame arrays: vertical offset, scale key, angle key and fade alpha."""
+        n_frames = max(1, int(math.ceil(self.duration * self.fps)))
+        t = np.arange(n_frames) / self.fps
+
+        # 1. Floating: vertical sway ±15px at 0.33Hz
+        dy = 15 * np.sin(2 * np.pi * 0.33 * t)
+        scale = np.ones(n_frames)
+        angle = np.zeros(n_frames)
+
+        # ACTION-AWARE OVERRIDES:
+        if self.action == 'jumping':
+            # Intense vertical bounce
+            dy = -np.abs(100 * np.sin(2 * np.pi * 0.8 * t))
+        elif self.action == 'waving':
+            # Smooth rotation sway
+            angle = 5 * np.sin(2 * np.pi * 0.5 * t)
+        elif self.action == 'shaking':
+            # High frequency jitter, from a seeded one-second loop
+            jitter = np.random.RandomState(seed).uniform(-10, 10, self.fps)
+            dy = jitter[np.arange(n_frames) % self.fps]
+        elif self.action == 'bouncing':
+            # Scale-based bounce
+            scale = 1.0 + 0.1 * np.abs(np.sin(2 * np.pi * 0.7 * t))
+
+        # 2. Breathing: subtle scaling ±1.5% at 0.25Hz
+        if self.action != 'bouncing':
+            scale = scale * (1.0 + 0.015 * np.sin(2 * np.pi * 0.25 * t))
+
+        # Fade in from / out to the white background
+        alpha = np.ones(n_frames)
+        if self.fade > 0:
+            alpha = np.minimum(alpha, t / self.fade)
+            alpha = np.minimum(alpha, (self.duration - t) / self.fade)
+            alpha = np.clip(alpha, 0.0, 1.0)
+
+        scale_key = np.round(scale / self.SCALE_STEP).astype(int)
+        angle_key = np.round(angle / self.ANGLE_STEP).astype(int)
+        return {'dy': np.round(dy).astype(int), 'scale': scale_key, 'angle': angle_key, 'alpha': alpha}
+
+    def _get_sprite(self, scale_key, angle_key):
+        key = (scale_key, angle_key)
+        sprite = self._sprites.get(key)
+        if sprite is not None:
+            self._sprites.move_to_end(key)
+            return sprite
+
+        img = self.sprite
+        scale = scale_key * self.SCALE_STEP
+        if scale_key != round(1 / self.SCALE_STEP):
+            img = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), Image.BILINEAR)
+        if angle_key:
+            img = img.rotate(angle_key * self.ANGLE_STEP, resample=Image.BICUBIC, expand=True, fillcolor=(255, 255, 255))
+        sprite = np.asarray(img)
+
+        self._sprites[key] = sprite
+        if len(self._sprites) > self.MAX_SPRITES:
+            self._sprites.popitem(last=False)
+        return sprite
+
+    def get_frame(self, t):
+        n = min(int(t * self.fps + 1e-6), len(self.schedule['dy']) - 1)
+        if self._last[0] == n:
+            return self._last[1]
+
+        sprite = self._get_sprite(self.schedule['scale'][n], self.schedule['angle'][n])
+        alpha = self.schedule['alpha'][n]
+
+        # Restore only the area the previous frame painted
+        if self._dirty is not None:
+            y0, y1, x0, x1 = self._dirty
+            self.canvas[y0:y1, x0:x1] = 255
+
+        # Keep the (possibly scaled) sprite centred, plus this frame's vertical offset
+        sh, sw = sprite.shape[:2]
+        cx = self.target_w / 2
+        cy = self.target_h / 2 + self.schedule['dy'][n]
+        x0, y0 = int(round(cx - sw / 2)), int(round(cy - sh / 2))
+        x1, y1 = x0 + sw, y0 + sh
+
+        # Clip to the canvas
+        cx0, cy0 = max(x0, 0), max(y0, 0)
+        cx1, cy1 = min(x1, self.target_w), min(y1, self.target_h)
+        if cx1 > cx0 and cy1 > cy0 and alpha > 0:
+            patch = sprite[cy0 - y0:cy1 - y0, cx0 - x0:cx1 - x0]
+            if alpha < 1:
+                patch = (255 - (255 - patch.astype(np.float32)) * alpha).astype(np.uint8)
+            self.canvas[cy0:cy1, cx0:cx1] = patch
+            self._dirty = (cy0, cy1, cx0, cx1)
+        else:
+            self._dirty = None
+
+        frame = self.canvas.copy()
+        self._last = (n, frame)
+        return frame
+
+    def make_clip(self):
+        from moviepy.editor import VideoClip
+        return VideoClip(self.get_frame, duration=self.duration)
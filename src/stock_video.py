@@ -0,0 +1,71 @@
+import os
+import subprocess
+import threading
+
+FPS = 24
+
+def _ffmpeg_exe():
+    from imageio_ffmpeg import get_ffmpeg_exe
+    return get_ffmpeg_exe()
+
+def pick_rendition(video_files, target_size):
+    """
+    Smallest rendition that covers target_size without upscaling (the crop then only ever scales
+    down), or the largest one available if none is big enough.
+    """
+    target_w, target_h = target_size
+    files = [f for f in video_files if f.get('width') and f.get('height') and f.get('link')]
+    mp4 = [f for f in files if f.get('file_type', "video/mp4") == "video/mp4"]
+    files = mp4 or files
+    if not files:
+        return None
+    area = lambda f: f['width'] * f['height']
+    covering = [f for f in files if f['width'] >= target_w and f['height'] >= target_h]
+    return min(covering, key=area) if covering else max(files, key=area)
+
+def video_info(path):
+    """Returns (width, height, fps, duration) from the container header, without decoding frames."""
+    import imageio_ffmpeg
+    reader = imageio_ffmpeg.read_frames(path)
+    try:
+        meta = next(reader)
+    finally:
+        reader.close()
+    width, height = meta['size']
+    return width, height, meta.get('fps'), meta.get('duration')
+
+def is_prepared(path, target_size, duration, fps=FPS):
+    """True if path is already a clip at the target size and fps that lasts at least duration."""
+    try:
+        width, height, clip_fps, clip_duration = video_info(path)
+    except Exception:
+        return False
+    return ((width, height) == tuple(target_size) and clip_fps and abs(clip_fps - fps) < 0.01
+            and clip_duration is not None and clip_duration + 0.5 / fps >= duration)
+
+def prepare_clip(src_path, output_path, target_size, duration, fps=FPS):
+    """
+    Transcodes stock footage into exactly what the renderer consumes: cover-scaled and centre-cropped
+    to target_size, at fps, looped if needed and cut to duration, without audio. Both editor
+    backends then use the clip as-is instead of looping/scaling/cropping it frame by frame.
+    Raises subprocess.CalledProcessError if ffmpeg fails.
+    """
+    tw, th = target_size
+    # One extra frame so rounding never leaves the last frame of the scene without a picture
+    length = duration + 1.0 / fps
+    tmp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp.mp4"
+    command = [
+        _ffmpeg_exe(), "-y", "-v", "error",
+        "-stream_loop", "-1", "-i", src_path, "-t", f"{length:.6f}",
+        "-vf", (f"scale=w='if(gt(a,{tw}/{th}),-2,{tw})':h='if(gt(a,{tw}/{th}),{th},-2)':flags=lanczos,"
+                f"crop={tw}:{th},fps={fps},setsar=1"),
+        "-an", "-c:v", "libx264", "-preset", "veryfast", "-crf", "18", "-pix_fmt", "yuv420p",
+        "-movflags", "+faststart", tmp_path
+    ]
+    try:
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return output_path
@@ -0,0 +1,70 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.http_client import HttpClient
+
+BODY = b"\xff\xd8" + b"image" * 100
+
+class FlakyStub(BaseHTTPRequestHandler):
+    """Answers each GET with the next status from `script` (then 200s), counting requests."""
+    protocol_version = "HTTP/1.1"
+    script = []
+    requests = 0
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        cls = type(self)
+        step = cls.script[cls.requests] if cls.requests < len(cls.script) else 200
+        cls.requests += 1
+        if step == "short":
+            # Promises the full body, sends half and hangs up
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(BODY)))
+            self.end_headers()
+            self.wfile.write(BODY[:len(BODY) // 2])
+            self.close_connection = True
+            return
+        body = BODY if step == 200 else b""
+        self.send_response(step)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def stub():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FlakyStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    FlakyStub.requests = 0
+    try:
+        yield f"http://127.0.0.1:{server.server_port}/image.jpg"
+    finally:
+        server.shutdown()
+
+
+@pytest.mark.parametrize("script, attempts", [
+    ([503], 2),
+    ([503, 502, 429], 4),
+    (["short"], 2),
+    ([503, "short"], 3),
+])
+def test_download_retries_until_success(stub, tmp_path, script, attempts):
+    FlakyStub.script = script
+    output = tmp_path / "image.jpg"
+    assert HttpClient(retries=3, backoff=0.01).download(stub, str(output))
+    assert output.read_bytes() == BODY
+    assert FlakyStub.requests == attempts
+    assert [p.name for p in tmp_path.iterdir()] == ["image.jpg"]
+
+
+def test_download_gives_up_after_one_retry_budget(stub, tmp_path):
+    # The adapter retries statuses; download() must not multiply that by its own attempts
+    FlakyStub.script = [503] * 20
+    output = tmp_path / "image.jpg"
+    assert not HttpClient(retries=2, backoff=0.01).download(stub, str(output))
+    assert FlakyStub.requests == 3
+    assert list(tmp_path.iterdir()) == []
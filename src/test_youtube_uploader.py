@@ -0,0 +1,79 @@
+import asyncio
+import json
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import google.oauth2.credentials
+from googleapiclient.discovery import build
+
+import src.youtube_uploader as youtube_uploader
+from src.youtube_uploader import AsyncYouTubeUploader, YouTubeUploader
+
+class ResumableUploadStub(BaseHTTPRequestHandler):
+    """Minimal resumable-upload endpoint: 308 with a Range header per chunk, the video resource at the end."""
+    received = bytearray()
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, headers=None, body=b""):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        type(self).received = bytearray()
+        self._reply(200, {'Location': f"http://127.0.0.1:{self.server.server_port}/upload/session"})
+
+    def do_PUT(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        match = re.match(r"bytes (\d+)-(\d+)/(\d+)", self.headers.get('Content-Range', ""))
+        if match:
+            assert int(match.group(1)) == len(self.received)
+            self.received.extend(body)
+        if match and len(self.received) == int(match.group(3)):
+            self._reply(200, {'Content-Type': "application/json"}, json.dumps({'id': "VIDEO_ID"}).encode())
+        else:
+            self._reply(308, {'Range': f"bytes=0-{len(self.received) - 1}"} if self.received else {})
+
+
+def test_multi_chunk_upload_through_default_transport(tmp_path, monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ResumableUploadStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    real_transport = youtube_uploader.build_transport
+
+    def local_transport(timeout=None):
+        # The client always sends uploads over https; the stub only speaks http
+        http = real_transport(timeout)
+        request = http.request
+        http.request = lambda uri, *args, **kwargs: request(uri.replace("https://", "http://"), *args, **kwargs)
+        return http
+
+    monkeypatch.setattr(youtube_uploader, 'build_transport', local_transport)
+    try:
+        youtube = build(
+            'youtube', 'v3', http=local_transport(), static_discovery=True,
+            client_options={'api_endpoint': f"http://127.0.0.1:{server.server_port}/"}
+        )
+        uploader = YouTubeUploader(youtube=youtube, chunk_mb=0.25, max_retries=0)
+        # Exercise the production path: an AuthorizedHttp per worker thread around build_transport()
+        uploader.credentials = google.oauth2.credentials.Credentials(token="test-token")
+
+        video_path = tmp_path / "video.mp4"
+        payload = os.urandom(3 * 256 * 1024 + 1000) # four chunks
+        video_path.write_bytes(payload)
+
+        async def upload():
+            return await AsyncYouTubeUploader(uploader, max_workers=1).upload_video(str(video_path), "title", "description")
+
+        assert asyncio.run(upload()) == "VIDEO_ID"
+        assert bytes(ResumableUploadStub.received) == payload
+        assert not os.path.exists(f"{video_path}.upload.json")
+    finally:
+        server.shutdown()
@@ -0,0 +1,303 @@
+import json
+import hashlib
+import logging
+import os
+import re
+import threading
+import unicodedata
+from datetime import datetime
+import numpy as np
+from .config import Config
+
+try:
+    import fcntl
+except ImportError: # Windows: no cross-process lock, in-process lock only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+def normalize_title(title):
+    """Case, accents, punctuation and spacing removed: 'Why You Overthink!' == 'why you overthink'."""
+    text = unicodedata.normalize('NFKD', str(title)).encode('ascii', 'ignore').decode('ascii')
+    return " ".join(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+# Function words, clickbait filler and the channel's niche itself: none of them say what a topic is about
+STOPWORDS = frozenset("""
+a about after all always an and are as at be because before behavior being but by can do does don
+even every everyone everything explained finally for from get hidden how human i if in into is it
+its just me more most my need no not of on one or our psychological psychology real reason s science
+secret secretly signs so stop than that the their them they this to truth up us we what when where
+which who why will with you your youre
+""".split())
+
+def _stem(word):
+    # Crude suffix stripping, enough to make "overthinking" meet "overthink"
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    for suffix in ("ing", "ed", "s"):
+        if len(word) > len(suffix) + 3 and word.endswith(suffix):
+            return word[:-len(suffix)]
+    return word
+
+
+class SemanticIndex:
+    """
+    Local, CPU-only topic similarity: hashed TF-IDF vectors over stemmed content words.
+    Rephrasings that share their content words ("Why You Overthink" / "The Psychology of
+    Overthinking") score high even when the character shingles of the MinHash check differ.
+    All candidates are scored against the whole history in one matrix product.
+    """
+    DIM = 1 << 12
+
+    def __init__(self):
+        self.rows = np.zeros((0, self.DIM), dtype=np.float32)
+        self.doc_freq = np.zeros(self.DIM, dtype=np.float32)
+        self._pending = []
+
+    def _terms(self, title):
+        return {_stem(w) for w in normalize_title(title).split() if w not in STOPWORDS}
+
+    def _vector(self, title):
+        vector = np.zeros(self.DIM, dtype=np.float32)
+        for term in self._terms(title):
+            bucket = int.from_bytes(hashlib.blake2b(term.encode('utf-8'), digest_size=4).digest(), 'little')
+            vector[bucket % self.DIM] = 1.0
+        return vector
+
+    def add(self, title):
+        # Rows are batched into the matrix on the next query, so loading a long history stays linear
+        vector = self._vector(title)
+        self._pending.append(vector)
+        self.doc_freq += vector
+
+    def _matrix(self):
+        if self._pending:
+            self.rows = np.vstack([self.rows, np.stack(self._pending)])
+            self._pending = []
+        return self.rows
+
+    @staticmethod
+    def _normalize(matrix):
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-9)
+
+    def similarities(self, titles):
+        """Returns (max cosine similarity, index of the closest used topic) for every title."""
+        rows = self._matrix()
+        if not len(titles) or not len(rows):
+            return np.zeros(len(titles), dtype=np.float32), np.full(len(titles), -1)
+        idf = np.log((1 + len(rows)) / (1 + self.doc_freq)) + 1
+        history = self._normalize(rows * idf)
+        queries = self._normalize(np.stack([self._vector(t) for t in titles]) * idf)
+        scores = queries @ history.T
+        closest = scores.argmax(axis=1)
+        return scores[np.arange(len(titles)), closest], closest
+
+
+class TopicStore:
+    """
+    History of every topic ever used, as an append-only JSON-lines file.
+    Lookups are exact on the normalised title (hash set) and near-duplicate via MinHash over
+    character shingles with LSH banding, across the whole history. add() appends one line under
+    an exclusive file lock after catching up on lines other processes appended, so parallel
+    batch runs can never both claim the same, a near-identical or a rephrased topic.
+    """
+    SHINGLE = 4
+    NUM_PERM = 64
+    BANDS = 16 # 4 rows per band: pairs above ~0.5 Jaccard almost always share a bucket
+    _PRIME = (1 << 31) - 1
+
+    def __init__(self, path=None, legacy_path=None, threshold=None, semantic_threshold=None):
+        self.path = path or Config.TOPICS_PATH
+        self.legacy_path = legacy_path if legacy_path is not None else Config.LEGACY_TOPICS_PATH
+        self.threshold = threshold if threshold is not None else Config.TOPIC_SIMILARITY_THRESHOLD
+        self.semantic_threshold = (semantic_threshold if semantic_threshold is not None
+                                   else Config.TOPIC_SEMANTIC_THRESHOLD)
+        self.semantic = SemanticIndex()
+        self.titles = []
+        self._normalized = {}
+        self._signatures = []
+        self._buckets = {}
+        self._offset = 0
+        self._lock = threading.Lock()
+
+        rng = np.random.default_rng(20240101) # fixed, so signatures are stable across runs
+        self._a = rng.integers(1, self._PRIME, self.NUM_PERM, dtype=np.uint64)
+        self._b = rng.integers(0, self._PRIME, self.NUM_PERM, dtype=np.uint64)
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._locked_file() as f:
+            if f.seek(0, os.SEEK_END) == 0:
+                self._migrate_legacy(f)
+            self._catch_up(f)
+
+    def __len__(self):
+        return len(self.titles)
+
+    def __contains__(self, title):
+        return self.find(title) is not None
+
+    # --- Similarity --------------------------------------------------------------
+
+    def _signature(self, normalized):
+        padded = f" {normalized} "
+        shingles = {padded[i:i + self.SHINGLE] for i in range(max(1, len(padded) - self.SHINGLE + 1))}
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=4).digest(), 'little') for s in shingles),
+            dtype=np.uint64, count=len(shingles)
+        )
+        # (a*x + b) mod p per permutation; 31-bit operands keep the product inside uint64
+        return ((self._a[:, None] * hashes[None, :] + self._b[:, None]) % self._PRIME).min(axis=1)
+
+    def _bands(self, signature):
+        return [(band, rows.tobytes()) for band, rows in enumerate(np.split(signature, self.BANDS))]
+
+    def _index(self, title):
+        normalized = normalize_title(title)
+        if not normalized or normalized in self._normalized:
+            return
+        idx = len(self.titles)
+        signature = self._signature(normalized)
+        self.titles.append(title)
+        self._normalized[normalized] = idx
+        self._signatures.append(signature)
+        for key in self._bands(signature):
+            self._buckets.setdefault(key, []).append(idx)
+        self.semantic.add(title)
+
+    def find(self, title):
+        """
+        Returns ('exact' | 'similar', used_title, similarity) for the closest used topic,
+        or None if the title is new.
+        """
+        with self._lock:
+            return self._match(title)
+
+    def _match(self, title):
+        normalized = normalize_title(title)
+        if not normalized:
+            return None
+        if normalized in self._normalized:
+            return 'exact', self.titles[self._normalized[normalized]], 1.0
+        signature = self._signature(normalized)
+        candidates = {idx for key in self._bands(signature) for idx in self._buckets.get(key, ())}
+        best = None
+        for idx in candidates:
+            # Fraction of agreeing MinHash rows estimates the Jaccard similarity of the shingle sets
+            similarity = float(np.mean(self._signatures[idx] == signature))
+            if similarity >= self.threshold and (best is None or similarity > best[2]):
+                best = ('similar', self.titles[idx], similarity)
+        return best
+
+    def rank(self, candidates):
+        """
+        Orders candidates most novel first, in one vectorized pass over the whole history.
+        Returns [(candidate, similarity, closest_used_title)]; candidates at or above the
+        semantic threshold are rephrasings of something already used and come last.
+        """
+        with self._lock:
+            similarity, closest = self.semantic.similarities(candidates)
+            ranked = [
+                (candidate, float(score), self.titles[idx] if idx >= 0 else None)
+                for candidate, score, idx in zip(candidates, similarity, closest)
+            ]
+        # Stable sort: equally novel candidates keep the LLM's order
+        return sorted(ranked, key=lambda item: item[1])
+
+    def is_rephrasing(self, similarity):
+        return similarity >= self.semantic_threshold
+
+    # --- Persistence -------------------------------------------------------------
+
+    def _locked_file(self):
+        return _LockedFile(self.path, self._lock)
+
+    def _catch_up(self, f):
+        """Indexes lines appended since our last read (by us or by another process)."""
+        f.seek(self._offset)
+        data = f.read()
+        # A writer that crashed mid-line leaves no newline; leave it for the next pass
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            try:
+                self._index(json.loads(line)['topic'])
+            except (ValueError, KeyError, TypeError):
+                logger.warning(f"Skipping unreadable line in {self.path}")
+        self._offset += end
+
+    def _migrate_legacy(self, f):
+        if not self.legacy_path or not os.path.exists(self.legacy_path):
+            return
+        try:
+            with open(self.legacy_path, 'r', encoding='utf-8') as legacy:
+                topics = json.load(legacy)
+        except Exception as e:
+            logger.error(f"Failed to read legacy topics {self.legacy_path}: {e}")
+            return
+        f.seek(0, os.SEEK_END)
+        f.write(b"".join(self._line(topic, None) for topic in topics))
+        f.flush()
+        logger.info(f"Migrated {len(topics)} topics from {self.legacy_path} to {self.path}")
+
+    @staticmethod
+    def _line(topic, used_at):
+        record = {'topic': topic, 'normalized': normalize_title(topic), 'used_at': used_at}
+        return (json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8')
+
+    def add(self, title, allow_rephrasing=False):
+        """
+        Records title as used. Returns False (and writes nothing) if it, a near-duplicate or
+        (unless allow_rephrasing) a rephrasing is already in the history - including entries
+        another process added a moment ago.
+        """
+        with self._locked_file() as f:
+            self._catch_up(f)
+            match = self._match(title)
+            if match is None and not allow_rephrasing:
+                # Under the same lock as the write, so parallel runs can't claim rephrasings of each other
+                similarity, closest = self.semantic.similarities([title])
+                if self.is_rephrasing(float(similarity[0])):
+                    match = ('rephrasing', self.titles[closest[0]], float(similarity[0]))
+            if match:
+                kind, used, similarity = match
+                logger.info(f"Topic '{title}' rejected: {kind} match of '{used}' ({similarity:.2f})")
+                return False
+            line = self._line(title, datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'))
+            if f.seek(0, os.SEEK_END) > self._offset:
+                # Terminate a crashed writer's partial line so ours stays readable
+                line = b"\n" + line
+            f.write(line)
+            f.flush()
+            self._catch_up(f)
+        logger.info(f"Topic '{title}' added to persistence.")
+        return True
+
+
+class _LockedFile:
+    """The store file opened for append+read, held under the thread lock and an exclusive flock."""
+    def __init__(self, path, lock):
+        self.path = path
+        self.lock = lock
+        self.file = None
+
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            self.file = open(self.path, 'a+b')
+            if fcntl:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+        except Exception:
+            if self.file:
+                self.file.close()
+            self.lock.release()
+            raise
+        return self.file
+
+    def __exit__(self, *exc):
+        try:
+            if fcntl:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+            self.file.close()
+        finally:
+            self.lock.release()
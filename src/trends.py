@@ -1,40 +1,39 @@
-import os
 import json
 import logging
 from src.config import Config
+from src.topic_store import TopicStore
 
 logger = logging.getLogger(__name__)
 
 class TrendEngine:
-    def __init__(self, used_topics_path="output/used_topics.json"):
-        self.used_topics_path = used_topics_path
-        self.used_topics = self._load_used_topics()
+    def __init__(self, used_topics_path=None):
+        # Every topic ever used, with exact and near-duplicate lookups (see TopicStore)
+        self.store = TopicStore(used_topics_path)
 
-    def _load_used_topics(self):
-        """Loads the list of already used topics to ensure zero repetition."""
-        if os.path.exists(self.used_topics_path):
-            try:
-                with open(self.used_topics_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception as e:
-                logger.error(f"Failed to load used topics: {e}")
-        return []
+    @property
+    def used_topics(self):
+        return self.store.titles
 
-    def _save_used_topic(self, topic):
-        """Persists a new topic to the used list."""
-        self.used_topics.append(topic)
+    def _claim_topic(self, topic, allow_rephrasing=False):
+        """Records the topic as used; False if it (or a near-duplicate or rephrasing) was used before."""
         try:
-            os.makedirs(os.path.dirname(self.used_topics_path), exist_ok=True)
-            with open(self.used_topics_path, 'w', encoding='utf-8') as f:
-                json.dump(self.used_topics, f, indent=2)
-            logger.info(f"Topic '{topic}' added to persistence.")
+            return self.store.add(topic, allow_rephrasing=allow_rephrasing)
         except Exception as e:
             logger.error(f"Failed to save used topic: {e}")
+            return False
 
     def get_viral_topic(self, llm):
         """
         Interacts with LLM to fetch trending US psychology topics and returns the best unused one.
         """
+        topics = self.get_viral_topics(llm, 1)
+        return topics[0] if topics else None
+
+    def get_viral_topics(self, llm, count):
+        """
+        Returns up to `count` distinct unused topics from a single discovery call, most novel first.
+        Batch runs use this to give every job its own topic without asking the LLM again.
+        """
         logger.info("Discovering viral US psychology trends...")
         
         # We ask the LLM for many titles to increase the chance of finding an unused one
@@ -49,35 +48,48 @@ class TrendEngine:
         ["Viral Title 1", "Viral Title 2", ...]
         """
         
+        # Topics claimed so far are recorded as used: they are returned even if a later step fails
+        selected = []
         try:
-            response = llm._call_gemini(prompt)
-            if not response:
-                return None
-            
-            # Clean and parse JSON
-            clean_text = response.replace("```json", "").replace("```", "").strip()
-            if "[" in clean_text:
-                clean_text = clean_text[clean_text.find("["):clean_text.rfind("]")+1]
-            
-            candidates = json.loads(clean_text)
-            
-            # Filter out used topics (just in case LLM ignored the exclusion list)
-            unused = [c for c in candidates if c not in self.used_topics]
+            # Trends go stale quickly, so this call type is not cached by default
+            candidates = llm._call_gemini(prompt, call_type="topics", parse=llm._parse_json_list)
+            if not candidates:
+                return []
             
-            if not unused:
+            # The prompt only carries the latest topics; the store scores every candidate against the
+            # entire history at once and claims each pick atomically. Most novel first.
+            ranked = self.store.rank([c for c in candidates if isinstance(c, str)])
+            for c, _, _ in ranked:
+                if len(selected) == count:
+                    break
+                if self._claim_topic(c):
+                    selected.append(c)
+
+            # Rather than another LLM call, settle for the least similar rephrasing left
+            for c, similarity, used in ranked:
+                if len(selected) == count:
+                    break
+                if c not in selected and self.store.is_rephrasing(similarity) and self._claim_topic(c, allow_rephrasing=True):
+                    logger.warning(f"No novel topic left, using '{c}' (similar to '{used}', {similarity:.2f})")
+                    selected.append(c)
+
+            while len(selected) < count:
                 logger.warning("All discovered trends were already used. Forcing a new angle...")
                 # Fallback: Ask for a completely unique niche angle
-                return self._get_fallback_topic(llm)
-                
-            selected = unused[0] # Pick the top one
-            self._save_used_topic(selected)
+                fallback = self._get_fallback_topic(llm)
+                if not fallback or not self._claim_topic(fallback):
+                    break
+                selected.append(fallback)
             return selected
             
         except Exception as e:
             logger.error(f"Trend Engine discovery failed: {e}")
-            return None
+            return selected
 
     def _get_fallback_topic(self, llm):
-        """Force a unique topic if everything else is repeated."""
+        """Force a unique topic if everything else is repeated. None if the LLM returned nothing."""
         prompt = "Give me one unique, deeply disturbing or fascinating viral psychology topic that is completely different from common ones. Return only the string."
-        return llm._call_gemini(prompt).strip().replace('"', '')
+        topic = llm._call_gemini(prompt, call_type="topics")
+        if not topic:
+            return None
+        return topic.strip().replace('"', '') or None
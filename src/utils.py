@@ -17,6 +17,12 @@ def ensure_dir_exists(path):
     if not os.path.exists(path):
         os.makedirs(path)
 
+def scratch_name(output_path):
+    """Unique, readable name for an output's scratch files, e.g. final_long_1a2b3c4d."""
+    import hashlib
+    base = os.path.splitext(os.path.basename(output_path))[0]
+    return f"{base}_{hashlib.sha1(os.path.abspath(output_path).encode('utf-8')).hexdigest()[:8]}"
+
 def save_json(data, filepath):
     with open(filepath, 'w', encoding='utf-8') as f:
         json.dump(data, f, indent=4)
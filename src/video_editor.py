@@ -1,217 +1,147 @@
 from moviepy.editor import *
 import moviepy.video.fx.all as vfx
 import os
-from PIL import Image, ImageDraw, ImageFont
-import numpy as np
+from .config import Config
+from .captions import CaptionEngine, rasterize_caption, caption_layout, use_karaoke
+from .ken_burns import KenBurns
+from .stickman import StickmanAnimator
+
+
+def _render_segment_worker(job):
+    """Process-pool entry point: renders one scene segment in a fresh editor."""
+    scene, index, segment_path, is_short, style = job
+    return index, VideoEditor().render_segment(scene, index, segment_path, is_short=is_short, style=style)
+
 
 class VideoEditor:
     def _create_text_clip(self, text, size, fontsize, color, stroke_color, stroke_width, duration):
-        """Creates a TextClip using PIL as a fallback to avoid ImageMagick issues."""
+        """Caption clip from the memoized rasterizer in captions.py: RGB frame with its alpha as the mask."""
         try:
-            # Try to load a font
-            try:
-                # Common Windows font paths
-                font = ImageFont.truetype("arialbd.ttf", fontsize)
-            except:
-                try:
-                    font = ImageFont.truetype("arial.ttf", fontsize)
-                except:
-                    font = ImageFont.load_default()
-
-            # Create an image with transparent background (RGBA)
-            img = Image.new('RGBA', size, (0, 0, 0, 0))
-            draw = ImageDraw.Draw(img)
-            
-            # Wrap text manually
-            import textwrap
-            lines = textwrap.wrap(text, width=30) 
-            
-            current_h = 10 # Some top padding
-            for line in lines:
-                if hasattr(draw, 'textbbox'):
-                    bbox = draw.textbbox((0, 0), line, font=font)
-                    w, h = bbox[2] - bbox[0], bbox[3] - bbox[1]
-                else:
-                    w, h = draw.textsize(line, font=font)
-                
-                # Draw stroke
-                if stroke_width > 0:
-                    for offset_x in range(-stroke_width, stroke_width + 1):
-                        for offset_y in range(-stroke_width, stroke_width + 1):
-                            draw.text(((size[0]-w)/2 + offset_x, current_h + offset_y), line, font=font, fill=stroke_color)
-
-                draw.text(((size[0]-w)/2, current_h), line, font=font, fill=color)
-                current_h += h + 15
-            
-            # Convert to RGB array for MoviePy and also get alpha channel
-            rgb_img = img.convert('RGB')
-            alpha_img = img.convert('L') # Luminance as alpha
-            
+            rgb, alpha = rasterize_caption(text, tuple(size), fontsize, color, stroke_color, stroke_width)
+
             # Create clip with mask for transparency
-            clip = ImageClip(np.array(rgb_img)).set_duration(duration)
-            mask = ImageClip(np.array(alpha_img), ismask=True).set_duration(duration)
+            clip = ImageClip(rgb).set_duration(duration)
+            mask = ImageClip(alpha, ismask=True).set_duration(duration)
             
             return clip.set_mask(mask)
             
         except Exception as e:
             print(f"PIL Text Render failed: {e}")
             return ColorClip(size=size, color=(0,0,0,0), duration=duration)
-    def create_video(self, scenes, output_path, is_short=True, bg_music_path=None, style="noir"):
+
+    def _target_size(self, is_short):
+        # Target Dimensions
+        if is_short:
+            return 1080, 1920
+        return 1920, 1080
+
+    def _build_scene_clip(self, i, scene, target_w, target_h, is_short, style):
+        """Builds the composited clip (visual, audio, caption, transition) for a single scene."""
+        import random
+
+        # Load Audio
+        audio_clip = AudioFileClip(scene['audio_path'])
+        duration = audio_clip.duration
+
+        # Load Visual (Video OR Image)
+        v_path = scene['video_path']
+        if os.path.exists(v_path):
+            if v_path.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp')):
+                # Process Image
+                if style == "stickman":
+                    # STICKMAN STYLE: Pure White BG, Centered, Fade In/Out, Pleasant Liveness
+                    # Floating/breathing plus the action-aware motion, precomputed and painted onto a reused white canvas
+                    v_action = scene.get('vocal_action', 'talking')
+                    video_clip = StickmanAnimator(v_path, (target_w, target_h), v_action, duration, fps=24, seed=i).make_clip()
+
+                    # NO FILTERS for stickman to keep background pure white
+                else:
+                    # NOIR STYLE: Standard animated visuals
+                    # Source is decoded and scaled once; each frame is a slice or one resample
+                    anim_type = scene.get('animation') or random.choice(KenBurns.ANIMATIONS)
+                    video_clip = KenBurns(v_path, (target_w, target_h), anim_type, duration, fps=24).make_clip()
+
+            else:
+                # Video Handling
+                video_clip = VideoFileClip(v_path, audio=False)
+                if tuple(video_clip.size) == (target_w, target_h) and video_clip.duration + 0.5 / 24 >= duration:
+                    # Pre-transcoded by the scene pipeline: already the right size and length
+                    video_clip = video_clip.subclip(0, min(duration, video_clip.duration))
+                else:
+                    if video_clip.duration < duration:
+                        video_clip = video_clip.loop(duration=duration)
+                    else:
+                        video_clip = video_clip.subclip(0, duration)
+
+                    if video_clip.w / video_clip.h > target_w / target_h:
+                        video_clip = video_clip.resize(height=target_h)
+                    else:
+                        video_clip = video_clip.resize(width=target_w)
+                    video_clip = video_clip.crop(x_center=video_clip.w/2, y_center=video_clip.h/2, width=target_w, height=target_h)
+        else:
+            video_clip = ColorClip(size=(target_w, target_h), color=(0,0,0), duration=duration)
+
+        video_clip = video_clip.set_audio(audio_clip)
+
+        if i > 0:
+            # Apply professional transitions
+            # Crossfade works well for both Noir (dark) and Stickman (white)
+            video_clip = video_clip.crossfadein(0.6)
+
+        # Subtitles / Captions
+        karaoke = use_karaoke(scene, is_short)
+        layout = caption_layout((target_w, target_h), is_short, style, karaoke)
+        if karaoke:
+            # Word-timed captions: short phrases with the spoken word highlighted
+            captions = CaptionEngine(
+                layout['size'],
+                fontsize=layout['fontsize'],
+                color=layout['color'],
+                stroke_color=layout['stroke_color'],
+                stroke_width=layout['stroke_width'],
+                highlight_color=layout['highlight_color']
+            )
+            txt_clip = captions.make_clip(scene['words'], duration)
+        else:
+            txt_clip = self._create_text_clip(
+                scene['text'], 
+                size=layout['size'],
+                fontsize=layout['fontsize'], 
+                color=layout['color'], 
+                stroke_color=layout['stroke_color'], 
+                stroke_width=layout['stroke_width'],
+                duration=duration
+            )
+        txt_clip = txt_clip.set_pos(('center', layout['y'])).set_duration(duration)
+        final_scene = CompositeVideoClip([video_clip, txt_clip])
+        return final_scene
+
+    def create_video(self, scenes, output_path, is_short=True, bg_music_path=None, style="noir", render_mode=None, backend=None):
         """
         Stitches visualization, audio and subtitles with dynamic animations and transitions.
         style: "noir" (Standard dark surreal) or "stickman" (Minimalist stick figures on white)
+        render_mode: "single" (one MoviePy graph) or "segmented" (parallel per-scene renders joined by ffmpeg)
+        backend: "moviepy" (frames composed in Python) or "ffmpeg" (one native filter_complex; ignores render_mode)
         """
-        import random
-        import math
-        
-        # Target Dimensions
-        if is_short:
-            target_w, target_h = 1080, 1920
-        else:
-            target_w, target_h = 1920, 1080
+        backend = backend or Config.RENDER_BACKEND
+        if backend == "ffmpeg":
+            from .ffmpeg_backend import FFmpegRenderer
+            renderer = FFmpegRenderer(self._target_size(is_short), is_short=is_short, style=style)
+            return renderer.render(scenes, output_path, bg_music_path=bg_music_path)
+
+        render_mode = render_mode or Config.RENDER_MODE
+        if render_mode == "segmented":
+            return self._create_video_segmented(scenes, output_path, is_short, bg_music_path, style)
+
+        target_w, target_h = self._target_size(is_short)
 
         clips = []
         for i, scene in enumerate(scenes):
             try:
-                # Load Audio
-                audio_clip = AudioFileClip(scene['audio_path'])
-                duration = audio_clip.duration
-                
-                # Load Visual (Video OR Image)
-                v_path = scene['video_path']
-                if os.path.exists(v_path):
-                    if v_path.lower().endswith(('.png', '.jpg', '.jpeg')):
-                        # Process Image
-                        img_clip = ImageClip(v_path).set_duration(duration)
-                        
-                        if style == "stickman":
-                            # STICKMAN STYLE: Pure White BG, Centered, Fade In/Out, Pleasant Liveness
-                            bg_clip = ColorClip(size=(target_w, target_h), color=(255, 255, 255)).set_duration(duration)
-                            
-                            # Base resize
-                            img_clip = img_clip.resize(width=int(target_w * 0.7))
-                            
-                            # PLEASANT LIVENESS EFFECTS:
-                            # 1. Floating: Vertical sway ±15px over 3 seconds
-                            # 2. Breathing: Subtle scaling ±1.5% over 4 seconds
-                            
-                            v_action = scene.get('vocal_action', 'talking')
-                            
-                            # Base floating position
-                            base_pos = lambda t: ('center', (target_h/2 - img_clip.h/2) + 15 * math.sin(2 * math.pi * 0.33 * t))
-                            
-                            # ACTION-AWARE OVERRIDES:
-                            if v_action == 'jumping':
-                                # Intense vertical bounce
-                                video_clip = img_clip.set_position(lambda t: ('center', (target_h/2 - img_clip.h/2) - abs(100 * math.sin(2 * math.pi * 0.8 * t))))
-                            elif v_action == 'waving':
-                                # Smooth rotation sway
-                                video_clip = img_clip.rotate(lambda t: 5 * math.sin(2 * math.pi * 0.5 * t)).set_position(base_pos)
-                            elif v_action == 'shaking':
-                                # High frequency jitter
-                                video_clip = img_clip.set_position(lambda t: ('center', (target_h/2 - img_clip.h/2) + random.uniform(-10, 10)))
-                            elif v_action == 'bouncing':
-                                # Scale-based bounce
-                                video_clip = img_clip.resize(lambda t: 1.0 + 0.1 * abs(math.sin(2 * math.pi * 0.7 * t))).set_position(base_pos)
-                            else:
-                                # Default Floating
-                                video_clip = img_clip.set_position(base_pos)
-                            
-                            # Apply Breathing (Slow Scaling)
-                            if v_action != 'bouncing':
-                                video_clip = video_clip.resize(lambda t: 1.0 + 0.015 * math.sin(2 * math.pi * 0.25 * t))
-                            
-                            # Fade In / Fade Out
-                            video_clip = video_clip.fadein(0.5).fadeout(0.5)
-                            
-                            # Composite over white background
-                            video_clip = CompositeVideoClip([bg_clip, video_clip.set_start(0)])
-                            
-                            # NO FILTERS for stickman to keep background pure white
-                        else:
-                            # NOIR STYLE: Standard animated visuals
-                            anim_type = random.choice(['zoom_in', 'zoom_out', 'pan_left', 'pan_right'])
-                            base_scale = 1.3
-                            if is_short:
-                                img_clip = img_clip.resize(height=int(target_h * base_scale))
-                            else:
-                                img_clip = img_clip.resize(width=int(target_w * base_scale))
-                                
-                            img_clip = img_clip.crop(x_center=img_clip.w/2, y_center=img_clip.h/2, width=int(target_w * 1.1), height=int(target_h * 1.1))
-                            
-                            if anim_type == 'zoom_in':
-                                video_clip = img_clip.resize(lambda t: 1.0 + 0.15 * (t/duration))
-                            elif anim_type == 'zoom_out':
-                                video_clip = img_clip.resize(lambda t: 1.15 - 0.15 * (t/duration))
-                            elif anim_type == 'pan_left':
-                                video_clip = img_clip.set_position(lambda t: (int(-0.1 * target_w * (t/duration)), 'center'))
-                            elif anim_type == 'pan_right':
-                                video_clip = img_clip.set_position(lambda t: (int(-0.1 * target_w * (1 - t/duration)), 'center'))
-                            else:
-                                video_clip = img_clip
-                                
-                            if anim_type.startswith('zoom'):
-                                video_clip = video_clip.set_position('center')
-                            
-                            video_clip = video_clip.crop(x_center=video_clip.w/2, y_center=video_clip.h/2, width=target_w, height=target_h)
-
-                    else:
-                        # Video Handling
-                        video_clip = VideoFileClip(v_path)
-                        if video_clip.duration < duration:
-                            video_clip = video_clip.loop(duration=duration)
-                        else:
-                            video_clip = video_clip.subclip(0, duration)
-                        
-                        if video_clip.w / video_clip.h > target_w / target_h:
-                            video_clip = video_clip.resize(height=target_h)
-                        else:
-                            video_clip = video_clip.resize(width=target_w)
-                        video_clip = video_clip.crop(x_center=video_clip.w/2, y_center=video_clip.h/2, width=target_w, height=target_h)
-                else:
-                    video_clip = ColorClip(size=(target_w, target_h), color=(0,0,0), duration=duration)
-
-                video_clip = video_clip.set_audio(audio_clip)
-
-                if i > 0:
-                    # Apply professional transitions
-                    # Crossfade works well for both Noir (dark) and Stickman (white)
-                    video_clip = video_clip.crossfadein(0.6)
-
-                # Subtitles / Captions
-                txt_h = 400
-                if is_short:
-                    txt_w = int(target_w * 0.9)
-                    txt_clip = self._create_text_clip(
-                        scene['text'], 
-                        size=(txt_w, txt_h),
-                        fontsize=50, 
-                        color='black' if style == "stickman" else 'white', 
-                        stroke_color='white' if style == "stickman" else 'black', 
-                        stroke_width=2,
-                        duration=duration
-                    )
-                    txt_clip = txt_clip.set_pos(('center', target_h * 0.8)).set_duration(duration)
-                    final_scene = CompositeVideoClip([video_clip, txt_clip])
-                else:
-                    txt_w = int(target_w * 0.8)
-                    txt_clip = self._create_text_clip(
-                        scene['text'], 
-                        size=(txt_w, txt_h),
-                        fontsize=40, 
-                        color='black' if style == "stickman" else 'white', 
-                        stroke_color='white' if style == "stickman" else 'black', 
-                        stroke_width=1,
-                        duration=duration
-                    )
-                    txt_clip = txt_clip.set_pos(('center', target_h * 0.85)).set_duration(duration)
-                    final_scene = CompositeVideoClip([video_clip, txt_clip])
-                
-                clips.append(final_scene)
-                
+                clips.append(self._build_scene_clip(i, scene, target_w, target_h, is_short, style))
             except Exception as e:
                 print(f"Error processing scene: {e}")
-        
+
         if clips:
             final_video = concatenate_videoclips(clips, method="compose")
             
@@ -227,7 +157,123 @@ class VideoEditor:
                 final_video = final_video.set_audio(final_audio)
 
             print("Rendering video...")
-            final_video.write_videofile(output_path, fps=24, codec="libx264", audio_codec="aac", temp_audiofile="temp_audio.m4a", threads=1)
+            # Temp audio named after the output, so concurrent renders don't overwrite each other's
+            temp_audio = os.path.splitext(output_path)[0] + "_audio.m4a"
+            final_video.write_videofile(output_path, fps=24, codec="libx264", audio_codec="aac", temp_audiofile=temp_audio, threads=1)
             print("Video rendering complete.")
             return True
         return False
+
+    def render_segment(self, scene, index, segment_path, is_short=True, style="noir"):
+        """
+        Renders a single scene (caption and crossfade included) to its own file.
+        Can be called on its own to re-render one failed scene.
+        """
+        target_w, target_h = self._target_size(is_short)
+        clip = None
+        try:
+            clip = self._build_scene_clip(index, scene, target_w, target_h, is_short, style)
+            # Every segment must share codec parameters so the concat demuxer can join them without re-encoding
+            clip.write_videofile(
+                segment_path, fps=24, codec="libx264", audio_codec="aac", audio_fps=44100,
+                temp_audiofile=segment_path.replace(".mp4", "_audio.m4a"),
+                threads=1, logger=None
+            )
+            return True
+        except Exception as e:
+            print(f"Error rendering segment {index}: {e}")
+            return False
+        finally:
+            if clip is not None:
+                clip.close()
+
+    def _create_video_segmented(self, scenes, output_path, is_short, bg_music_path, style):
+        """
+        Renders every scene in a process pool, then joins the segments with ffmpeg's concat demuxer.
+        The scene crossfade is a 0.6s fade in from black inside the scene itself (scenes never
+        overlap in the single-graph render either), so each segment is fully self-contained.
+        The segment directory is removed once the final video is written.
+        """
+        import multiprocessing
+        import shutil
+        from concurrent.futures import ProcessPoolExecutor
+        from .utils import ensure_dir_exists, scratch_name
+
+        segment_dir = os.path.join(Config.SEGMENT_DIR, scratch_name(output_path))
+        ensure_dir_exists(segment_dir)
+
+        jobs = [
+            (scene, i, os.path.join(segment_dir, f"segment_{i:03d}.mp4"), is_short, style)
+            for i, scene in enumerate(scenes)
+        ]
+        workers = Config.RENDER_WORKERS or os.cpu_count() or 1
+        print(f"Rendering {len(jobs)} segments with {workers} workers...")
+
+        results = {}
+        # This runs in a to_thread worker of a threaded process: fork could copy held locks, spawn can't
+        with ProcessPoolExecutor(max_workers=min(workers, max(len(jobs), 1)),
+                                 mp_context=multiprocessing.get_context("spawn")) as pool:
+            for index, ok in pool.map(_render_segment_worker, jobs):
+                results[index] = ok
+
+        # Give failed scenes one more chance on their own before dropping them
+        for scene, i, segment_path, _, _ in jobs:
+            if not results.get(i):
+                print(f"Re-rendering failed segment {i}...")
+                results[i] = self.render_segment(scene, i, segment_path, is_short=is_short, style=style)
+
+        segments = [job[2] for job in jobs if results.get(job[1])]
+        if not segments:
+            return False
+
+        joined_path = output_path
+        if bg_music_path and os.path.exists(bg_music_path):
+            joined_path = os.path.join(segment_dir, "joined.mp4")
+
+        if not self._concat_segments(segments, joined_path, segment_dir):
+            return False
+        if joined_path != output_path and not self._mix_background_music(joined_path, bg_music_path, output_path):
+            return False
+        shutil.rmtree(segment_dir, ignore_errors=True)
+
+        print("Video rendering complete.")
+        return True
+
+    def _concat_segments(self, segments, output_path, work_dir):
+        """Joins identically encoded segments with the concat demuxer (stream copy, no re-encode)."""
+        import subprocess
+        from imageio_ffmpeg import get_ffmpeg_exe
+
+        list_path = os.path.join(work_dir, "segments.txt")
+        with open(list_path, 'w', encoding='utf-8') as f:
+            for segment in segments:
+                escaped = os.path.abspath(segment).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+
+        command = [
+            get_ffmpeg_exe(), "-y", "-f", "concat", "-safe", "0", "-i", list_path,
+            "-c", "copy", "-movflags", "+faststart", output_path
+        ]
+        try:
+            subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            return True
+        except Exception as e:
+            print(f"Error joining segments: {e}")
+            return False
+
+    def _mix_background_music(self, video_path, bg_music_path, output_path):
+        """Loops background music under the joined video at the same 8% volume as the single render."""
+        import subprocess
+        from imageio_ffmpeg import get_ffmpeg_exe
+
+        command = [
+            get_ffmpeg_exe(), "-y", "-i", video_path, "-stream_loop", "-1", "-i", bg_music_path,
+            "-filter_complex", "[1:a]volume=0.08[bg];[0:a][bg]amix=inputs=2:duration=first:normalize=0[a]",
+            "-map", "0:v", "-map", "[a]", "-c:v", "copy", "-c:a", "aac", output_path
+        ]
+        try:
+            subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            return True
+        except Exception as e:
+            print(f"Error mixing background music: {e}")
+            return False
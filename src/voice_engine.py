@@ -1,69 +1,150 @@
 import edge_tts
 import asyncio
+import os
 from .config import Config
+from .cache import FileCache
 
 class VoiceEngine:
+    # Map moods to edge-tts parameters
+    # Rate: +X% (faster), -X% (slower)
+    # Pitch: +XHz (higher), -XHz (lower)
+    MOOD_PARAMS = {
+        "excited": {"rate": "+10%", "pitch": "+2Hz"},
+        "serious": {"rate": "-5%", "pitch": "-2Hz"},
+        "whispering": {"rate": "-10%", "pitch": "-5Hz"},
+        "curious": {"rate": "+0%", "pitch": "+2Hz"},
+        "neutral": {"rate": "+0%", "pitch": "+0Hz"}
+    }
+
+    # Silence removal: drop any silence longer than SILENCE_MIN_DURATION below SILENCE_THRESHOLD_DB
+    SILENCE_THRESHOLD_DB = -45
+    SILENCE_MIN_DURATION = 0.3
+
     def __init__(self):
         self.voice = Config.VOICE_NAME
+        self.audio_cache = FileCache(Config.AUDIO_CACHE_DIR, Config.AUDIO_CACHE_MAX_MB * 1024 * 1024)
 
-    async def generate_audio(self, text, output_file, mood="neutral"):
+    async def generate_audio(self, text, output_file, mood="neutral", voice=None):
         """
         Generates speech from text using MS Edge TTS with emotional parameters.
         Moods: neutral, excited, serious, whispering, curious
         """
+        return await self.synthesize(text, output_file, mood=mood, voice=voice) is not None
+
+    async def synthesize(self, text, output_file, mood="neutral", voice=None):
+        """
+        Streams speech from MS Edge TTS straight into the decoder and silence trimmer.
+        voice overrides self.voice for this call only, so concurrent jobs can share one engine.
+        Returns {'audio_path', 'duration', 'words'} where words are
+        {'text', 'start', 'end'} timings (seconds, on the trimmed audio), or None on failure.
+        """
         try:
-            # Clean text: Remove markdown emphasis and asterisks
-            import re
-            clean_text = re.sub(r'[*_#~>]', '', text)
+            voice = voice or self.voice
+            clean_text = self._clean_text(text)
             
-            # Map moods to edge-tts parameters
-            # Rate: +X% (faster), -X% (slower)
-            # Pitch: +XHz (higher), -XHz (lower)
-            mood_params = {
-                "excited": {"rate": "+10%", "pitch": "+2Hz"},
-                "serious": {"rate": "-5%", "pitch": "-2Hz"},
-                "whispering": {"rate": "-10%", "pitch": "-5Hz"},
-                "curious": {"rate": "+0%", "pitch": "+2Hz"},
-                "neutral": {"rate": "+0%", "pitch": "+0Hz"}
-            }
+            params = self.MOOD_PARAMS.get(mood.lower(), self.MOOD_PARAMS["neutral"])
+
+            # Cached output is already silence-trimmed, so a hit skips both TTS and ffmpeg
+            cache_key = self._cache_key(clean_text, params, output_file, voice)
+            if self.audio_cache.get(cache_key, output_file):
+                meta = self.audio_cache.get_meta(cache_key) or {}
+                return {'audio_path': output_file, 'duration': meta.get('duration'), 'words': meta.get('words', [])}
             
-            params = mood_params.get(mood.lower(), mood_params["neutral"])
+            communicate = self._communicate(clean_text, params, voice)
+            audio, words = await self._stream_and_decode(communicate)
+
+            if isinstance(audio, bytes):
+                # Decoder unavailable: keep the untrimmed audio, but never cache it
+                with open(output_file, 'wb') as f:
+                    f.write(audio)
+                return {'audio_path': output_file, 'duration': None, 'words': words}
+
+            # Post-processing: Remove silence (in memory) and write the final file once
+            duration, words = await asyncio.to_thread(self._trim_and_save, audio, words, output_file)
+            self.audio_cache.put(cache_key, output_file, meta={'duration': duration, 'words': words})
             
-            communicate = edge_tts.Communicate(
+            return {'audio_path': output_file, 'duration': duration, 'words': words}
+        except Exception as e:
+            print(f"Error generating audio with mood {mood}: {e}")
+            return None
+
+    def _communicate(self, clean_text, params, voice):
+        try:
+            return edge_tts.Communicate(
                 clean_text, 
-                self.voice, 
+                voice, 
                 rate=params["rate"], 
-                pitch=params["pitch"]
+                pitch=params["pitch"],
+                boundary="WordBoundary"
             )
-            await communicate.save(output_file)
-            
-            # Post-processing: Remove silence
-            self._remove_silence(output_file)
-            
-            return True
+        except TypeError:
+            # Older edge-tts releases always emit WordBoundary and have no boundary option
+            return edge_tts.Communicate(clean_text, voice, rate=params["rate"], pitch=params["pitch"])
+
+    async def _stream_and_decode(self, communicate):
+        """
+        Feeds audio chunks into the decoder as they arrive and collects word boundaries.
+        Returns (pcm_samples, words), or (mp3_bytes, words) if the decoder could not run.
+        """
+        from .audio_processing import StreamingDecoder
+
+        decoder = None
+        try:
+            decoder = await StreamingDecoder().start()
         except Exception as e:
-            print(f"Error generating audio with mood {mood}: {e}")
-            return False
-
-    def _remove_silence(self, file_path):
-        """Removes long silences using FFmpeg."""
-        import subprocess
-        import os
-        from imageio_ffmpeg import get_ffmpeg_exe
-        
-        ffmpeg_exe = get_ffmpeg_exe()
-        
-        temp_path = file_path.replace(".mp3", "_temp.mp3")
-        # silenceremove=start_periods=1:start_duration=0:start_threshold=-40dB:stop_periods=-1:stop_duration=0.5:stop_threshold=-40dB
-        # Removes silence at start and any silence > 0.5s in the middle/end
-        command = [
-            ffmpeg_exe, "-y", "-i", file_path,
-            "-af", "silenceremove=stop_periods=-1:stop_duration=0.3:stop_threshold=-45dB",
-            temp_path
-        ]
+            print(f"Warning: Streaming decoder unavailable, audio will not be trimmed: {e}")
+
+        buffer = bytearray()
+        words = []
         try:
-            subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            if os.path.exists(temp_path):
-                os.replace(temp_path, file_path)
+            async for chunk in communicate.stream():
+                if chunk["type"] == "audio":
+                    buffer.extend(chunk["data"])
+                    if decoder:
+                        await decoder.feed(chunk["data"])
+                elif chunk["type"] == "WordBoundary":
+                    # Offsets and durations are in 100ns ticks
+                    start = chunk["offset"] / 1e7
+                    words.append({'text': chunk["text"], 'start': start, 'end': start + chunk["duration"] / 1e7})
+        except BaseException:
+            if decoder:
+                await decoder.abort()
+            raise
+
+        if not decoder:
+            return bytes(buffer), words
+        try:
+            return await decoder.finish(), words
         except Exception as e:
-            print(f"Warning: Could not remove silence (ffmpeg might be missing): {e}")
+            print(f"Warning: Could not decode TTS stream, audio will not be trimmed: {e}")
+            return bytes(buffer), words
+
+    def _trim_and_save(self, samples, words, output_file):
+        from . import audio_processing
+
+        trimmed, removed = audio_processing.trim_silence(
+            samples,
+            threshold_db=self.SILENCE_THRESHOLD_DB,
+            min_duration=self.SILENCE_MIN_DURATION
+        )
+        duration = audio_processing.save_audio(output_file, trimmed)
+        # Word timings were reported against the untrimmed audio
+        words = [
+            {
+                'text': w['text'],
+                'start': round(audio_processing.remap_time(w['start'], removed), 3),
+                'end': round(min(audio_processing.remap_time(w['end'], removed), duration), 3)
+            }
+            for w in words
+        ]
+        return duration, words
+
+    def _clean_text(self, text):
+        # Clean text: Remove markdown emphasis and asterisks
+        import re
+        return re.sub(r'[*_#~>]', '', text)
+
+    def _cache_key(self, clean_text, params, output_file, voice):
+        silence_filter = (self.SILENCE_THRESHOLD_DB, self.SILENCE_MIN_DURATION)
+        ext = os.path.splitext(output_file)[1].lower()
+        return FileCache.make_key("edge-tts", clean_text, voice, params["rate"], params["pitch"], silence_filter, ext)
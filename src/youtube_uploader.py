@@ -1,31 +1,137 @@
 import os
+import json
+import time
+import random
+import socket
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import httplib2
 import google.oauth2.credentials
 import google_auth_oauthlib.flow
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaFileUpload, build_http
 from src.config import Config
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Transient failures worth retrying a chunk for
+RETRIABLE_STATUS_CODES = (500, 502, 503, 504)
+RETRIABLE_EXCEPTIONS = (httplib2.HttpLib2Error, ConnectionError, socket.timeout, TimeoutError)
+CHUNK_ALIGNMENT = 256 * 1024 # resumable uploads require chunks in multiples of 256 KiB
+
+def build_transport(timeout=None):
+    """
+    A fresh httplib2 transport for API calls. build_http() takes 308 out of httplib2's redirect
+    codes: resumable uploads answer every chunk but the last with "308 Resume Incomplete".
+    """
+    http = build_http()
+    http.timeout = timeout or Config.YOUTUBE_HTTP_TIMEOUT
+    return http
+
+class UploadSession:
+    """
+    The resumable session URI and confirmed offset of one upload, kept in a sidecar file next
+    to the video (<video>.upload.json), so a crashed process can continue the same upload.
+    Tied to the file's size and mtime: a re-rendered video starts a fresh session.
+    """
+    def __init__(self, video_path):
+        self.path = f"{video_path}.upload.json"
+        stat = os.stat(video_path)
+        self.fingerprint = {'size': stat.st_size, 'mtime': int(stat.st_mtime)}
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable upload session {self.path}: {e}")
+            return None
+        if saved.get('file') != self.fingerprint or not saved.get('uri'):
+            return None
+        return saved
+
+    def save(self, uri, offset):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'uri': uri, 'offset': offset, 'file': self.fingerprint, 'updated_at': time.time()}, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
 class YouTubeUploader:
-    def __init__(self):
-        self.youtube = self._get_authenticated_service()
+    def __init__(self, youtube=None, chunk_mb=None, max_retries=None, http_factory=None):
+        """
+        youtube: an already built API client (e.g. pointed at a local stub server); default authenticates.
+        http_factory: builds the HTTP transport for a worker thread (default: authorized httplib2).
+        """
+        self.credentials = None
+        self.youtube = youtube or self._get_authenticated_service()
+        chunk_bytes = int((chunk_mb or Config.UPLOAD_CHUNK_MB) * 1024 * 1024)
+        self.chunk_size = max(CHUNK_ALIGNMENT, chunk_bytes // CHUNK_ALIGNMENT * CHUNK_ALIGNMENT)
+        self.max_retries = max_retries if max_retries is not None else Config.UPLOAD_MAX_RETRIES
+        self.last_upload_stats = None
+        self.latencies = {}
+        self._http_factory = http_factory
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
 
     def _get_authenticated_service(self):
         try:
-            credentials = google.oauth2.credentials.Credentials(
+            self.credentials = google.oauth2.credentials.Credentials(
                 None, # No access token initially
                 refresh_token=Config.YOUTUBE_REFRESH_TOKEN,
                 token_uri="https://oauth2.googleapis.com/token",
                 client_id=Config.YOUTUBE_CLIENT_ID,
                 client_secret=Config.YOUTUBE_CLIENT_SECRET
             )
-            return build("youtube", "v3", credentials=credentials)
+            return build("youtube", "v3", credentials=self.credentials)
         except Exception as e:
             logger.error(f"Failed to authenticate with YouTube: {e}")
             raise
 
+    def _http(self):
+        """
+        This thread's HTTP transport. httplib2 connections are not thread-safe, so each worker
+        thread gets its own, kept alive and reused for every later call from that thread.
+        None means the client's own transport (single-threaded use).
+        """
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            if self._http_factory:
+                http = self._http_factory()
+            elif self.credentials:
+                http = AuthorizedHttp(self.credentials, http=build_transport())
+            self._local.http = http
+        return http
+
+    def _execute(self, name, request):
+        """Executes an API request on this thread's transport and records its latency."""
+        started = time.perf_counter()
+        try:
+            return request.execute(http=self._http())
+        finally:
+            self._record_latency(name, time.perf_counter() - started)
+
+    def _record_latency(self, name, elapsed):
+        with self._stats_lock:
+            self.latencies.setdefault(name, []).append(elapsed)
+        logger.info(f"{name} took {elapsed:.2f}s")
+
+    def latency_summary(self):
+        with self._stats_lock:
+            return {name: {'calls': len(times), 'avg': round(sum(times) / len(times), 3), 'max': round(max(times), 3)}
+                    for name, times in self.latencies.items()}
+
     def upload_video(self, video_path, title, description, tags=None, privacy_status="private", publish_at=None):
         try:
             logger.info(f"Uploading video: {title}")
@@ -44,8 +150,8 @@ class YouTubeUploader:
                 }
             }
             
-            # MediaFileUpload handles the file upload
-            media = MediaFileUpload(video_path, chunksize=-1, resumable=True)
+            # Fixed-size chunks: a dropped connection costs at most one chunk, not the whole file
+            media = MediaFileUpload(video_path, chunksize=self.chunk_size, resumable=True)
 
             request = self.youtube.videos().insert(
                 part="snippet,status",
@@ -53,12 +159,9 @@ class YouTubeUploader:
                 media_body=media
             )
 
-            response = None
-            while response is None:
-                status, response = request.next_chunk()
-                if status:
-                    logger.info(f"Uploaded {int(status.progress() * 100)}%")
-
+            started = time.perf_counter()
+            response = self._send_resumable(request, UploadSession(video_path))
+            self._record_latency("videos.insert", time.perf_counter() - started)
             logger.info(f"Upload Complete! Video ID: {response['id']}")
             return response['id']
 
@@ -66,6 +169,97 @@ class YouTubeUploader:
             logger.error(f"Failed to upload video: {e}")
             return None
 
+    def _query_session(self, request, uri, total):
+        """
+        Asks the upload server how far a saved session got.
+        Returns ('done', resource), ('partial', offset) or None if the session is gone.
+        """
+        try:
+            resp, content = (self._http() or request.http).request(
+                uri, "PUT", headers={"Content-Range": f"bytes */{total}", "Content-Length": "0"}
+            )
+        except RETRIABLE_EXCEPTIONS as e:
+            logger.warning(f"Could not query saved upload session: {e}")
+            return None
+        if resp.status in (200, 201):
+            return 'done', json.loads(content)
+        if resp.status == 308:
+            # Range is "bytes=0-N" for what the server has; no Range means nothing yet
+            offset = int(resp['range'].split('-')[1]) + 1 if 'range' in resp else 0
+            return 'partial', offset
+        logger.info(f"Saved upload session is no longer valid (HTTP {resp.status}), starting over")
+        return None
+
+    def _send_resumable(self, request, session):
+        """
+        Runs a resumable upload chunk by chunk: continues a saved session when there is one,
+        persists the session URI and confirmed offset after every chunk, and retries 5xx and
+        connection errors with jittered exponential backoff. Logs throughput and ETA.
+        """
+        total = request.resumable.size()
+        saved = session.load()
+        if saved:
+            state = self._query_session(request, saved['uri'], total)
+            if state and state[0] == 'done':
+                logger.info("Upload had already completed before the restart")
+                session.clear()
+                return state[1]
+            if state:
+                request.resumable_uri = saved['uri']
+                request.resumable_progress = state[1]
+                logger.info(f"Resuming upload at {state[1] / max(total, 1):.0%} ({state[1] / 1e6:.1f} of {total / 1e6:.1f} MB)")
+
+        start_offset = request.resumable_progress
+        started = time.perf_counter()
+        retries = total_retries = 0
+        response = None
+        while response is None:
+            try:
+                status, response = request.next_chunk(http=self._http())
+            except HttpError as e:
+                if e.resp.status not in RETRIABLE_STATUS_CODES:
+                    raise
+                error = e
+            except RETRIABLE_EXCEPTIONS as e:
+                error = e
+            else:
+                retries = 0
+                if response is None and request.resumable_uri:
+                    session.save(request.resumable_uri, request.resumable_progress)
+                if status:
+                    self._log_progress(status.resumable_progress, total, start_offset, started)
+                continue
+
+            # The library queries the server's offset before the next chunk, so nothing is re-sent needlessly
+            retries += 1
+            total_retries += 1
+            if retries > self.max_retries:
+                logger.error(f"Giving up after {self.max_retries} retries; the session is saved for the next attempt")
+                raise error
+            delay = min(2 ** retries, 64) * random.uniform(0.5, 1.0)
+            logger.warning(f"Upload chunk failed ({error}), retry {retries}/{self.max_retries} in {delay:.1f}s")
+            time.sleep(delay)
+
+        session.clear()
+        elapsed = time.perf_counter() - started
+        sent = total - start_offset
+        self.last_upload_stats = {
+            'bytes': sent, 'seconds': round(elapsed, 2), 'retries': total_retries,
+            'mb_per_s': round(sent / 1e6 / elapsed, 2) if elapsed > 0 else None,
+            'resumed_from': start_offset,
+        }
+        logger.info(f"Uploaded {sent / 1e6:.1f} MB in {elapsed:.1f}s "
+                    f"({self.last_upload_stats['mb_per_s']} MB/s, {total_retries} retries)")
+        return response
+
+    @staticmethod
+    def _log_progress(offset, total, start_offset, started):
+        elapsed = time.perf_counter() - started
+        rate = (offset - start_offset) / elapsed if elapsed > 0 else 0
+        eta = f"{(total - offset) / rate:.0f}s" if rate > 0 else "?"
+        logger.info(f"Uploaded {offset / max(total, 1):.0%} ({offset / 1e6:.1f}/{total / 1e6:.1f} MB) "
+                    f"at {rate / 1e6:.2f} MB/s, ETA {eta}")
+
     def add_comment(self, video_id, text):
         """Adds a top-level comment to a video."""
         try:
@@ -82,7 +276,7 @@ class YouTubeUploader:
                     }
                 }
             )
-            response = request.execute()
+            response = self._execute("commentThreads.insert", request)
             comment_id = response['snippet']['topLevelComment']['id']
             logger.info(f"Comment added. ID: {comment_id}")
             return comment_id
@@ -103,7 +297,7 @@ class YouTubeUploader:
                     }
                 }
             )
-            request.execute()
+            self._execute("comments.setAttributes", request)
             logger.info(f"Comment {comment_id} pinned.")
             return True
         except Exception as e:
@@ -122,9 +316,44 @@ class YouTubeUploader:
                 videoId=video_id,
                 media_body=MediaFileUpload(thumbnail_path)
             )
-            response = request.execute()
+            self._execute("thumbnails.set", request)
             logger.info("Thumbnail uploaded successfully.")
             return True
         except Exception as e:
             logger.error(f"Failed to upload thumbnail: {e}")
             return False
+
+
+class AsyncYouTubeUploader:
+    """
+    asyncio front for YouTubeUploader. Calls run on a small dedicated thread pool, each worker
+    keeping its own pooled connection, so independent calls (thumbnail, comment) overlap
+    instead of queueing behind each other. Media uploads can't go through the API's batch
+    endpoint, so parallel requests are the way to overlap them.
+    """
+    def __init__(self, uploader, max_workers=None):
+        self.uploader = uploader
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or Config.YOUTUBE_WORKERS,
+                                           thread_name_prefix="youtube")
+
+    async def _run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+
+    async def upload_video(self, *args, **kwargs):
+        return await self._run(self.uploader.upload_video, *args, **kwargs)
+
+    async def set_thumbnail(self, video_id, thumbnail_path):
+        return await self._run(self.uploader.set_thumbnail, video_id, thumbnail_path)
+
+    async def add_comment(self, video_id, text):
+        return await self._run(self.uploader.add_comment, video_id, text)
+
+    async def pin_comment(self, comment_id):
+        return await self._run(self.uploader.pin_comment, comment_id)
+
+    def latency_summary(self):
+        return self.uploader.latency_summary()
+
+    def close(self):
+        self.executor.shutdown(wait=False)